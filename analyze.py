@@ -0,0 +1,486 @@
+"""
+Offline analyzer for recorded captures.
+
+Usage:
+    python analyze.py capture.smcap [more captures ...] [--workers N] [--json]
+
+Accepts binary captures written with `app.py --record`, NDJSON files with one
+profiling snapshot or event per line, and the JSON exports of the profiling
+and event-log buttons. Files are memory-mapped and split into chunks that are
+summarised in parallel by a process pool; per-chunk results are merged in file
+order, so the output does not depend on the chunk size or worker count.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    ANALYZE_CHUNK_BYTES,
+    ANALYZE_WORKERS,
+    EPISODE_GAP_S,
+    WINDOW_SECONDS,
+    WINDOW_MAX_SAMPLES,
+    STD_FACTOR_WARN,
+    STD_FACTOR_ALERT,
+    MIN_SAMPLES,
+)
+from capture import (
+    detect_format,
+    iter_binary,
+    iter_json_array,
+    iter_ndjson,
+    ndjson_chunks,
+    normalize,
+    open_mmap,
+    sync_points,
+)
+from monitoring import PERCENTILES, STATE_CODES, rolling_states
+from sketches import DDSketch
+
+WARN = STATE_CODES.index("WARN")
+ALERT = STATE_CODES.index("ALERT")
+# Same weighting as HeatmapWidget.add_event.
+_HEAT_WEIGHTS = np.array([0.0, 0.0, 0.0, 1.0, 2.0])
+_JSON_BATCH = 50000
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+Key = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class Params:
+    window_seconds: float = WINDOW_SECONDS
+    warn_factor: float = STD_FACTOR_WARN
+    alert_factor: float = STD_FACTOR_ALERT
+    min_samples: int = MIN_SAMPLES
+    gap_s: float = EPISODE_GAP_S
+    max_samples: int = WINDOW_MAX_SAMPLES
+
+    def states(self, values: np.ndarray, ts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return rolling_states(values, ts, self.window_seconds, self.warn_factor,
+                              self.alert_factor, self.min_samples, self.max_samples)
+
+
+@dataclass
+class SeriesResult:
+    """
+    Mergeable summary of one (host, metric) series.
+
+    The first `max_samples` samples of a chunk cannot be scored without the
+    end of the previous chunk (their window and the time weight of the first
+    one reach back into it); they travel as `head_*` and are scored while
+    merging, against `tail_*` of everything merged before.
+    """
+
+    unit: str
+    recorded: bool = False
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    min: float = float("inf")
+    max: float = float("-inf")
+    first_ts: float = float("inf")
+    last_ts: float = float("-inf")
+    sketch: DDSketch = field(default_factory=DDSketch)
+    states: np.ndarray = field(default_factory=lambda: np.zeros(len(STATE_CODES), dtype=np.int64))
+    heatmap: np.ndarray = field(default_factory=lambda: np.zeros(7 * 24))
+    episodes: List[list] = field(default_factory=list)
+    head_t: np.ndarray = field(default_factory=lambda: np.empty(0))
+    head_v: np.ndarray = field(default_factory=lambda: np.empty(0))
+    tail_t: np.ndarray = field(default_factory=lambda: np.empty(0))
+    tail_v: np.ndarray = field(default_factory=lambda: np.empty(0))
+
+
+def _heatmap(ts: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    weights = _HEAT_WEIGHTS[codes]
+    mask = weights > 0
+    if not mask.any():
+        return np.zeros(7 * 24)
+    # Local weekday/hour is resolved once per distinct hour, not per sample.
+    buckets = np.floor(ts[mask] / 3600.0).astype(np.int64)
+    uniq, inverse = np.unique(buckets, return_inverse=True)
+    cells = np.empty(len(uniq), dtype=np.int64)
+    for i, b in enumerate(uniq.tolist()):
+        local = datetime.fromtimestamp(b * 3600)
+        cells[i] = local.weekday() * 24 + local.hour
+    return np.bincount(cells[inverse], weights=weights[mask], minlength=7 * 24)
+
+
+def find_episodes(ts: np.ndarray, codes: np.ndarray, z: np.ndarray, gap_s: float, level: int = WARN) -> List[list]:
+    """
+    Samples at or above `level` no more than `gap_s` apart form one episode:
+    [start, end, peak state code, flagged samples, peak z].
+    """
+    idx = np.flatnonzero(codes >= level)
+    if not len(idx):
+        return []
+    t = ts[idx]
+    breaks = np.flatnonzero(np.diff(t) > gap_s)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(idx) - 1]))
+    peaks = np.maximum.reduceat(codes[idx], starts)
+    peak_z = np.fmax.reduceat(z[idx], starts)
+    return [
+        [float(t[s]), float(t[e]), int(p), int(e - s + 1), float(pz)]
+        for s, e, p, pz in zip(starts, ends, peaks, peak_z)
+    ]
+
+
+def merge_episodes(episodes: List[list], gap_s: float) -> List[list]:
+    merged: List[list] = []
+    for ep in sorted(episodes, key=lambda e: e[0]):
+        if merged and ep[0] - merged[-1][1] <= gap_s:
+            last = merged[-1]
+            last[1] = max(last[1], ep[1])
+            last[2] = max(last[2], ep[2])
+            last[3] += ep[3]
+            last[4] = float(np.fmax(last[4], ep[4]))
+        else:
+            merged.append(list(ep))
+    return merged
+
+
+def _score(result: SeriesResult, ts: np.ndarray, codes: np.ndarray, z: np.ndarray, gap_s: float):
+    result.states += np.bincount(codes, minlength=len(STATE_CODES))
+    result.heatmap += _heatmap(ts, codes)
+    result.episodes = merge_episodes(result.episodes + find_episodes(ts, codes, z, gap_s), gap_s)
+
+
+def _summarize_values(result: SeriesResult, ts: np.ndarray, values: np.ndarray):
+    result.count = len(values)
+    result.mean = float(values.mean())
+    result.m2 = float(((values - result.mean) ** 2).sum())
+    result.min = float(values.min())
+    result.max = float(values.max())
+    result.first_ts = float(ts.min())
+    result.last_ts = float(ts.max())
+    result.sketch.add_many(values)
+
+
+class _Collector:
+    def __init__(self):
+        self.samples: Dict[Key, Tuple[str, List[float], List[float]]] = {}
+        self.events: Dict[Key, Tuple[List[float], List[float], List[int]]] = {}
+        self.bytes = 0
+
+    def add_sample(self, host: str, ts: float, metrics: Dict[str, Tuple[float, str]]):
+        samples = self.samples
+        for name, (value, unit) in metrics.items():
+            entry = samples.get((host, name))
+            if entry is None:
+                entry = samples[(host, name)] = (unit, [], [])
+            entry[1].append(ts)
+            entry[2].append(value)
+
+    def add_record(self, record):
+        item = normalize(record)
+        if item is None:
+            return
+        if item[0] == "sample":
+            self.add_sample(item[1], item[2], item[3])
+            return
+        _, host, ts, metric, state, value = item
+        if state not in STATE_CODES:
+            return
+        entry = self.events.get((host, metric))
+        if entry is None:
+            entry = self.events[(host, metric)] = ([], [], [])
+        entry[0].append(ts)
+        entry[1].append(value)
+        entry[2].append(STATE_CODES.index(state))
+
+    def finish(self, params: Params) -> Dict[Key, SeriesResult]:
+        results: Dict[Key, SeriesResult] = {}
+        head_n = params.max_samples
+
+        for key, (unit, ts_list, value_list) in self.samples.items():
+            ts = np.asarray(ts_list)
+            values = np.asarray(value_list)
+            result = results[key] = SeriesResult(unit)
+            _summarize_values(result, ts, values)
+
+            z, codes = params.states(values, ts)
+            _score(result, ts[head_n:], codes[head_n:], z[head_n:], params.gap_s)
+            result.head_t = ts[:head_n]
+            result.head_v = values[:head_n]
+            result.tail_t = ts[-head_n:]
+            result.tail_v = values[-head_n:]
+
+        for key, (ts_list, value_list, code_list) in self.events.items():
+            if key in results:
+                continue
+            ts = np.asarray(ts_list)
+            values = np.asarray(value_list)
+            codes = np.asarray(code_list, dtype=np.int64)
+            result = results[key] = SeriesResult("", recorded=True)
+            _summarize_values(result, ts, values)
+            _score(result, ts, codes, np.full(len(ts), np.nan), params.gap_s)
+
+        return results
+
+
+def _analyze_chunk(task) -> Dict[Key, SeriesResult]:
+    path, fmt, start, end, params = task
+    mm = open_mmap(path)
+    collector = _Collector()
+    try:
+        if fmt == "binary":
+            for host, ts, metrics in iter_binary(mm, start, end):
+                collector.add_sample(host, ts, metrics)
+        else:
+            for record in iter_ndjson(mm, start, end):
+                collector.add_record(record)
+    finally:
+        mm.close()
+    return collector.finish(params)
+
+
+def plan_chunks(path: str, params: Params, chunk_bytes: int = ANALYZE_CHUNK_BYTES) -> List[tuple]:
+    """
+    Splits one capture into independent tasks. Binary chunks start on sync
+    points, NDJSON chunks on line boundaries. JSON arrays are not split.
+    """
+    mm = open_mmap(path)
+    if mm is None:
+        return []
+    try:
+        fmt = detect_format(mm)
+        size = len(mm)
+        if fmt == "json":
+            return [(path, fmt, 0, size, params)]
+        if fmt == "ndjson":
+            return [(path, fmt, s, e, params) for s, e in ndjson_chunks(mm, chunk_bytes)]
+
+        offsets = [off for _, off in sync_points(path, mm)] or [0]
+        if offsets[0] != 0:
+            offsets.insert(0, 0)
+        tasks = []
+        start = 0
+        for off in offsets[1:]:
+            if off - start >= chunk_bytes:
+                tasks.append((path, fmt, start, off, params))
+                start = off
+        tasks.append((path, fmt, start, size, params))
+        return tasks
+    finally:
+        mm.close()
+
+
+def _iter_json_batches(task) -> Iterable[Dict[Key, SeriesResult]]:
+    path, _, _, _, params = task
+    mm = open_mmap(path)
+    try:
+        records = iter_json_array(mm)
+        while True:
+            batch = list(islice(records, _JSON_BATCH))
+            if not batch:
+                return
+            collector = _Collector()
+            for record in batch:
+                collector.add_record(record)
+            yield collector.finish(params)
+    finally:
+        mm.close()
+
+
+class Analysis:
+    """
+    Folds chunk results in file order.
+    """
+
+    def __init__(self, params: Params):
+        self.params = params
+        self.series: Dict[Key, SeriesResult] = {}
+
+    def add(self, chunk: Dict[Key, SeriesResult]):
+        for key, part in chunk.items():
+            total = self.series.get(key)
+            if total is None:
+                total = self.series[key] = SeriesResult(part.unit, recorded=part.recorded)
+            self._merge(total, part)
+
+    def _merge(self, total: SeriesResult, part: SeriesResult):
+        params = self.params
+        if len(part.head_v):
+            # Score the deferred head now that the preceding samples are known.
+            values = np.concatenate((total.tail_v, part.head_v))
+            z, codes = params.states(values, np.concatenate((total.tail_t, part.head_t)))
+            skip = len(total.tail_v)
+            _score(total, part.head_t, codes[skip:], z[skip:], params.gap_s)
+
+        n = total.count + part.count
+        if total.count:
+            delta = part.mean - total.mean
+            total.m2 += part.m2 + delta * delta * total.count * part.count / n
+            total.mean += delta * part.count / n
+        else:
+            total.mean, total.m2 = part.mean, part.m2
+        total.count = n
+        total.min = min(total.min, part.min)
+        total.max = max(total.max, part.max)
+        total.first_ts = min(total.first_ts, part.first_ts)
+        total.last_ts = max(total.last_ts, part.last_ts)
+        total.sketch.merge(part.sketch)
+        total.states += part.states
+        total.heatmap += part.heatmap
+        total.episodes = merge_episodes(total.episodes + part.episodes, params.gap_s)
+
+        keep = params.max_samples
+        total.tail_t = np.concatenate((total.tail_t, part.tail_t))[-keep:]
+        total.tail_v = np.concatenate((total.tail_v, part.tail_v))[-keep:]
+
+    def heatmap(self) -> np.ndarray:
+        heat = np.zeros(7 * 24)
+        for result in self.series.values():
+            heat += result.heatmap
+        return heat.reshape(7, 24)
+
+    def to_dict(self, top: int = 10) -> dict:
+        hosts: Dict[str, dict] = {}
+        episodes = []
+        for (host, name), r in sorted(self.series.items()):
+            quantiles = r.sketch.quantiles(PERCENTILES) or {}
+            hosts.setdefault(host, {})[name] = {
+                "unit": r.unit,
+                "source": "events" if r.recorded else "samples",
+                "count": r.count,
+                "mean": r.mean,
+                "std": (r.m2 / r.count) ** 0.5 if r.count else 0.0,
+                "min": r.min,
+                "max": r.max,
+                "percentiles": {f"p{int(q * 100):02d}": v for q, v in quantiles.items()},
+                "states": dict(zip(STATE_CODES, r.states.tolist())),
+                "episodes": len(r.episodes),
+                "first": r.first_ts,
+                "last": r.last_ts,
+            }
+            for start, end, peak, flagged, peak_z in r.episodes:
+                episodes.append({
+                    "host": host,
+                    "metric": name,
+                    "start": start,
+                    "end": end,
+                    "state": STATE_CODES[peak],
+                    "samples": flagged,
+                    "peak_z": None if peak_z != peak_z else peak_z,
+                })
+        episodes.sort(key=lambda e: (e["state"] != "ALERT", -(e["end"] - e["start"]), -e["samples"]))
+        return {
+            "hosts": hosts,
+            "episodes": episodes[:top],
+            "episode_count": len(episodes),
+            "heatmap": self.heatmap().tolist(),
+        }
+
+
+def analyze(paths: List[str], params: Params = Params(), workers: int = ANALYZE_WORKERS,
+            chunk_bytes: int = ANALYZE_CHUNK_BYTES) -> Analysis:
+    analysis = Analysis(params)
+    tasks = [task for path in paths for task in plan_chunks(path, params, chunk_bytes)]
+
+    parallel = [t for t in tasks if t[1] != "json"]
+    pool = None
+    if workers > 1 and len(parallel) > 1:
+        pool = ProcessPoolExecutor(
+            max_workers=min(workers, len(parallel)),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    try:
+        # map() yields in submission order, so merging stays in file order
+        # while later chunks are still being processed.
+        pending = iter(pool.map(_analyze_chunk, parallel)) if pool else None
+        for task in tasks:
+            if task[1] == "json":
+                for chunk in _iter_json_batches(task):
+                    analysis.add(chunk)
+            elif pending is not None:
+                analysis.add(next(pending))
+            else:
+                analysis.add(_analyze_chunk(task))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return analysis
+
+
+def _fmt_ts(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_report(report: dict) -> str:
+    lines = []
+    for host, metrics in report["hosts"].items():
+        lines.append(f"== {host or 'local'} ==")
+        lines.append(f"{'metric':<28}{'count':>10}{'mean':>10}{'std':>10}{'min':>10}"
+                     f"{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'warn':>8}{'alert':>8}{'episodes':>10}")
+        for name, m in metrics.items():
+            pct = m["percentiles"]
+            lines.append(
+                f"{name[:27]:<28}{m['count']:>10}{m['mean']:>10.2f}{m['std']:>10.2f}{m['min']:>10.2f}"
+                f"{pct.get('p50', 0.0):>10.2f}{pct.get('p95', 0.0):>10.2f}{pct.get('p99', 0.0):>10.2f}"
+                f"{m['max']:>10.2f}{m['states']['WARN']:>8}{m['states']['ALERT']:>8}{m['episodes']:>10}"
+            )
+        lines.append("")
+
+    lines.append(f"Episodes: {report['episode_count']} (top {len(report['episodes'])})")
+    for ep in report["episodes"]:
+        duration = ep["end"] - ep["start"]
+        lines.append(
+            f"  {_fmt_ts(ep['start'])}  {duration:>8.0f}s  {ep['state']:<6}"
+            f"{ep['host'] or 'local'}/{ep['metric']}  ({ep['samples']} samples)"
+        )
+    lines.append("")
+
+    lines.append("Weekday x hour (WARN=1, ALERT=2)")
+    lines.append("     " + "".join(f"{h:>5}" for h in range(24)))
+    for day, row in zip(WEEKDAYS, report["heatmap"]):
+        lines.append(f"{day:<5}" + "".join(f"{int(v):>5}" for v in row))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="analyze.py", description="Offline analysis of recorded captures")
+    parser.add_argument("paths", nargs="+", help="binary capture, NDJSON or JSON export")
+    parser.add_argument("--workers", type=int, default=ANALYZE_WORKERS)
+    parser.add_argument("--chunk-mb", type=float, default=ANALYZE_CHUNK_BYTES / (1 << 20))
+    parser.add_argument("--window", type=float, default=WINDOW_SECONDS, help="baseline span in seconds")
+    parser.add_argument("--warn", type=float, default=STD_FACTOR_WARN)
+    parser.add_argument("--alert", type=float, default=STD_FACTOR_ALERT)
+    parser.add_argument("--min-samples", type=int, default=MIN_SAMPLES)
+    parser.add_argument("--gap", type=float, default=EPISODE_GAP_S,
+                        help="seconds between flagged samples that still count as one episode")
+    parser.add_argument("--top", type=int, default=10, help="episodes to list")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    params = Params(args.window, args.warn, args.alert, args.min_samples, args.gap)
+    started = time.perf_counter()
+    analysis = analyze(args.paths, params, args.workers, int(args.chunk_mb * (1 << 20)))
+    report = analysis.to_dict(args.top)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    print(format_report(report))
+    size = sum(os.path.getsize(p) for p in args.paths)
+    samples = sum(r.count for r in analysis.series.values())
+    print(f"\n{samples} values from {size / (1 << 20):.1f} MB in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
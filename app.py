@@ -1,13 +1,178 @@
+import os
 import sys
-from PySide6.QtWidgets import QApplication
-from ui_main import SystemMonitorUI
- 
+import signal
+import argparse
+import threading
+
+from config import (
+    APP_NAME,
+    EXPORTER_ENABLED,
+    EXPORTER_HOST,
+    EXPORTER_PORT,
+    STREAM_ENABLED,
+    STREAM_SOCKET_PATH,
+    FLEET_HOST,
+    FLEET_PORT,
+    SHM_RING_NAME,
+    NOTIFY_SINKS,
+    RULES_PATH,
+)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="app.py", description=APP_NAME)
+    parser.add_argument("--headless", action="store_true", help="run without GUI")
+    parser.add_argument("--exporter", action="store_true", default=EXPORTER_ENABLED,
+                        help="serve OpenMetrics on http://HOST:PORT/metrics")
+    parser.add_argument("--exporter-host", default=EXPORTER_HOST)
+    parser.add_argument("--exporter-port", type=int, default=EXPORTER_PORT)
+    parser.add_argument("--stream", action="store_true", default=STREAM_ENABLED,
+                        help="serve the live subscription feed on a local socket")
+    parser.add_argument("--stream-path", default=STREAM_SOCKET_PATH)
+    parser.add_argument("--agent", metavar="HOST[:PORT]",
+                        help="ship every tick to an aggregator")
+    parser.add_argument("--aggregate", action="store_true",
+                        help="accept agents and show the fleet view")
+    parser.add_argument("--fleet-host", default=FLEET_HOST)
+    parser.add_argument("--fleet-port", type=int, default=FLEET_PORT)
+    parser.add_argument("--shm", action="store_true",
+                        help="publish samples into a shared-memory ring buffer")
+    parser.add_argument("--shm-source", action="store_true",
+                        help="read samples from the ring instead of collecting them (GUI only)")
+    parser.add_argument("--shm-name", default=SHM_RING_NAME)
+    parser.add_argument("--record", metavar="PATH",
+                        help="append every tick to a binary capture for analyze.py")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="open a binary capture in replay mode (GUI only)")
+    parser.add_argument("--notify", metavar="SINK", action="append", default=list(NOTIFY_SINKS),
+                        help="send WARN/ALERT transitions to http(s)://URL, syslog[:HOST[:PORT]], "
+                             "file:PATH or desktop (repeatable)")
+    parser.add_argument("--rules", metavar="PATH", default=None,
+                        help=f"composite alert rules, one per line (default: {RULES_PATH} if it exists)")
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def load_rules(args):
+    path = args.rules
+    if path is None:
+        if not os.path.exists(RULES_PATH):
+            return None
+        path = RULES_PATH
+    from rules import RuleError, RuleSet
+    try:
+        return RuleSet.load(path)
+    except (OSError, RuleError) as e:
+        sys.exit(f"{path}: {e}")
+
+
+def build_publishers(args, self_usage=None):
+    publishers = []
+    if args.exporter:
+        from exporter import OpenMetricsExporter
+        exporter = OpenMetricsExporter(args.exporter_host, args.exporter_port, self_usage)
+        try:
+            exporter.start()
+            publishers.append(exporter)
+        except OSError as e:
+            print(f"metrics exporter disabled: {e}", file=sys.stderr)
+    if args.stream:
+        from streaming import SubscriptionServer
+        server = SubscriptionServer(path=args.stream_path)
+        try:
+            server.start()
+            publishers.append(server)
+        except OSError as e:
+            print(f"live feed disabled: {e}", file=sys.stderr)
+    if args.shm:
+        from shm_ring import ShmRingWriter
+        try:
+            publishers.append(ShmRingWriter(args.shm_name))
+        except FileExistsError as e:
+            print(f"shared memory ring disabled: {e}", file=sys.stderr)
+    if args.record:
+        from capture import CaptureRecorder
+        publishers.append(CaptureRecorder(args.record))
+    if args.agent:
+        from fleet import AgentPublisher
+        host, _, port = args.agent.partition(":")
+        agent = AgentPublisher(host, int(port) if port else FLEET_PORT)
+        agent.start()
+        publishers.append(agent)
+    if args.notify:
+        from notify import NotificationDispatcher, parse_sink
+        publishers.append(NotificationDispatcher([parse_sink(spec) for spec in args.notify]))
+    return publishers
+
+
+def stop_all(services):
+    for service in services:
+        if service is not None:
+            service.stop()
+
+
+def build_aggregator(args, rules=None):
+    if not args.aggregate:
+        return None
+    from fleet import Aggregator
+    aggregator = Aggregator(args.fleet_host, args.fleet_port, rules=rules)
+    try:
+        aggregator.start()
+    except OSError as e:
+        print(f"fleet aggregator disabled: {e}", file=sys.stderr)
+        return None
+    return aggregator
+
+
+def run_headless(args):
+    from headless import HeadlessMonitor
+    from instrumentation import SelfUsage
+
+    rules = load_rules(args)
+    aggregator = build_aggregator(args, rules)
+    self_usage = SelfUsage()
+    publishers = build_publishers(args, self_usage)
+    monitor = HeadlessMonitor(publishers=publishers, rules=rules, self_usage=self_usage)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    try:
+        monitor.run(stop_event)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_all(publishers + [aggregator])
+
+
 def main():
+    args = parse_args(sys.argv[1:])
+    if args.headless:
+        run_headless(args)
+        return
+
+    from PySide6.QtWidgets import QApplication
+    from ui_main import SystemMonitorUI
+
     app = QApplication(sys.argv)
-    app.setApplicationName("SystemMonitor Pro AI")
-    window = SystemMonitorUI()
+    app.setApplicationName(APP_NAME)
+    backend = None
+    if args.shm_source:
+        from shm_ring import ShmRingSource
+        backend = ShmRingSource(args.shm_name)
+
+    from instrumentation import SelfUsage
+
+    rules = load_rules(args)
+    self_usage = SelfUsage()
+    publishers = build_publishers(args, self_usage)
+    aggregator = build_aggregator(args, rules)
+    window = SystemMonitorUI(publishers=publishers, aggregator=aggregator, backend=backend, rules=rules,
+                             self_usage=self_usage)
     window.show()
-    sys.exit(app.exec())
+    if args.replay:
+        window.start_replay(args.replay)
+    code = app.exec()
+    stop_all(publishers + [aggregator])
+    sys.exit(code)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,310 @@
+"""
+Detector backtesting and parameter sweeps.
+
+Usage:
+    python backtest.py week.smcap --window 30,60,120 --warn 1.5,2,2.5 \
+        --alert 2.5,3,3.5 --incidents incidents.json
+
+Windows are baseline spans in seconds, as for the live detector, so a sweep
+means the same thing whatever sampling rate the capture was recorded at.
+
+Replays recorded series through the vectorized detector path
+(monitoring.rolling_states) for every combination of the given parameters and
+ranks the combinations. With an incident file, each combination is scored
+by precision, recall and detection delay against the labelled incidents.
+Otherwise alert samples and episodes per day are reported.
+
+Incident files are JSON lists of {"start", "end", "host"?, "metric"?, "label"?}.
+Timestamps may be ISO strings or Unix seconds; host and metric accept
+shell-style patterns and default to every series.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from fnmatch import fnmatchcase
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import (
+    ANALYZE_WORKERS,
+    BACKTEST_TOLERANCE_S,
+    EPISODE_GAP_S,
+    WINDOW_SECONDS,
+    WINDOW_MAX_SAMPLES,
+    STD_FACTOR_WARN,
+    STD_FACTOR_ALERT,
+    MIN_SAMPLES,
+)
+from analyze import ALERT, WARN, Params, find_episodes
+from capture import (
+    detect_format,
+    iter_binary,
+    iter_json_array,
+    iter_ndjson,
+    normalize,
+    open_mmap,
+    parse_timestamp,
+)
+from monitoring import STATE_CODES
+
+Key = Tuple[str, str]
+Series = Dict[Key, Tuple[np.ndarray, np.ndarray]]
+
+# Series shared with pool workers; sent once per worker through the initializer.
+_SERIES: Series = {}
+_INCIDENTS: List[dict] = []
+
+
+def load_series(paths: Sequence[str], hosts: str = "*", metrics: str = "*") -> Series:
+    """
+    Reads sample series from captures into (timestamps, values) arrays per
+    (host, metric), sorted by time. Event-log records are ignored.
+    """
+    collected: Dict[Key, Tuple[List[float], List[float]]] = {}
+
+    def add(host, ts, sample):
+        if not fnmatchcase(host, hosts):
+            return
+        for name, (value, _) in sample.items():
+            entry = collected.get((host, name))
+            if entry is None:
+                if not fnmatchcase(name, metrics):
+                    continue
+                entry = collected[(host, name)] = ([], [])
+            entry[0].append(ts)
+            entry[1].append(value)
+
+    for path in paths:
+        mm = open_mmap(path)
+        if mm is None:
+            continue
+        try:
+            fmt = detect_format(mm)
+            if fmt == "binary":
+                for host, ts, sample in iter_binary(mm):
+                    add(host, ts, sample)
+                continue
+            records = iter_json_array(mm) if fmt == "json" else iter_ndjson(mm, 0, len(mm))
+            for record in records:
+                item = normalize(record)
+                if item is not None and item[0] == "sample":
+                    add(item[1], item[2], item[3])
+        finally:
+            mm.close()
+
+    series: Series = {}
+    for key, (ts_list, value_list) in collected.items():
+        ts = np.asarray(ts_list)
+        values = np.asarray(value_list)
+        order = np.argsort(ts, kind="stable")
+        series[key] = (ts[order], values[order])
+    return series
+
+
+def load_incidents(path: str) -> List[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    incidents = []
+    for entry in raw:
+        incidents.append({
+            "start": parse_timestamp(entry["start"]),
+            "end": parse_timestamp(entry.get("end", entry["start"])),
+            "host": entry.get("host", "*"),
+            "metric": entry.get("metric", "*"),
+            "label": entry.get("label", ""),
+        })
+    return incidents
+
+
+def parameter_grid(windows: Sequence[float], warns: Sequence[float], alerts: Sequence[float],
+                   min_samples: Sequence[int], gap_s: float = EPISODE_GAP_S,
+                   max_samples: int = WINDOW_MAX_SAMPLES) -> List[Params]:
+    return [
+        Params(w, warn, alert, m, gap_s, max_samples)
+        for w, warn, alert, m in itertools.product(windows, warns, alerts, min_samples)
+        if alert > warn and m <= max_samples
+    ]
+
+
+def backtest(series: Series, params: Params, incidents: Sequence[dict] = (),
+             level: int = ALERT, tolerance_s: float = BACKTEST_TOLERANCE_S) -> dict:
+    """
+    Scores one parameter set over every series. An episode counts as a true
+    positive when it overlaps an incident window widened by `tolerance_s`.
+    """
+    states = np.zeros(len(STATE_CODES), dtype=np.int64)
+    n_episodes = 0
+    true_positive = 0
+    span = 0.0
+    detected_at = [None] * len(incidents)
+
+    for (host, metric), (ts, values) in series.items():
+        if not len(ts):
+            continue
+        z, codes = params.states(values, ts)
+        states += np.bincount(codes, minlength=len(STATE_CODES))
+        span += float(ts[-1] - ts[0])
+
+        episodes = find_episodes(ts, codes, z, params.gap_s, level)
+        n_episodes += len(episodes)
+        relevant = [
+            i for i, inc in enumerate(incidents)
+            if fnmatchcase(host, inc["host"]) and fnmatchcase(metric, inc["metric"])
+        ]
+        if not episodes or not relevant:
+            continue
+
+        ep = np.asarray(episodes)
+        lo = np.array([incidents[i]["start"] - tolerance_s for i in relevant])
+        hi = np.array([incidents[i]["end"] + tolerance_s for i in relevant])
+        overlap = (ep[:, 0:1] <= hi) & (ep[:, 1:2] >= lo)
+        true_positive += int(overlap.any(axis=1).sum())
+
+        for col, i in enumerate(relevant):
+            hits = np.flatnonzero(overlap[:, col])
+            if len(hits):
+                first = float(ep[hits[0], 0])
+                if detected_at[i] is None or first < detected_at[i]:
+                    detected_at[i] = first
+
+    result = asdict(params)
+    result.update({
+        "alert_samples": int(states[ALERT]),
+        "warn_samples": int(states[WARN]),
+        "episodes": n_episodes,
+        "episodes_per_day": n_episodes * 86400.0 / span if span else 0.0,
+    })
+    if incidents:
+        detected = [i for i, t in enumerate(detected_at) if t is not None]
+        precision = true_positive / n_episodes if n_episodes else 0.0
+        recall = len(detected) / len(incidents)
+        delays = [max(0.0, detected_at[i] - incidents[i]["start"]) for i in detected]
+        result.update({
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "detected": len(detected),
+            "mean_delay_s": sum(delays) / len(delays) if delays else None,
+        })
+    return result
+
+
+def _init_worker(series: Series, incidents: List[dict]):
+    global _SERIES, _INCIDENTS
+    _SERIES = series
+    _INCIDENTS = incidents
+
+
+def _run_one(task) -> dict:
+    params, level, tolerance_s = task
+    return backtest(_SERIES, params, _INCIDENTS, level, tolerance_s)
+
+
+def sweep(series: Series, grid: Sequence[Params], incidents: Sequence[dict] = (),
+          level: int = ALERT, tolerance_s: float = BACKTEST_TOLERANCE_S,
+          workers: int = ANALYZE_WORKERS) -> List[dict]:
+    """
+    Runs backtest() for every parameter set, in parallel when the grid is
+    larger than one. Results are ranked best first: by F1 when incidents are
+    given, otherwise by fewest episodes.
+    """
+    incidents = list(incidents)
+    tasks = [(params, level, tolerance_s) for params in grid]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(tasks)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(series, incidents),
+        ) as pool:
+            results = list(pool.map(_run_one, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        results = [backtest(series, params, incidents, level, tolerance_s) for params in grid]
+
+    if incidents:
+        results.sort(key=lambda r: (-r["f1"], -r["recall"], r["episodes"]))
+    else:
+        results.sort(key=lambda r: (r["episodes"], r["alert_samples"]))
+    return results
+
+
+def _parse_list(text: str, cast):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def format_results(results: List[dict], top: int) -> str:
+    has_labels = bool(results) and "f1" in results[0]
+    header = f"{'window':>7}{'warn':>7}{'alert':>7}{'min':>6}{'alerts':>10}{'episodes':>10}{'ep/day':>9}"
+    if has_labels:
+        header += f"{'prec':>7}{'recall':>8}{'f1':>7}{'delay s':>9}"
+    lines = [header]
+    for r in results[:top]:
+        line = (f"{r['window_seconds']:>7g}{r['warn_factor']:>7.2f}{r['alert_factor']:>7.2f}{r['min_samples']:>6}"
+                f"{r['alert_samples']:>10}{r['episodes']:>10}{r['episodes_per_day']:>9.1f}")
+        if has_labels:
+            delay = r["mean_delay_s"]
+            line += (f"{r['precision']:>7.2f}{r['recall']:>8.2f}{r['f1']:>7.2f}"
+                     f"{'-' if delay is None else f'{delay:.0f}':>9}")
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="backtest.py", description="Detector backtesting and parameter sweeps")
+    parser.add_argument("paths", nargs="+", help="binary capture, NDJSON or JSON profiling export")
+    parser.add_argument("--window", default=f"{WINDOW_SECONDS:g}", help="comma-separated window spans in seconds")
+    parser.add_argument("--warn", default=str(STD_FACTOR_WARN), help="comma-separated WARN factors")
+    parser.add_argument("--alert", default=str(STD_FACTOR_ALERT), help="comma-separated ALERT factors")
+    parser.add_argument("--min-samples", default=str(MIN_SAMPLES), help="comma-separated minimum samples")
+    parser.add_argument("--gap", type=float, default=EPISODE_GAP_S)
+    parser.add_argument("--level", choices=("WARN", "ALERT"), default="ALERT",
+                        help="lowest state that opens an episode")
+    parser.add_argument("--incidents", help="JSON file with labelled incidents")
+    parser.add_argument("--tolerance", type=float, default=BACKTEST_TOLERANCE_S,
+                        help="seconds an episode may lie outside an incident and still match it")
+    parser.add_argument("--hosts", default="*", help="host pattern, e.g. 'db-*'")
+    parser.add_argument("--metrics", default="*", help="metric pattern, e.g. 'CPU*'")
+    parser.add_argument("--workers", type=int, default=ANALYZE_WORKERS)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="print all results as JSON")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    series = load_series(args.paths, args.hosts, args.metrics)
+    loaded = time.perf_counter()
+    if not series:
+        print("no sample series found", file=sys.stderr)
+        sys.exit(1)
+
+    grid = parameter_grid(
+        _parse_list(args.window, float),
+        _parse_list(args.warn, float),
+        _parse_list(args.alert, float),
+        _parse_list(args.min_samples, int),
+        args.gap,
+    )
+    incidents = load_incidents(args.incidents) if args.incidents else []
+    results = sweep(series, grid, incidents, STATE_CODES.index(args.level), args.tolerance, args.workers)
+    elapsed = time.perf_counter() - loaded
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    print(format_results(results, args.top))
+    samples = sum(len(ts) for ts, _ in series.values())
+    rate = samples * len(grid) / elapsed if elapsed else 0.0
+    print(f"\n{len(series)} series, {samples} samples, {len(grid)} parameter sets: "
+          f"loaded in {loaded - started:.2f}s, swept in {elapsed:.2f}s ({rate / 1e6:.1f}M samples/s)")
+
+
+if __name__ == "__main__":
+    main()
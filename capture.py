@@ -0,0 +1,246 @@
+import codecs
+import json
+import mmap
+import os
+import socket
+import struct
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import CAPTURE_SYNC_SAMPLES
+from fleet import (
+    FrameEncoder,
+    MAGIC,
+    MSG_HELLO,
+    MSG_NAMES,
+    MSG_SAMPLE,
+    _HEADER,
+    decode_names,
+    decode_sample,
+)
+
+# Binary captures (.smcap) are a plain sequence of fleet frames. Every
+# `sync_every` samples the recorder repeats HELLO and the full name table,
+# and appends (timestamp, offset) of that sync point to the ".idx" sidecar.
+# Any sync point is a valid place to start decoding.
+INDEX_SUFFIX = ".idx"
+_INDEX_ENTRY = struct.Struct("!dQ")
+
+Sample = Tuple[str, float, Dict[str, Tuple[float, str]]]
+
+
+class CaptureRecorder:
+    """
+    Publisher that appends every tick to a binary capture file.
+    """
+
+    def __init__(self, path: str, hostname: Optional[str] = None, sync_every: int = CAPTURE_SYNC_SAMPLES):
+        self.path = path
+        self.hostname = hostname or socket.gethostname()
+        self.sync_every = sync_every
+        self._file = open(path, "ab")
+        self._index = open(path + INDEX_SUFFIX, "ab")
+        self._encoder = FrameEncoder()
+        self._count = 0
+
+    def publish(self, timestamp: float, raw_metrics, statuses=None):
+        if self._count % self.sync_every == 0:
+            # The data an index entry points past must be on disk before the entry.
+            self._file.flush()
+            self._index.write(_INDEX_ENTRY.pack(timestamp, self._file.tell()))
+            self._index.flush()
+            self._encoder.resync()
+            self._file.write(self._encoder.hello(self.hostname))
+        self._file.write(self._encoder.encode(timestamp, raw_metrics))
+        self._count += 1
+
+    def stop(self):
+        self._file.close()
+        self._index.close()
+
+
+def open_mmap(path: str) -> Optional[mmap.mmap]:
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def detect_format(mm: mmap.mmap) -> str:
+    if mm[:2] == MAGIC:
+        return "binary"
+    head = mm[:4096].lstrip()
+    if head.startswith(b"["):
+        return "json"
+    return "ndjson"
+
+
+def read_index(path: str) -> List[Tuple[float, int]]:
+    try:
+        with open(path + INDEX_SUFFIX, "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    usable = len(data) - len(data) % _INDEX_ENTRY.size
+    return [_INDEX_ENTRY.unpack_from(data, i) for i in range(0, usable, _INDEX_ENTRY.size)]
+
+
+def scan_sync_points(mm: mmap.mmap) -> List[Tuple[float, int]]:
+    """
+    Fallback when the sidecar index is missing: hops over frame headers
+    (payloads are skipped, not decoded) and reports every HELLO frame.
+    """
+    points = []
+    pos = 0
+    size = len(mm)
+    pending = None
+    while pos + _HEADER.size <= size:
+        magic, _, msg_type, length = _HEADER.unpack_from(mm, pos)
+        if magic != MAGIC:
+            break
+        if pos + _HEADER.size + length > size:
+            break
+        if msg_type == MSG_HELLO:
+            pending = pos
+        elif msg_type == MSG_SAMPLE and pending is not None and length >= 8:
+            ts = struct.unpack_from("!d", mm, pos + _HEADER.size)[0]
+            points.append((ts, pending))
+            pending = None
+        pos += _HEADER.size + length
+    return points
+
+
+def sync_points(path: str, mm: mmap.mmap) -> List[Tuple[float, int]]:
+    points = read_index(path)
+    return [(ts, off) for ts, off in points if off < len(mm)] or scan_sync_points(mm)
+
+
+def iter_binary(mm: mmap.mmap, start: int = 0, end: Optional[int] = None) -> Iterator[Sample]:
+    """
+    Decodes frames whose header starts in [start, end). `start` must be a sync point.
+    Stops at an incomplete frame (a capture that is still being written).
+    """
+    end = len(mm) if end is None else end
+    host = ""
+    names: Dict[int, Tuple[str, str]] = {}
+    pos = start
+    while pos < end and pos + _HEADER.size <= len(mm):
+        magic, _, msg_type, length = _HEADER.unpack_from(mm, pos)
+        if magic != MAGIC:
+            break
+        body = pos + _HEADER.size
+        if body + length > len(mm):
+            break
+        payload = mm[body:body + length]
+        pos = body + length
+
+        if msg_type == MSG_SAMPLE:
+            ts, items = decode_sample(payload)
+            yield host, ts, {names[i][0]: (v, names[i][1]) for i, v in items if i in names}
+        elif msg_type == MSG_NAMES:
+            for mid, name, unit in decode_names(payload):
+                names[mid] = (name, unit)
+        elif msg_type == MSG_HELLO:
+            host = payload.decode("utf-8", "replace")
+
+
+def ndjson_chunks(mm: mmap.mmap, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Splits the file into ranges of roughly `chunk_bytes`, each ending on a newline.
+    """
+    size = len(mm)
+    chunks = []
+    start = 0
+    while start < size:
+        end = min(size, start + chunk_bytes)
+        if end < size:
+            nl = mm.find(b"\n", end)
+            end = size if nl < 0 else nl + 1
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def iter_ndjson(mm: mmap.mmap, start: int, end: int) -> Iterator[dict]:
+    pos = start
+    while pos < end:
+        nl = mm.find(b"\n", pos, end)
+        stop = end if nl < 0 else nl
+        line = mm[pos:stop].strip()
+        pos = stop + 1
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def iter_json_array(mm: mmap.mmap, chunk_bytes: int = 1 << 20) -> Iterator[dict]:
+    """
+    Streams the objects of a top-level JSON array (the existing profiling and
+    event exports) without loading the whole document.
+    """
+    decoder = json.JSONDecoder()
+    # Chunk boundaries can split a multibyte character; the incremental
+    # decoder keeps the partial bytes for the next chunk.
+    text = codecs.getincrementaldecoder("utf-8")("replace")
+    buf = ""
+    pos = mm[:4096].find(b"[") + 1
+    size = len(mm)
+    eof = False
+    while True:
+        i = 0
+        while True:
+            while i < len(buf) and buf[i] in " \t\r\n,":
+                i += 1
+            if i < len(buf) and buf[i] == "]":
+                return
+            try:
+                obj, i2 = decoder.raw_decode(buf, i)
+            except ValueError:
+                break
+            if i2 == len(buf) and not eof:
+                break
+            i = i2
+            yield obj
+        if eof:
+            return
+        chunk = mm[pos:pos + chunk_bytes]
+        pos += chunk_bytes
+        eof = pos >= size
+        buf = buf[i:] + text.decode(chunk, final=eof)
+
+
+def parse_timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def normalize(record: dict):
+    """
+    Maps one capture record onto
+      ("sample", host, ts, {name: (value, unit)}) for profiling snapshots, or
+      ("event", host, ts, metric, state, value) for event-log entries.
+    Returns None for records of neither shape.
+    """
+    if not isinstance(record, dict) or "timestamp" not in record:
+        return None
+    ts = parse_timestamp(record["timestamp"])
+    host = record.get("host", "")
+
+    metrics = record.get("metrics")
+    if isinstance(metrics, dict):
+        out = {}
+        for name, m in metrics.items():
+            if isinstance(m, dict):
+                out[name] = (float(m["value"]), m.get("unit", ""))
+            elif isinstance(m, (list, tuple)):
+                out[name] = (float(m[0]), m[1] if len(m) > 1 else "")
+            else:
+                out[name] = (float(m), "")
+        return ("sample", host, ts, out)
+
+    if "metric" in record and "status" in record:
+        return ("event", host, ts, record["metric"], record["status"], float(record.get("value", 0.0)))
+    return None
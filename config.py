@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 APP_NAME = "SystemMonitor Pro AI"
 APP_TITLE = "SystemMonitor Pro – AI System Monitoring"
 APP_COMPANY = "BYLICKILABS – Intelligence Systems & Communications"
@@ -8,11 +11,32 @@ GITHUB_URL = "https://github.com/bylickilabs/SystemMonitorProAI"
 
 UPDATE_INTERVAL_MS = 1000
 
+ADAPTIVE_SAMPLING = False
+ADAPTIVE_FAST_INTERVAL_MS = 250
+ADAPTIVE_MAX_INTERVAL_MS = 10000
+ADAPTIVE_CALM_TICKS = 30
+ADAPTIVE_STRETCH_FACTOR = 1.5
+
 WINDOW_SIZE = 60
+WINDOW_SECONDS = 60.0  # baseline span of the live detector, whatever the (adaptive) sampling rate
+WINDOW_MAX_SAMPLES = 600
 STD_FACTOR_WARN = 1.5
 STD_FACTOR_ALERT = 2.5
 MIN_SAMPLES = 10
 
+QUANTILE_SKETCHES = True
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_MAX_BINS = 2048
+SKETCH_HOURS_KEPT = 24
+SKETCH_DAYS_KEPT = 7
+SKETCH_MIN_SAMPLES = 300
+SKETCH_REFRESH_SAMPLES = 60
+
+MULTIVARIATE_ENABLED = True
+MV_REFRESH_TICKS = 32
+MV_VARIANCE_FLOOR = 0.01
+MV_TOP_CONTRIBUTORS = 3
+
 THEME_BACKGROUND = "#020617"
 THEME_TEXT = "#e5e7eb"
 FONT_FAMILY = "Segoe UI"
@@ -22,4 +46,79 @@ NEON_TEXT = "#f9fafb"
 NEON_ACCENT = "#f97316"
 NEON_SECONDARY = "#22c55e"
 
-AUTOSTART_REG_NAME = "SystemMonitorProAI"
\ No newline at end of file
+AUTOSTART_REG_NAME = "SystemMonitorProAI"
+HISTORY_ENABLED = True
+HISTORY_BLOCK_SIZE = 1024
+HISTORY_RETENTION_HOURS = 168
+
+PUBLISH_ERROR_LOG_S = 60.0  # a failing publisher is reported on stderr at most this often
+
+EXPORTER_ENABLED = False
+EXPORTER_HOST = "127.0.0.1"
+EXPORTER_PORT = 9839
+
+STREAM_ENABLED = False
+STREAM_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "systemmonitor_pro_ai.sock")
+STREAM_TCP_HOST = "127.0.0.1"
+STREAM_TCP_PORT = 9840
+STREAM_CLIENT_BUFFER = 64
+
+FLEET_HOST = "127.0.0.1"
+FLEET_PORT = 9841
+FLEET_POOL_THRESHOLD = 64
+FLEET_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+FLEET_POOL_RETRY_S = 30.0  # after a failed pool start, score inline this long before trying again
+FLEET_FLUSH_MS = 250
+FLEET_AGENT_QUEUE = 300
+FLEET_STALE_S = 10
+
+SHM_RING_NAME = "systemmonitor_pro_ai"
+SHM_RING_CAPACITY = 3600
+SHM_RING_MAX_METRICS = 256
+
+CAPTURE_SYNC_SAMPLES = 600
+ANALYZE_CHUNK_BYTES = 32 * 1024 * 1024
+ANALYZE_WORKERS = os.cpu_count() or 1
+EPISODE_GAP_S = 30.0
+BACKTEST_TOLERANCE_S = 60.0
+
+EVENTLOG_MAX_ROWS = 5000
+EVENT_HISTORY_CHUNK = 4096
+EVENT_HISTORY_MAX = 1_000_000
+
+REPLAY_SPEEDS = (1, 10, 60, 100, 1000)
+REPLAY_FRAME_MS = 50
+REPLAY_CHECKPOINT_S = 300
+REPLAY_WARMUP_S = 600
+REPLAY_MAX_CHECKPOINTS = 512
+
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".systemmonitor_pro_ai")
+HEATMAP_STORE_PATH = os.path.join(DATA_DIR, "heatmap.npz")
+HEATMAP_HALF_LIFE_DAYS = 14
+HEATMAP_REPAINT_MS = 250
+HEATMAP_SAVE_INTERVAL_MS = 60000
+
+EXPORT_BUFFER_BYTES = 1024 * 1024
+EXPORT_PROGRESS_MS = 100
+
+NETATTR_FD_BUDGET = 2000
+NETATTR_REFRESH_MS = 3000
+NETATTR_TOP_N = 15
+
+NOTIFY_SINKS = ()
+NOTIFY_BATCH_S = 2.0
+NOTIFY_BATCH_MAX = 100
+NOTIFY_MAX_BATCHES_PER_MIN = 20
+NOTIFY_DEDUP_S = 300.0
+NOTIFY_RETRIES = 5
+NOTIFY_BACKOFF_S = 1.0
+NOTIFY_BACKOFF_MAX_S = 60.0
+NOTIFY_QUEUE_SIZE = 1000
+NOTIFY_TIMEOUT_S = 5.0
+
+RULES_PATH = os.path.join(DATA_DIR, "rules.txt")
+
+DISK_DETAIL_ENABLED = True
+DISK_IGNORE_DEVICES = ("loop", "ram", "zram", "fd", "sr")
+DISK_EXTRA_FSTYPES = ("zfs",)
+DISK_MOUNT_REFRESH_S = 30.0
@@ -0,0 +1,264 @@
+import os
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import psutil
+
+from config import DISK_IGNORE_DEVICES, DISK_EXTRA_FSTYPES, DISK_MOUNT_REFRESH_S
+
+try:
+    import select
+    _POLLPRI = select.POLLPRI
+except (ImportError, AttributeError):
+    select = None
+    _POLLPRI = 0
+
+DEVICE_PREFIX = "IO "
+MOUNT_PREFIX = "Mount "
+SECTOR_BYTES = 512  # /proc/diskstats counts 512-byte sectors on every device
+
+# (reads, bytes read, ms reading, writes, bytes written, ms writing)
+DiskCounters = Tuple[int, int, int, int, int, int]
+
+_OCTAL_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+
+def parse_diskstats(data: bytes, devices: Optional[Set[str]] = None) -> Dict[str, DiskCounters]:
+    """
+    Counters per device from the contents of /proc/diskstats, limited to
+    `devices` if given.
+    """
+    counters: Dict[str, DiskCounters] = {}
+    for line in data.split(b"\n"):
+        head = line.split(None, 3)
+        if len(head) < 4:
+            continue
+        name = head[2].decode("utf-8", "replace")
+        if devices is not None and name not in devices:
+            continue
+        fields = line.split()
+        if len(fields) < 14:
+            continue
+        counters[name] = (
+            int(fields[3]), int(fields[5]) * SECTOR_BYTES, int(fields[6]),
+            int(fields[7]), int(fields[9]) * SECTOR_BYTES, int(fields[10]),
+        )
+    return counters
+
+
+def real_fstypes(path: str = "/proc/filesystems") -> Set[str]:
+    """
+    Filesystem types backed by a block device: those not flagged "nodev",
+    plus DISK_EXTRA_FSTYPES.
+    """
+    types = set(DISK_EXTRA_FSTYPES)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                flag, _, fstype = line.rstrip("\n").rpartition("\t")
+                if flag.strip() != "nodev":
+                    types.add(fstype.strip())
+    except OSError:
+        pass
+    return types
+
+
+def parse_mountinfo(data: bytes, fstypes: Set[str]) -> List[Tuple[str, str]]:
+    """
+    (mount point, fstype) per filesystem of a real type, sorted by mount
+    point. Bind mounts and other repeat mounts of a filesystem (same device
+    number) collapse into the shortest mount point.
+    """
+    by_device: Dict[bytes, Tuple[str, str]] = {}
+    for line in data.split(b"\n"):
+        fields = line.split()
+        if len(fields) < 7:
+            continue
+        try:
+            sep = fields.index(b"-", 6)
+        except ValueError:
+            continue
+        if sep + 1 >= len(fields):
+            continue
+        fstype = fields[sep + 1].decode("utf-8", "replace")
+        if fstype not in fstypes:
+            continue
+        mountpoint = _OCTAL_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), os.fsdecode(fields[4]))
+        known = by_device.get(fields[2])
+        if known is None or len(mountpoint) < len(known[0]):
+            by_device[fields[2]] = (mountpoint, fstype)
+    return sorted(by_device.values())
+
+
+class MountTable:
+    """
+    Mounted real filesystems, one entry per filesystem.
+
+    On Linux /proc/self/mountinfo is kept open and only re-read when the
+    kernel flags a change of the mount table on it (POLLPRI), so a quiet
+    host costs one poll() per tick however many bind mounts it has.
+    Elsewhere psutil.disk_partitions() is re-read every `refresh_s`.
+    """
+
+    def __init__(self, path: str = "/proc/self/mountinfo", filesystems: str = "/proc/filesystems",
+                 refresh_s: float = DISK_MOUNT_REFRESH_S):
+        self.path = path
+        self.refresh_s = refresh_s
+        self.mounts: List[Tuple[str, str]] = []
+        self.reloads = 0
+        self._fstypes = real_fstypes(filesystems)
+        self._loaded_at: Optional[float] = None
+        self._file = None
+        self._poller = None
+        try:
+            self._file = open(path, "rb")
+        except OSError:
+            return
+        if select is not None and hasattr(select, "poll"):
+            self._poller = select.poll()
+            self._poller.register(self._file, _POLLPRI)
+
+    def _changed(self, now: float) -> bool:
+        if self._loaded_at is None:
+            return True
+        if self._poller is not None:
+            return bool(self._poller.poll(0))
+        return now - self._loaded_at >= self.refresh_s
+
+    def refresh(self, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        now = time.monotonic() if now is None else now
+        if not self._changed(now):
+            return self.mounts
+        if self._file is not None:
+            # Reading the file through the polled descriptor clears the change flag.
+            self._file.seek(0)
+            self.mounts = parse_mountinfo(self._file.read(), self._fstypes)
+        else:
+            try:
+                partitions = psutil.disk_partitions(all=False)
+            except Exception:
+                partitions = []
+            self.mounts = sorted({p.mountpoint: (p.mountpoint, p.fstype) for p in partitions}.values())
+        self._loaded_at = now
+        self.reloads += 1
+        return self.mounts
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class DiskCollector:
+    """
+    Per-device throughput, IOPS and latency plus capacity per mounted
+    filesystem, as separate metrics:
+
+        "IO nvme0n1 Read (kB/s)", "IO nvme0n1 Write (kB/s)",
+        "IO nvme0n1 Ops (ops/s)", "IO nvme0n1 Latency (ms)", "Mount /home (%)"
+
+    Rates are counter deltas between calls, like the network rates.
+    Latency is the average time per completed request; it is left out of
+    ticks without completed requests, where it is undefined (reporting 0
+    would look like a sudden drop to the detector). Only whole devices
+    are reported (those in /sys/block, minus DISK_IGNORE_DEVICES prefixes);
+    the device list is re-read when /proc/diskstats gains or loses lines.
+    Without /proc/diskstats, psutil's per-disk counters are used.
+    """
+
+    def __init__(self, proc: str = "/proc", sys_block: str = "/sys/block",
+                 ignore: Tuple[str, ...] = DISK_IGNORE_DEVICES):
+        self.diskstats_path = os.path.join(proc, "diskstats")
+        self.sys_block = sys_block
+        self.ignore = tuple(ignore)
+        self.use_proc = os.path.exists(self.diskstats_path)
+        self.mounts = MountTable(os.path.join(proc, "self", "mountinfo"), os.path.join(proc, "filesystems"))
+
+        self._devices: Set[str] = set()
+        self._lines = -1
+        self._names: Dict[str, Tuple[str, str, str, str]] = {}
+        self._mount_names: Dict[str, str] = {}
+        self._last_time = time.monotonic()
+        self._last: Dict[str, DiskCounters] = self._read_counters()
+
+    def _whole_devices(self, names) -> Set[str]:
+        try:
+            block = set(os.listdir(self.sys_block))
+        except OSError:
+            block = None
+        return {
+            n for n in names
+            if (block is None or n in block) and not n.startswith(self.ignore)
+        }
+
+    def _read_counters(self) -> Dict[str, DiskCounters]:
+        if not self.use_proc:
+            try:
+                per_disk = psutil.disk_io_counters(perdisk=True) or {}
+            except Exception:
+                return {}
+            return {
+                name: (c.read_count, c.read_bytes, c.read_time, c.write_count, c.write_bytes, c.write_time)
+                for name, c in per_disk.items() if not name.startswith(self.ignore)
+            }
+
+        try:
+            with open(self.diskstats_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return {}
+        lines = data.count(b"\n")
+        if lines != self._lines:
+            # Devices or partitions were added or removed (or this is the first read).
+            self._lines = lines
+            self._devices = self._whole_devices(parse_diskstats(data))
+        return parse_diskstats(data, self._devices)
+
+    def _device_names(self, device: str) -> Tuple[str, str, str, str]:
+        names = self._names.get(device)
+        if names is None:
+            base = DEVICE_PREFIX + device
+            names = self._names[device] = (
+                f"{base} Read (kB/s)", f"{base} Write (kB/s)", f"{base} Ops (ops/s)", f"{base} Latency (ms)",
+            )
+        return names
+
+    def collect(self, now: Optional[float] = None) -> Dict[str, Tuple[float, str]]:
+        now = time.monotonic() if now is None else now
+        metrics: Dict[str, Tuple[float, str]] = {}
+
+        counters = self._read_counters()
+        elapsed = max(0.1, now - self._last_time)
+        last = self._last
+        for device, c in counters.items():
+            prev = last.get(device)
+            if prev is None:
+                continue
+            reads = max(0, c[0] - prev[0])
+            writes = max(0, c[3] - prev[3])
+            ops = reads + writes
+            busy_ms = max(0, c[2] - prev[2]) + max(0, c[5] - prev[5])
+            read_name, write_name, ops_name, latency_name = self._device_names(device)
+            metrics[read_name] = (max(0, c[1] - prev[1]) / 1024 / elapsed, "kB/s")
+            metrics[write_name] = (max(0, c[4] - prev[4]) / 1024 / elapsed, "kB/s")
+            metrics[ops_name] = (ops / elapsed, "ops/s")
+            if ops:
+                metrics[latency_name] = (busy_ms / ops, "ms")
+        self._last = counters
+        self._last_time = now
+
+        mount_names = self._mount_names
+        for mountpoint, _ in self.mounts.refresh(now):
+            try:
+                usage = psutil.disk_usage(mountpoint)
+            except OSError:
+                continue
+            if not usage.total:
+                continue
+            name = mount_names.get(mountpoint)
+            if name is None:
+                name = mount_names[mountpoint] = f"{MOUNT_PREFIX}{mountpoint} (%)"
+            metrics[name] = (usage.percent, "%")
+
+        return metrics
@@ -0,0 +1,172 @@
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import EXPORT_BUFFER_BYTES
+from timeseries import HistoryStore
+
+FORMATS = ("ndjson", "csv", "json")
+CSV_HEADER = ("kind", "timestamp", "metric", "value", "unit", "status")
+
+_dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def format_for_path(path: str) -> Tuple[str, bool]:
+    """
+    (format, gzip) from the file name: .ndjson/.jsonl, .csv or .json,
+    optionally followed by .gz.
+    """
+    name = path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    ext = os.path.splitext(name)[1]
+    if ext in (".ndjson", ".jsonl"):
+        return "ndjson", compressed
+    if ext in (".csv", ".json"):
+        return ext[1:], compressed
+    raise ValueError(f"unsupported export format: {path}")
+
+
+def event_batches(chunks: List[list], fmt: str) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (rows, text) per event chunk. JSON records have the event-log
+    shape that capture.normalize() reads back.
+    """
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if fmt == "csv":
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator="\n").writerows(
+                ("event", f"{ts:.3f}", metric, value, "", state) for ts, metric, state, value in chunk
+            )
+            yield len(chunk), buf.getvalue()
+        else:
+            yield len(chunk), "".join(
+                f'{{"timestamp":{ts:.3f},"metric":{_dumps(metric)},"status":{_dumps(state)},"value":{_dumps(value)}}}\n'
+                for ts, metric, state, value in chunk
+            )
+
+
+def _csv_field(text: str) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="").writerow((text,))
+    return buf.getvalue()
+
+
+def history_batches(history: HistoryStore, fmt: str) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (rows, text) per decoded block, one series after the other.
+    JSON records are single-metric profiling samples.
+
+    Names and units are encoded once per series; per row only the numbers
+    are formatted (repr() of a finite float is valid JSON and CSV).
+    """
+    for name, series in history.series.items():
+        unit = history.units.get(name, "")
+        if fmt == "csv":
+            head = "sample,"
+            middle = f",{_csv_field(name)},"
+            tail = f",{_csv_field(unit)},\n"
+        else:
+            head = '{"timestamp":'
+            middle = f',"metrics":{{{_dumps(name)}:['
+            tail = f",{_dumps(unit)}]}}}}\n"
+        for ts, vals in series.iter_blocks():
+            number = repr if np.isfinite(vals).all() else _dumps
+            yield len(ts), "".join(
+                f"{head}{t:.3f}{middle}{number(v)}{tail}" for t, v in zip(ts.tolist(), vals.tolist())
+            )
+
+
+class ExportJob:
+    """
+    Streams an event-history snapshot (EventHistory.snapshot()) and a metric
+    history snapshot (HistoryStore.snapshot()) to `path` on a worker thread.
+
+    Rows are produced one chunk or block at a time, so memory use does not
+    depend on the size of the export. Output goes to a temporary file that
+    replaces `path` only on success; a cancelled or failed export leaves
+    nothing behind. `written` / `total` can be polled for progress.
+    """
+
+    def __init__(self, path: str, events: Optional[List[list]] = None, history: Optional[HistoryStore] = None):
+        self.path = path
+        self.format, self.compressed = format_for_path(path)
+        self.events = events or []
+        self.history = history
+        self.total = sum(len(c) for c in self.events)
+        if history is not None:
+            self.total += sum(len(s) for s in history.series.values())
+        self.written = 0
+        self.error: Optional[BaseException] = None
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def done(self) -> bool:
+        return self._thread is not None and not self._thread.is_alive()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="export", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _open(self, path: str):
+        if self.compressed:
+            return gzip.open(path, "wt", compresslevel=6, encoding="utf-8", newline="")
+        return open(path, "w", buffering=EXPORT_BUFFER_BYTES, encoding="utf-8", newline="")
+
+    def _batches(self) -> Iterator[Tuple[int, str]]:
+        yield from event_batches(self.events, self.format)
+        if self.history is not None:
+            yield from history_batches(self.history, self.format)
+
+    def _run(self):
+        tmp = self.path + ".part"
+        try:
+            with self._open(tmp) as out:
+                if self.format == "csv":
+                    out.write(",".join(CSV_HEADER) + "\n")
+                elif self.format == "json":
+                    out.write("[\n")
+                first = True
+                for rows, text in self._batches():
+                    if self._cancel.is_set():
+                        break
+                    if self.format == "json":
+                        # Records are written one per line; the array only needs the separators.
+                        text = text[:-1].replace("\n", ",\n")
+                        out.write(text if first else ",\n" + text)
+                        first = False
+                    else:
+                        out.write(text)
+                    self.written += rows
+                if self.format == "json":
+                    out.write("\n]\n")
+            if not self._cancel.is_set():
+                os.replace(tmp, self.path)
+        except Exception as e:
+            self.error = e
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
@@ -0,0 +1,179 @@
+import gzip
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List, Optional, Tuple
+
+from config import APP_VERSION, EXPORTER_HOST, EXPORTER_PORT
+from monitoring import MetricStatus
+
+STATES = ("LEARN", "STABLE", "OK", "WARN", "ALERT")
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _fmt(value: Optional[float]) -> str:
+    # The exposition format spells non-finite values NaN, +Inf and -Inf.
+    if value is None:
+        return "NaN"
+    value = float(value)
+    if math.isfinite(value):
+        return repr(value)
+    if value != value:
+        return "NaN"
+    return "+Inf" if value > 0 else "-Inf"
+
+
+def render_openmetrics(statuses: Iterable[MetricStatus], timestamp: float,
+                       self_usage: Optional[Tuple[float, float]] = None) -> bytes:
+    """
+    Renders one tick as OpenMetrics text. The output only uses gauges and
+    comments, so Prometheus' classic text parser accepts it as well.
+    `self_usage` is the monitor's own (CPU %, RSS in MB), see SelfUsage.
+    """
+    statuses = list(statuses)
+    labels = [f'metric="{_escape(s.name)}",unit="{_escape(s.unit)}"' for s in statuses]
+    lines: List[str] = []
+
+    def family(name: str, help_text: str, attr: str):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"# HELP {name} {help_text}")
+        for lbl, st in zip(labels, statuses):
+            lines.append(f"{name}{{{lbl}}} {_fmt(getattr(st, attr))}")
+
+    family("systemmonitor_value", "Latest collected value.", "value")
+    family("systemmonitor_zscore", "Absolute z-score against the rolling baseline.", "z_score")
+    family("systemmonitor_baseline_mean", "Mean of the rolling baseline.", "mean")
+    family("systemmonitor_baseline_stdev", "Standard deviation of the rolling baseline.", "stdev")
+    family("systemmonitor_samples", "Samples in the rolling baseline window.", "samples")
+
+    lines.append("# TYPE systemmonitor_state gauge")
+    lines.append("# HELP systemmonitor_state Detector state, 1 for the active state.")
+    for lbl, st in zip(labels, statuses):
+        for state in STATES:
+            lines.append(f'systemmonitor_state{{{lbl},state="{state}"}} {1 if st.state == state else 0}')
+
+    lines.append("# TYPE systemmonitor_last_tick_timestamp_seconds gauge")
+    lines.append("# HELP systemmonitor_last_tick_timestamp_seconds Unix time of the last collection tick.")
+    lines.append(f"systemmonitor_last_tick_timestamp_seconds {_fmt(timestamp)}")
+
+    if self_usage is not None:
+        cpu, rss_mb = self_usage
+        lines.append("# TYPE systemmonitor_process_cpu_percent gauge")
+        lines.append("# HELP systemmonitor_process_cpu_percent CPU used by the monitor itself since the previous tick.")
+        lines.append(f"systemmonitor_process_cpu_percent {_fmt(cpu)}")
+        lines.append("# TYPE systemmonitor_process_resident_memory_bytes gauge")
+        lines.append("# HELP systemmonitor_process_resident_memory_bytes Resident memory of the monitor itself.")
+        lines.append(f"systemmonitor_process_resident_memory_bytes {_fmt(rss_mb * 1024 * 1024)}")
+
+    lines.append("# TYPE systemmonitor_build_info gauge")
+    lines.append(f'systemmonitor_build_info{{version="{_escape(APP_VERSION)}"}} 1')
+    lines.append("# EOF")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _RenderedPage:
+    """
+    Immutable rendering of one tick. The gzip variant is produced on the
+    first request that asks for it and then shared by every later scrape.
+    """
+
+    __slots__ = ("body", "_gzip", "_lock")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._gzip: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    def gzipped(self) -> bytes:
+        if self._gzip is None:
+            with self._lock:
+                if self._gzip is None:
+                    self._gzip = gzip.compress(self.body, compresslevel=1)
+        return self._gzip
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "SystemMonitorProAI"
+    protocol_version = "HTTP/1.1"
+    timeout = 10
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+
+        page = self.server.exporter.page
+        accept = self.headers.get("Accept", "")
+        content_type = OPENMETRICS_TYPE if "openmetrics" in accept else PROMETHEUS_TYPE
+
+        body = page.body
+        encoding = None
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = page.gzipped()
+            encoding = "gzip"
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OpenMetricsExporter:
+    """
+    Serves the latest tick on /metrics from a background thread.
+
+    publish() renders the page once per tick and swaps a single reference;
+    request threads only read that reference, so scrapers never touch the
+    detector and a slow client can only hold up its own connection thread.
+    With `self_usage` (the monitor's SelfUsage) its latest sample is
+    exported as well.
+    """
+
+    def __init__(self, host: str = EXPORTER_HOST, port: int = EXPORTER_PORT, self_usage=None):
+        self.host = host
+        self.port = port
+        self.self_usage = self_usage
+        self.page = _RenderedPage(b"# EOF\n")
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Raises OSError if the address cannot be bound (e.g. the port is busy).
+        """
+        if self._server is not None:
+            return
+        try:
+            server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        except OSError as e:
+            raise OSError(e.errno, f"cannot listen on {self.host}:{self.port}: {e.strerror}") from e
+        server.daemon_threads = True
+        server.exporter = self
+        self.port = server.server_address[1]
+        self._server = server
+        self._thread = threading.Thread(target=server.serve_forever, name="openmetrics-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._thread = None
+
+    def publish(self, timestamp: float, raw_metrics, statuses: List[MetricStatus]):
+        usage = self.self_usage.last if self.self_usage is not None else None
+        self.page = _RenderedPage(render_openmetrics(statuses, timestamp, usage))
@@ -0,0 +1,506 @@
+import asyncio
+import multiprocessing
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    FLEET_HOST,
+    FLEET_PORT,
+    FLEET_POOL_THRESHOLD,
+    FLEET_POOL_RETRY_S,
+    FLEET_WORKERS,
+    FLEET_FLUSH_MS,
+    FLEET_AGENT_QUEUE,
+)
+from monitoring import AnomalyDetector, MetricStatus, forecast_high_load_minutes
+
+# Wire format: every frame is HEADER + payload.
+#   HELLO   utf-8 host name
+#   NAMES   u16 count, then per entry: u16 id, u8 name length, u8 unit length, name, unit
+#   SAMPLE  f64 unix timestamp, u16 count, then per entry: u16 id, f64 value
+MAGIC = b"SM"
+PROTOCOL_VERSION = 1
+MSG_HELLO = 1
+MSG_NAMES = 2
+MSG_SAMPLE = 3
+MAX_PAYLOAD = 1 << 20
+
+_HEADER = struct.Struct("!2sBBI")
+_U16 = struct.Struct("!H")
+_NAME_ENTRY = struct.Struct("!HBB")
+_SAMPLE_HEAD = struct.Struct("!dH")
+_sample_structs: Dict[int, struct.Struct] = {}
+
+STATE_SEVERITY = {"ALERT": 4, "WARN": 3, "LEARN": 2, "OK": 1, "STABLE": 0}
+
+
+def _sample_struct(n: int) -> struct.Struct:
+    st = _sample_structs.get(n)
+    if st is None:
+        st = _sample_structs[n] = struct.Struct("!" + "Hd" * n)
+    return st
+
+
+def encode_frame(msg_type: int, payload: bytes) -> bytes:
+    return _HEADER.pack(MAGIC, PROTOCOL_VERSION, msg_type, len(payload)) + payload
+
+
+def decode_names(payload: bytes) -> List[Tuple[int, str, str]]:
+    (count,) = _U16.unpack_from(payload, 0)
+    pos = _U16.size
+    entries = []
+    for _ in range(count):
+        mid, nlen, ulen = _NAME_ENTRY.unpack_from(payload, pos)
+        pos += _NAME_ENTRY.size
+        name = payload[pos:pos + nlen].decode("utf-8")
+        pos += nlen
+        unit = payload[pos:pos + ulen].decode("utf-8")
+        pos += ulen
+        entries.append((mid, name, unit))
+    return entries
+
+
+def decode_sample(payload: bytes) -> Tuple[float, List[Tuple[int, float]]]:
+    ts, count = _SAMPLE_HEAD.unpack_from(payload, 0)
+    flat = _sample_struct(count).unpack_from(payload, _SAMPLE_HEAD.size)
+    return ts, list(zip(flat[0::2], flat[1::2]))
+
+
+class FrameEncoder:
+    """
+    Per-connection encoder. Metric names are announced once in a NAMES
+    frame; every later SAMPLE only carries (id, value) pairs.
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self._announced: set = set()
+
+    def resync(self):
+        """
+        Makes the next frame announce every known name again, so a reader
+        can start decoding from that point without earlier frames.
+        """
+        self._announced.clear()
+
+    def hello(self, host: str) -> bytes:
+        return encode_frame(MSG_HELLO, host.encode("utf-8"))
+
+    def encode(self, timestamp: float, raw_metrics: Dict[str, Tuple[float, str]]) -> bytes:
+        out = b""
+        new = []
+        flat = []
+        for name, (value, unit) in raw_metrics.items():
+            mid = self.ids.get(name)
+            if mid is None:
+                mid = self.ids[name] = len(self.ids)
+            if mid not in self._announced:
+                self._announced.add(mid)
+                new.append((mid, name.encode("utf-8")[:255], unit.encode("utf-8")[:255]))
+            flat.append(mid)
+            flat.append(float(value))
+
+        if new:
+            parts = [_U16.pack(len(new))]
+            for mid, name, unit in new:
+                parts.append(_NAME_ENTRY.pack(mid, len(name), len(unit)))
+                parts.append(name)
+                parts.append(unit)
+            out += encode_frame(MSG_NAMES, b"".join(parts))
+
+        n = len(flat) // 2
+        payload = _SAMPLE_HEAD.pack(timestamp, n) + _sample_struct(n).pack(*flat)
+        return out + encode_frame(MSG_SAMPLE, payload)
+
+
+class AgentPublisher:
+    """
+    Ships every tick to an aggregator over TCP.
+
+    publish() only drops the snapshot into a bounded queue (oldest dropped
+    when full); a background thread owns the socket and reconnects with
+    exponential backoff, so a missing aggregator never blocks collection.
+    """
+
+    def __init__(self, host: str, port: int = FLEET_PORT, hostname: Optional[str] = None,
+                 queue_size: int = FLEET_AGENT_QUEUE):
+        self.host = host
+        self.port = port
+        self.hostname = hostname or socket.gethostname()
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="fleet-agent", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def publish(self, timestamp: float, raw_metrics, statuses):
+        item = (timestamp, dict(raw_metrics))
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(item)
+
+    def _run(self):
+        backoff = 0.5
+        while not self._stop.is_set():
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=5)
+            except OSError:
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            backoff = 0.5
+            encoder = FrameEncoder()
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.sendall(encoder.hello(self.hostname))
+                while not self._stop.is_set():
+                    try:
+                        ts, metrics = self._queue.get(timeout=1.0)
+                    except queue.Empty:
+                        continue
+                    sock.sendall(encoder.encode(ts, metrics))
+            except OSError:
+                pass
+            finally:
+                sock.close()
+
+
+@dataclass
+class HostResult:
+    host: str
+    timestamp: float
+    statuses: List[MetricStatus]
+    forecasts: Dict[str, Optional[float]] = field(default_factory=dict)
+
+    @property
+    def worst_state(self) -> str:
+        if not self.statuses:
+            return "LEARN"
+        return max((s.state for s in self.statuses), key=lambda st: STATE_SEVERITY.get(st, 0))
+
+
+class _HostModel:
+    """
+    Detector, forecast history and rule state of one remote host.
+    """
+
+    def __init__(self, rules=None):
+        self.detector = AnomalyDetector()
+        self.forecast: Dict[str, deque] = {}
+        self.rule_state = rules.new_state() if rules is not None else None
+
+
+def score_hosts(models: Dict[str, _HostModel], rules,
+                batch: List[Tuple[str, float, Dict[str, Tuple[float, str]]]]) -> List[HostResult]:
+    """
+    Scores `batch` against the host `models` (created on first sight) and
+    the composite `rules` (a RuleSet or None).
+    """
+    results = []
+    for host, ts, metrics in batch:
+        model = models.get(host)
+        if model is None:
+            model = models[host] = _HostModel(rules)
+
+        statuses = []
+        forecasts = {}
+        for name, (value, unit) in metrics.items():
+            statuses.append(model.detector.evaluate(name, value, unit, timestamp=ts))
+            if unit == "%" or (rules is not None and rules.needs_forecast(name)):
+                history = model.forecast.get(name)
+                if history is None:
+                    history = model.forecast[name] = deque(maxlen=60)
+                history.append((ts, value))
+                forecasts[name] = forecast_high_load_minutes(history)
+
+        if rules is not None:
+            statuses.extend(rules.evaluate(model.rule_state, ts, statuses, forecasts))
+
+        results.append(HostResult(host=host, timestamp=ts, statuses=statuses, forecasts=forecasts))
+    return results
+
+
+# Host models and rules of a pool worker process. Every worker owns the
+# models of its shard, so state never crosses process boundaries per tick.
+# Inline scoring keeps them on the Aggregator instead.
+_HOST_MODELS: Dict[str, _HostModel] = {}
+_RULES = None
+
+
+def adopt_host_models(models: Dict[str, _HostModel], rules=None) -> int:
+    global _RULES
+    _RULES = rules
+    _HOST_MODELS.update(models)
+    return len(models)
+
+
+def score_batch(batch: List[Tuple[str, float, Dict[str, Tuple[float, str]]]]) -> List[HostResult]:
+    return score_hosts(_HOST_MODELS, _RULES, batch)
+
+
+def _shard(host: str, n: int) -> int:
+    return zlib.crc32(host.encode("utf-8")) % n
+
+
+class Aggregator:
+    """
+    Receives agent frames and keeps one detector and forecaster per host,
+    plus the state of the composite `rules` (a RuleSet) if given.
+
+    I/O runs on an asyncio loop in a background thread. Incoming samples are
+    scored in batches every `flush_ms`: inline while the fleet is small, then
+    sharded over single-worker process pools once more than `pool_threshold`
+    hosts are connected. Each shard always goes to the same worker, so its
+    host models stay resident there.
+
+    A failed flush is counted and reported on stderr, and the loop goes on.
+    A worker that died is replaced (its hosts start learning afresh); if the
+    pool cannot be started, scoring stays inline and the pool is retried
+    after FLEET_POOL_RETRY_S.
+    """
+
+    def __init__(
+        self,
+        host: str = FLEET_HOST,
+        port: int = FLEET_PORT,
+        pool_threshold: int = FLEET_POOL_THRESHOLD,
+        workers: int = FLEET_WORKERS,
+        flush_ms: int = FLEET_FLUSH_MS,
+        rules=None,
+    ):
+        self.host = host
+        self.port = port
+        self.pool_threshold = pool_threshold
+        self.workers = workers
+        self.flush_ms = flush_ms
+        self.rules = rules
+
+        self._models: Dict[str, _HostModel] = {}
+        self._results: Dict[str, HostResult] = {}
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, float, Dict[str, Tuple[float, str]]]] = []
+        # Open connections per host; a host is dropped with its last connection.
+        self._connected_hosts: Dict[str, int] = {}
+        self._executors: List[ProcessPoolExecutor] = []
+        self._pool_retry_at = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._error: Optional[OSError] = None
+        self.connections = 0
+        self.flush_errors = 0
+        self.last_error: Optional[BaseException] = None
+
+    @property
+    def pool_active(self) -> bool:
+        return bool(self._executors)
+
+    def start(self):
+        """
+        Raises OSError if the listening socket cannot be bound (e.g. the port is busy).
+        """
+        if self._thread is not None:
+            return
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="fleet-aggregator", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            self._thread = None
+            self._ready.clear()
+            raise self._error
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            loop.close()
+            return
+        self._loop = loop
+        self.port = self._server.sockets[0].getsockname()[1]
+        flusher = loop.create_task(self._flush_loop())
+        self._ready.set()
+        loop.run_forever()
+        flusher.cancel()
+        loop.close()
+
+    def stop(self):
+        loop = self._loop
+        if loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), loop)
+        self._thread.join(timeout=5)
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors = []
+        self._loop = None
+        self._thread = None
+        self._ready.clear()
+
+    def snapshot(self) -> Dict[str, HostResult]:
+        with self._lock:
+            return dict(self._results)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        host = None
+        names: Dict[int, Tuple[str, str]] = {}
+        self.connections += 1
+        try:
+            while True:
+                magic, version, msg_type, length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                if magic != MAGIC or version != PROTOCOL_VERSION or length > MAX_PAYLOAD:
+                    break
+                payload = await reader.readexactly(length)
+
+                if msg_type == MSG_SAMPLE and host is not None:
+                    ts, items = decode_sample(payload)
+                    self._pending.append((host, ts, {names[i][0]: (v, names[i][1]) for i, v in items if i in names}))
+                elif msg_type == MSG_NAMES:
+                    for mid, name, unit in decode_names(payload):
+                        names[mid] = (name, unit)
+                elif msg_type == MSG_HELLO:
+                    if host is not None:
+                        self._disconnected(host)
+                    host = payload.decode("utf-8", "replace") or writer.get_extra_info("peername")[0]
+                    self._connected_hosts[host] = self._connected_hosts.get(host, 0) + 1
+        except (asyncio.IncompleteReadError, ConnectionError, struct.error, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections -= 1
+            if host is not None:
+                self._disconnected(host)
+            writer.close()
+
+    def _disconnected(self, host: str):
+        left = self._connected_hosts.get(host, 0) - 1
+        if left > 0:
+            self._connected_hosts[host] = left
+        else:
+            self._connected_hosts.pop(host, None)
+
+    def _report(self, what: str, error: BaseException):
+        self.flush_errors += 1
+        self.last_error = error
+        print(f"fleet: {what}: {type(error).__name__}: {error}", file=sys.stderr)
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_ms / 1000.0)
+            batch, self._pending = self._pending, []
+            try:
+                await self._flush(loop, batch)
+            except Exception as e:
+                self._report(f"dropped a batch of {len(batch)} samples", e)
+
+    async def _flush(self, loop, batch):
+        if (not self._executors and self.workers > 0 and len(self._connected_hosts) > self.pool_threshold
+                and time.monotonic() >= self._pool_retry_at):
+            try:
+                await self._start_pool(loop)
+            except Exception as e:
+                self._pool_retry_at = time.monotonic() + FLEET_POOL_RETRY_S
+                self._report("could not start the worker pool, scoring inline", e)
+
+        if not batch:
+            return
+
+        if not self._executors:
+            results = score_hosts(self._models, self.rules, batch)
+        else:
+            shards: List[list] = [[] for _ in self._executors]
+            for item in batch:
+                shards[_shard(item[0], len(shards))].append(item)
+            busy = [i for i, shard in enumerate(shards) if shard]
+            # Wrapped in coroutines so that submitting to a broken pool fails
+            # only that shard, like a worker dying mid-batch does.
+            parts = await asyncio.gather(*(self._score_shard(loop, i, shards[i]) for i in busy),
+                                         return_exceptions=True)
+            results = []
+            for i, part in zip(busy, parts):
+                if not isinstance(part, BaseException):
+                    results.extend(part)
+                    continue
+                self._report(f"worker {i} dropped {len(shards[i])} samples", part)
+                if isinstance(part, BrokenProcessPool):
+                    await self._replace_worker(loop, i)
+
+        with self._lock:
+            for result in results:
+                self._results[result.host] = result
+
+    async def _score_shard(self, loop, i: int, shard: list) -> List[HostResult]:
+        return await loop.run_in_executor(self._executors[i], score_batch, shard)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+    async def _start_pool(self, loop):
+        executors = [self._new_executor() for _ in range(self.workers)]
+        try:
+            # Hand the models built inline so far to the worker owning each host.
+            shards: List[Dict[str, _HostModel]] = [{} for _ in executors]
+            for host, model in self._models.items():
+                shards[_shard(host, len(shards))][host] = model
+            await asyncio.gather(*(
+                loop.run_in_executor(ex, adopt_host_models, shard, self.rules)
+                for ex, shard in zip(executors, shards)
+            ))
+        except BaseException:
+            for executor in executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        self._models.clear()
+        self._executors = executors
+
+    async def _replace_worker(self, loop, i: int):
+        self._executors[i].shutdown(wait=False, cancel_futures=True)
+        self._executors[i] = self._new_executor()
+        try:
+            await loop.run_in_executor(self._executors[i], adopt_host_models, {}, self.rules)
+        except Exception as e:
+            self._report(f"could not restart worker {i}", e)
@@ -0,0 +1,111 @@
+import time
+import threading
+from collections import defaultdict, deque
+from typing import List, Optional, Sequence
+
+from config import UPDATE_INTERVAL_MS, ADAPTIVE_SAMPLING, MULTIVARIATE_ENABLED
+from instrumentation import PublishErrors, SelfUsage, TickProfiler
+from monitoring import (
+    SystemMonitorBackend,
+    AnomalyDetector,
+    MultivariateDetector,
+    AdaptiveSampler,
+    MetricStatus,
+    forecast_high_load_minutes,
+    multivariate_values,
+)
+
+
+class HeadlessMonitor:
+    """
+    Collection and detection loop without Qt, for servers and background use.
+
+    Every tick is handed to each publisher as
+    publish(timestamp, raw_metrics, statuses), exactly like the GUI does,
+    including the statuses of the composite rules in `rules` (a RuleSet).
+    Ticks are timed per stage in `profiler`, and the monitor's own usage is
+    sampled into `self_usage` before the publishers run.
+    """
+
+    def __init__(
+        self,
+        interval_ms: int = UPDATE_INTERVAL_MS,
+        adaptive: bool = ADAPTIVE_SAMPLING,
+        publishers: Sequence = (),
+        rules=None,
+        self_usage: Optional[SelfUsage] = None,
+    ):
+        self.backend = SystemMonitorBackend()
+        self.profiler = TickProfiler()
+        self.self_usage = self_usage if self_usage is not None else SelfUsage()
+        self.detector = AnomalyDetector()
+        self.mv_detector = MultivariateDetector() if MULTIVARIATE_ENABLED else None
+        self.sampler = AdaptiveSampler(base_ms=interval_ms)
+        self.adaptive = adaptive
+        self.interval_ms = interval_ms
+        self.publishers = list(publishers)
+        self.publish_errors = PublishErrors()
+        self.rules = rules
+        self.rule_state = rules.new_state() if rules is not None else None
+        # Forecast inputs, kept only for the metrics a rule asks about.
+        self.history_for_forecast = defaultdict(lambda: deque(maxlen=60))
+
+    def tick(self) -> List[MetricStatus]:
+        profiler = self.profiler
+        mark = profiler.begin_tick()
+
+        raw_metrics = self.backend.collect()
+        now = time.monotonic()
+        mark = profiler.lap("collect", mark)
+
+        statuses = [
+            self.detector.evaluate(name, value, unit, timestamp=now)
+            for name, (value, unit) in raw_metrics.items()
+        ]
+
+        if self.mv_detector is not None:
+            mv = self.mv_detector.evaluate(multivariate_values(raw_metrics), timestamp=now)
+            statuses.append(MetricStatus(
+                name="Multivariate",
+                value=mv.distance or 0.0,
+                unit="D",
+                state=mv.state,
+                z_score=mv.z_score,
+                mean=None,
+                stdev=None,
+                samples=mv.samples,
+            ))
+        mark = profiler.lap("evaluate", mark)
+
+        if self.rules is not None:
+            forecasts = {}
+            for status in statuses:
+                if self.rules.needs_forecast(status.name):
+                    history = self.history_for_forecast[status.name]
+                    history.append((now, status.value))
+                    forecasts[status.name] = forecast_high_load_minutes(history)
+            statuses.extend(self.rules.evaluate(self.rule_state, now, statuses, forecasts))
+            mark = profiler.lap("rules", mark)
+
+        self.self_usage.sample()
+        wall = time.time()
+        self.publish_errors.publish_all(self.publishers, wall, raw_metrics, statuses)
+        profiler.lap("publish", mark)
+        profiler.end_tick()
+
+        if self.adaptive:
+            self.interval_ms = self.sampler.next_interval_ms(s.state for s in statuses)
+
+        return statuses
+
+    def run(self, stop_event: Optional[threading.Event] = None):
+        stop_event = stop_event or threading.Event()
+        next_tick = time.monotonic()
+        while not stop_event.is_set():
+            self.tick()
+            next_tick += self.interval_ms / 1000.0
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            stop_event.wait(delay)
@@ -0,0 +1,149 @@
+import math
+import os
+import time
+import zipfile
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import HEATMAP_HALF_LIFE_DAYS
+
+STATE_WEIGHTS = {"WARN": 1.0, "ALERT": 2.0}
+CELLS = 7 * 24
+TOTAL = "*"
+
+# Rebase stored values once the pending decay factor exceeds e^20.
+_REBASE_EXPONENT = 20.0
+
+
+class HeatmapStore:
+    """
+    Exponentially decayed weekday × hour anomaly scores, one row per metric
+    plus a TOTAL row over all metrics.
+
+    Decay is applied lazily: rows hold sum(w * exp(lam * (t - t_ref))), so an
+    event touches one cell and the current value is row * exp(-lam * (now - t_ref)).
+    Every row carries a version that changes only when that row changes,
+    which lets views cache whatever they derive from it.
+    """
+
+    def __init__(self, half_life_days: float = HEATMAP_HALF_LIFE_DAYS, path: Optional[str] = None):
+        self.path = path
+        self.lam = math.log(2.0) / (half_life_days * 86400.0)
+        self.t_ref = time.time()
+        self.names: List[str] = [TOTAL]
+        self.index: Dict[str, int] = {TOTAL: 0}
+        self.scores = np.zeros((8, CELLS))
+        self.versions = np.zeros(8, dtype=np.int64)
+        self._dirty = False
+
+    def _row(self, metric: str) -> int:
+        row = self.index.get(metric)
+        if row is None:
+            row = self.index[metric] = len(self.names)
+            self.names.append(metric)
+            if row >= len(self.scores):
+                grow = len(self.scores)
+                self.scores = np.vstack((self.scores, np.zeros((grow, CELLS))))
+                self.versions = np.concatenate((self.versions, np.zeros(grow, dtype=np.int64)))
+        return row
+
+    def add(self, metric: Optional[str], weight: float, timestamp: Optional[float] = None):
+        """
+        Adds `weight` at the local weekday/hour of `timestamp`, to the TOTAL
+        row and, unless `metric` is None, to that metric's row.
+        """
+        t = time.time() if timestamp is None else timestamp
+        exponent = self.lam * (t - self.t_ref)
+        if exponent > _REBASE_EXPONENT:
+            self.scores *= math.exp(-exponent)
+            self.t_ref = t
+            exponent = 0.0
+
+        local = time.localtime(t)
+        cell = local.tm_wday * 24 + local.tm_hour
+        scaled = weight * math.exp(exponent)
+        self.scores[0, cell] += scaled
+        self.versions[0] += 1
+        if metric is not None:
+            row = self._row(metric)
+            self.scores[row, cell] += scaled
+            self.versions[row] += 1
+        self._dirty = True
+
+    def version(self, metric: str = TOTAL) -> int:
+        row = self.index.get(metric)
+        return -1 if row is None else int(self.versions[row])
+
+    def matrix(self, metric: str = TOTAL, now: Optional[float] = None) -> np.ndarray:
+        """
+        Current decayed scores as a 7 × 24 array.
+        """
+        row = self.index.get(metric)
+        if row is None:
+            return np.zeros((7, 24))
+        now = time.time() if now is None else now
+        return (self.scores[row] * math.exp(-self.lam * (now - self.t_ref))).reshape(7, 24)
+
+    def relative(self, metric: str = TOTAL) -> np.ndarray:
+        """
+        Scores scaled to 0..1 by the row maximum. Decay cancels out here, so
+        the result only changes when the row does.
+        """
+        row = self.index.get(metric)
+        if row is None:
+            return np.zeros((7, 24))
+        values = self.scores[row]
+        peak = values.max()
+        return (values / peak if peak > 0 else values).reshape(7, 24)
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        if path is None or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        n = len(self.names)
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f,
+                scores=self.scores[:n],
+                names=np.array(self.names),
+                t_ref=np.array(self.t_ref),
+                lam=np.array(self.lam),
+            )
+        os.replace(tmp, path)
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: str, half_life_days: float = HEATMAP_HALF_LIFE_DAYS) -> "HeatmapStore":
+        """
+        Loads a saved store, or returns an empty one bound to `path` when
+        the file is missing or unreadable.
+        """
+        store = cls(half_life_days, path)
+        try:
+            with np.load(path) as data:
+                scores = data["scores"]
+                names = [str(n) for n in data["names"]]
+                t_ref = float(data["t_ref"])
+                lam = float(data["lam"])
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile, zlib.error):
+            # Missing, truncated or corrupt (e.g. a crash while saving).
+            return store
+        if not names or names[0] != TOTAL or scores.shape != (len(names), CELLS):
+            return store
+
+        # Rebase to now with the saved decay rate, so a changed half-life
+        # only applies from here on.
+        now = time.time()
+        scores = scores * math.exp(-lam * max(0.0, now - t_ref))
+        store.t_ref = now
+        store.names = names
+        store.index = {n: i for i, n in enumerate(names)}
+        capacity = max(8, len(names))
+        store.scores = np.zeros((capacity, CELLS))
+        store.scores[:len(names)] = scores
+        store.versions = np.zeros(capacity, dtype=np.int64)
+        return store
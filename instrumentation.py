@@ -0,0 +1,195 @@
+import sys
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import psutil
+
+from config import PUBLISH_ERROR_LOG_S
+
+TICK_STAGES = (
+    "collect",
+    "evaluate",
+    "format",
+    "forecast",
+    "cards",
+    "rules",
+    "history",
+    "publish",
+    "repaint",
+    "total",
+)
+
+# Upper bucket bounds in microseconds; the last bucket catches everything above.
+BUCKET_BOUNDS_US = (
+    10, 25, 50, 100, 250, 500,
+    1_000, 2_500, 5_000, 10_000, 25_000, 50_000,
+    100_000, 250_000, 1_000_000,
+)
+
+
+class StageHistogram:
+    """
+    Fixed-size latency histogram for a single pipeline stage.
+    Memory use is constant no matter how long the monitor runs.
+    """
+
+    __slots__ = ("buckets", "count", "total_ns", "max_ns", "last_ns")
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * (len(BUCKET_BOUNDS_US) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.last_ns = 0
+
+    def add(self, ns: int):
+        self.buckets[bisect_left(BUCKET_BOUNDS_US, ns / 1000)] += 1
+        self.count += 1
+        self.total_ns += ns
+        self.last_ns = ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def mean_ms(self) -> Optional[float]:
+        if not self.count:
+            return None
+        return self.total_ns / self.count / 1e6
+
+    def percentile_ms(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-th percentile (0..100).
+        The overflow bucket reports the observed maximum instead.
+        """
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                if i < len(BUCKET_BOUNDS_US):
+                    return min(BUCKET_BOUNDS_US[i] / 1000.0, self.max_ns / 1e6)
+                break
+        return self.max_ns / 1e6
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "last_ms": self.last_ns / 1e6,
+            "mean_ms": self.mean_ms(),
+            "p50_ms": self.percentile_ms(50),
+            "p95_ms": self.percentile_ms(95),
+            "p99_ms": self.percentile_ms(99),
+            "max_ms": self.max_ns / 1e6,
+        }
+
+
+class TickProfiler:
+    """
+    Per-stage timing of a monitor tick (the GUI's QTimer tick or
+    HeadlessMonitor.tick), based on monotonic nanosecond timers.
+
+    Stages that run once per metric (evaluate, format, ...) are summed over the
+    tick and recorded as one sample when the tick ends. Repaints happen after
+    the tick returns, so they are attributed to the next tick.
+    """
+
+    def __init__(self, stages: Tuple[str, ...] = TICK_STAGES):
+        self.stages = stages
+        self.histograms: Dict[str, StageHistogram] = {s: StageHistogram() for s in stages}
+        self._current: Dict[str, int] = dict.fromkeys(stages, 0)
+        self._tick_start = 0
+        self.last_tick: Dict[str, float] = {}
+
+    @staticmethod
+    def now() -> int:
+        return time.perf_counter_ns()
+
+    def begin_tick(self) -> int:
+        self._tick_start = time.perf_counter_ns()
+        return self._tick_start
+
+    def lap(self, stage: str, start: int) -> int:
+        """
+        Adds the time since `start` to `stage` and returns the current timestamp,
+        so consecutive stages can be chained without extra clock reads.
+        """
+        now = time.perf_counter_ns()
+        self._current[stage] += now - start
+        return now
+
+    def record(self, stage: str, ns: int):
+        self._current[stage] += ns
+
+    def end_tick(self):
+        current = self._current
+        current["total"] = time.perf_counter_ns() - self._tick_start + current["repaint"]
+
+        last = {}
+        for stage, ns in current.items():
+            self.histograms[stage].add(ns)
+            last[stage] = ns / 1e6
+            current[stage] = 0
+        self.last_tick = last
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        return {stage: hist.summary() for stage, hist in self.histograms.items()}
+
+
+class SelfUsage:
+    """
+    CPU and resident memory of the monitor process itself.
+
+    Sampled once per tick next to collect() but never part of it, so the
+    monitor does not score, log or alert on its own overhead. `last` holds
+    the latest sample for the Diagnostics tab, profiling and the exporter.
+    """
+
+    def __init__(self):
+        self._proc = psutil.Process()
+        self._proc.cpu_percent(interval=None)
+        self.last: Optional[Tuple[float, float]] = None
+
+    def sample(self) -> Tuple[float, float]:
+        """
+        (CPU % since the previous call, RSS in MB).
+        """
+        with self._proc.oneshot():
+            self.last = (self._proc.cpu_percent(interval=None), self._proc.memory_info().rss / 1024 / 1024)
+        return self.last
+
+
+class PublishErrors:
+    """
+    Isolates the publishers of a tick loop from each other. A publisher that
+    raises is counted and reported on stderr at most once per `log_every_s`
+    (with the failures since its last report); the others still get the tick.
+    """
+
+    def __init__(self, log_every_s: float = PUBLISH_ERROR_LOG_S):
+        self.log_every_s = log_every_s
+        self.errors: Dict[str, int] = {}
+        self.last_error: Optional[BaseException] = None
+        self._reported_at: Dict[str, float] = {}
+        self._unreported: Dict[str, int] = {}
+
+    def publish_all(self, publishers: Iterable, timestamp: float, raw_metrics, statuses):
+        for publisher in publishers:
+            try:
+                publisher.publish(timestamp, raw_metrics, statuses)
+            except Exception as e:
+                self.report(type(publisher).__name__, e)
+
+    def report(self, name: str, error: BaseException):
+        self.errors[name] = self.errors.get(name, 0) + 1
+        self.last_error = error
+        now = time.monotonic()
+        last = self._reported_at.get(name)
+        if last is not None and now - last < self.log_every_s:
+            self._unreported[name] = self._unreported.get(name, 0) + 1
+            return
+        self._reported_at[name] = now
+        skipped = self._unreported.pop(name, 0)
+        more = f" ({skipped} more since the last report)" if skipped else ""
+        print(f"{name}: publish failed: {type(error).__name__}: {error}{more}", file=sys.stderr)
@@ -1,16 +1,45 @@
+import os
 import time
 import psutil
-import statistics
+import math
+import warnings
+import numpy as np
 from collections import deque
-from dataclasses import dataclass
-from typing import Optional, Dict, Tuple
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Tuple, Iterable, List
  
 from config import (
+    UPDATE_INTERVAL_MS,
     WINDOW_SIZE,
+    WINDOW_SECONDS,
+    WINDOW_MAX_SAMPLES,
     STD_FACTOR_WARN,
     STD_FACTOR_ALERT,
     MIN_SAMPLES,
+    QUANTILE_SKETCHES,
+    SKETCH_MIN_SAMPLES,
+    SKETCH_REFRESH_SAMPLES,
+    MV_REFRESH_TICKS,
+    MV_VARIANCE_FLOOR,
+    MV_TOP_CONTRIBUTORS,
+    ADAPTIVE_FAST_INTERVAL_MS,
+    ADAPTIVE_MAX_INTERVAL_MS,
+    ADAPTIVE_CALM_TICKS,
+    ADAPTIVE_STRETCH_FACTOR,
+    DISK_DETAIL_ENABLED,
 )
+from sketches import SketchRollup
+from diskstats import DEVICE_PREFIX, MOUNT_PREFIX, DiskCollector
+
+# Per-device and per-mount series: scored one by one, but kept out of the
+# multivariate model so its dimension does not grow with the hardware.
+DETAIL_PREFIXES = (DEVICE_PREFIX, MOUNT_PREFIX)
+
+
+def multivariate_values(raw_metrics: Dict[str, Tuple[float, str]]) -> Dict[str, float]:
+    return {k: v for k, (v, _) in raw_metrics.items() if not k.startswith(DETAIL_PREFIXES)}
+
+PERCENTILES = (0.01, 0.05, 0.5, 0.95, 0.99)
 
 @dataclass
 class MetricStatus:
@@ -29,29 +58,115 @@ class MetricStatus:
     stdev: Optional[float]
     samples: int
 
+    percentiles: Optional[Dict[float, float]] = None
+    percentile_state: Optional[str] = None
+
 class AnomalyDetector:
     """
     Lightweight, local AI that calculates dynamic baselines and z-scores.
+
+    Samples may arrive at irregular intervals (adaptive sampling). Each sample
+    is weighted by the time span it covers, so a burst of fast samples during
+    an incident does not outweigh a long calm stretch in the baseline. The
+    baseline spans `window_seconds` (but at least `min_samples` and at most
+    `max_samples` samples), so it covers the same time at any sampling rate.
+
+    With `use_sketches` every metric also feeds an hourly/daily/weekly quantile
+    sketch, and a percentile-based state is reported next to the z-score one.
+
+    `window_size` (a sample count) is deprecated; it is converted to seconds
+    at the nominal sampling interval.
     """
 
     def __init__(
         self,
-        window_size: int = WINDOW_SIZE,
+        window_seconds: float = WINDOW_SECONDS,
         warn_factor: float = STD_FACTOR_WARN,
         alert_factor: float = STD_FACTOR_ALERT,
         min_samples: int = MIN_SAMPLES,
+        use_sketches: bool = QUANTILE_SKETCHES,
+        sketch_min_samples: int = SKETCH_MIN_SAMPLES,
+        sketch_refresh: int = SKETCH_REFRESH_SAMPLES,
+        max_samples: int = WINDOW_MAX_SAMPLES,
+        window_size: Optional[int] = None,
     ):
-        self.window_size = window_size
+        self.nominal_interval = UPDATE_INTERVAL_MS / 1000.0
+        if window_size is not None:
+            warnings.warn("AnomalyDetector(window_size=...) is deprecated, use window_seconds",
+                          DeprecationWarning, stacklevel=2)
+            window_seconds = window_size * self.nominal_interval
+        self.window_seconds = window_seconds
+        self.max_samples = max_samples
         self.warn_factor = warn_factor
         self.alert_factor = alert_factor
         self.min_samples = min_samples
         self.history: Dict[str, deque] = {}
+        self.weights: Dict[str, deque] = {}
+        self._last_seen: Dict[str, float] = {}
+
+        self.use_sketches = use_sketches
+        self.sketch_min_samples = sketch_min_samples
+        self.sketch_refresh = sketch_refresh
+        self.sketches: Dict[str, SketchRollup] = {}
+        self._percentiles: Dict[str, Dict[float, float]] = {}
+        self._since_refresh: Dict[str, int] = {}
+
+    def _update_percentiles(self, name: str, value: float, wall_time: Optional[float] = None) -> Tuple[Optional[Dict[float, float]], Optional[str]]:
+        rollup = self.sketches.get(name)
+        if rollup is None:
+            rollup = self.sketches[name] = SketchRollup()
+        rollup.add(value, wall_time)
+
+        n = self._since_refresh.get(name, self.sketch_refresh) + 1
+        if n >= self.sketch_refresh:
+            n = 0
+            if rollup.count >= self.sketch_min_samples:
+                self._percentiles[name] = rollup.weekly().quantiles(PERCENTILES)
+        self._since_refresh[name] = n
+
+        pct = self._percentiles.get(name)
+        if pct is None:
+            return None, None
+
+        if value > pct[0.99] or value < pct[0.01]:
+            state = "ALERT"
+        elif value > pct[0.95] or value < pct[0.05]:
+            state = "WARN"
+        else:
+            state = "OK"
+        return pct, state
 
-    def evaluate(self, name: str, value: float, unit: str) -> MetricStatus:
-        dq = self.history.setdefault(name, deque(maxlen=self.window_size))
+    def _sample_weight(self, name: str, timestamp: Optional[float]) -> float:
+        if timestamp is None:
+            return self.nominal_interval
+        last = self._last_seen.get(name)
+        self._last_seen[name] = timestamp
+        if last is None or timestamp <= last:
+            return self.nominal_interval
+        return timestamp - last
+
+    def evaluate(self, name: str, value: float, unit: str, timestamp: Optional[float] = None,
+                 wall_time: Optional[float] = None) -> MetricStatus:
+        dq = self.history.get(name)
+        if dq is None:
+            dq = self.history[name] = deque(maxlen=self.max_samples)
+            self.weights[name] = deque(maxlen=self.max_samples)
+        wq = self.weights[name]
         dq.append(value)
+        wq.append(self._sample_weight(name, timestamp))
+
+        # Drop the oldest samples while the rest still span the window.
+        total_w = sum(wq)
+        while len(dq) > self.min_samples and total_w - wq[0] >= self.window_seconds:
+            total_w -= wq.popleft()
+            dq.popleft()
         samples = len(dq)
 
+        if self.use_sketches:
+            percentiles, percentile_state = self._update_percentiles(name, value, wall_time)
+        else:
+            percentiles, percentile_state = None, None
+
         if samples < self.min_samples:
             return MetricStatus(
                 name=name,
@@ -62,10 +177,13 @@ class AnomalyDetector:
                 mean=None,
                 stdev=None,
                 samples=samples,
+                percentiles=percentiles,
+                percentile_state=percentile_state,
             )
 
-        mean = statistics.fmean(dq)
-        stdev = statistics.pstdev(dq)
+        mean = sum(w * x for w, x in zip(wq, dq)) / total_w
+        var = sum(w * (x - mean) ** 2 for w, x in zip(wq, dq)) / total_w
+        stdev = math.sqrt(var) if var > 1e-12 * (1.0 + mean * mean) else 0.0
 
         if stdev == 0:
             return MetricStatus(
@@ -77,6 +195,8 @@ class AnomalyDetector:
                 mean=mean,
                 stdev=stdev,
                 samples=samples,
+                percentiles=percentiles,
+                percentile_state=percentile_state,
             )
 
         z = abs(value - mean) / stdev
@@ -97,8 +217,330 @@ class AnomalyDetector:
             mean=mean,
             stdev=stdev,
             samples=samples,
+            percentiles=percentiles,
+            percentile_state=percentile_state,
+        )
+
+@dataclass
+class MultivariateStatus:
+    """
+    Result of one multivariate evaluation.
+    `z_score` is the Mahalanobis distance mapped onto the same scale
+    as the univariate z-scores, so the same warn/alert factors apply.
+    """
+    state: str
+    distance: Optional[float]
+    z_score: Optional[float]
+    samples: int
+    contributions: List[Tuple[str, float]] = field(default_factory=list)
+
+class MultivariateDetector:
+    """
+    Scores the joint combination of all metrics per tick.
+
+    Keeps an exponentially weighted mean vector and covariance matrix, updated
+    with a rank-one step per tick. The inverse covariance is tracked alongside
+    via Sherman-Morrison and rebuilt every `refresh_every` ticks to stop
+    numerical drift, so a tick needs rank-one updates (one for the sample,
+    one per floored variance) instead of a full matrix inverse.
+
+    A diagonal variance floor, relative to the mean, keeps near-constant
+    metrics from producing huge distances. The tracked inverse is always that
+    of the covariance plus this floor, which is re-derived from the mean at
+    each refresh.
+    """
+
+    def __init__(
+        self,
+        window_size: int = WINDOW_SIZE,
+        warn_factor: float = STD_FACTOR_WARN,
+        alert_factor: float = STD_FACTOR_ALERT,
+        min_samples: int = MIN_SAMPLES,
+        refresh_every: int = MV_REFRESH_TICKS,
+        variance_floor: float = MV_VARIANCE_FLOOR,
+        top_k: int = MV_TOP_CONTRIBUTORS,
+    ):
+        self.alpha = 2.0 / (window_size + 1)
+        self.warn_factor = warn_factor
+        self.alert_factor = alert_factor
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self.variance_floor = variance_floor
+        self.top_k = top_k
+        self.nominal_interval = UPDATE_INTERVAL_MS / 1000.0
+
+        self.names: List[str] = []
+        self._index: Dict[str, int] = {}
+        self.mean = np.zeros(0)
+        self.cov = np.zeros((0, 0))
+        self.precision = np.zeros((0, 0))
+        self.floor = np.zeros(0)
+        self.samples = 0
+        self._since_refresh = 0
+        self._last_ts: Optional[float] = None
+        self._key_order: Tuple[str, ...] = ()
+
+    def _add_dimensions(self, new_names: List[str], values: Dict[str, float]):
+        old = len(self.names)
+        for name in new_names:
+            self._index[name] = len(self.names)
+            self.names.append(name)
+        dim = len(self.names)
+
+        mean = np.zeros(dim)
+        mean[:old] = self.mean
+        mean[old:] = [values[n] for n in new_names]
+        cov = np.zeros((dim, dim))
+        cov[:old, :old] = self.cov
+
+        self.mean = mean
+        self.cov = cov
+        self._key_order = tuple(self.names)
+        self._refresh_precision()
+
+    def _refresh_precision(self):
+        self.floor = (self.variance_floor * np.maximum(np.abs(self.mean), 1.0)) ** 2
+        self.precision = np.linalg.inv(self.cov + np.diag(self.floor))
+        self._since_refresh = 0
+
+    def _step_alpha(self, timestamp: Optional[float]) -> float:
+        if timestamp is None or self._last_ts is None or timestamp <= self._last_ts:
+            steps = 1.0
+        else:
+            steps = (timestamp - self._last_ts) / self.nominal_interval
+        if timestamp is not None:
+            self._last_ts = timestamp
+        return 1.0 - (1.0 - self.alpha) ** steps
+
+    def _z_equivalent(self, d2: float, dof: int) -> float:
+        # Wilson-Hilferty: (X/k)^(1/3) is approximately normal for X ~ chi²(k).
+        c = 2.0 / (9.0 * dof)
+        return ((d2 / dof) ** (1.0 / 3.0) - (1.0 - c)) / math.sqrt(c)
+
+    def evaluate(self, values: Dict[str, float], timestamp: Optional[float] = None) -> MultivariateStatus:
+        new_names = [n for n in values if n not in self._index]
+        if new_names:
+            self._add_dimensions(new_names, values)
+
+        dim = len(self.names)
+        if len(values) == dim and tuple(values) == self._key_order:
+            x = np.fromiter(values.values(), dtype=float, count=dim)
+        else:
+            index = self._index
+            x = self.mean.copy()
+            for name, v in values.items():
+                x[index[name]] = v
+
+        d = x - self.mean
+        pd = self.precision @ d
+        d2 = float(d @ pd)
+
+        a = self._step_alpha(timestamp)
+        self.mean += a * d
+        outer_d = np.outer(d, d)
+        outer_d *= a
+        self.cov += outer_d
+        self.cov *= 1.0 - a
+        self.samples += 1
+        self._since_refresh += 1
+
+        if self._since_refresh >= self.refresh_every:
+            self._refresh_precision()
+        else:
+            outer_pd = np.outer(pd, pd)
+            outer_pd *= a / (1.0 + a * d2)
+            self.precision -= outer_pd
+            self.precision *= 1.0 / (1.0 - a)
+            # The decay above shrank the floor by (1 - a) as well; add the
+            # missing a * floor back, one diagonal entry (rank one) at a time.
+            precision = self.precision
+            for i, extra in enumerate((a * self.floor).tolist()):
+                col = precision[:, i].copy()
+                col *= math.sqrt(extra / (1.0 + extra * col[i]))
+                precision -= np.outer(col, col)
+
+        if self.samples < max(self.min_samples, 2 * dim):
+            return MultivariateStatus(state="LEARN", distance=None, z_score=None, samples=self.samples)
+
+        d2 = max(d2, 0.0)
+        z = self._z_equivalent(d2, dim)
+
+        if z >= self.alert_factor:
+            state = "ALERT"
+        elif z >= self.warn_factor:
+            state = "WARN"
+        else:
+            state = "OK"
+
+        contributions = []
+        if d2 > 0:
+            contrib = d * pd
+            k = min(self.top_k, dim)
+            top = np.argpartition(contrib, dim - k)[dim - k:]
+            for i in sorted(top, key=lambda i: contrib[i], reverse=True):
+                if contrib[i] > 0:
+                    contributions.append((self.names[i], float(contrib[i] / d2)))
+
+        return MultivariateStatus(
+            state=state,
+            distance=math.sqrt(d2),
+            z_score=z,
+            samples=self.samples,
+            contributions=contributions,
         )
 
+STATE_CODES = ("LEARN", "STABLE", "OK", "WARN", "ALERT")
+
+def _prefix_sums(x: np.ndarray) -> np.ndarray:
+    out = np.empty(len(x) + 1)
+    out[0] = 0.0
+    np.cumsum(x, out=out[1:])
+    return out
+
+
+def rolling_states(
+    values,
+    timestamps=None,
+    window_seconds: float = WINDOW_SECONDS,
+    warn_factor: float = STD_FACTOR_WARN,
+    alert_factor: float = STD_FACTOR_ALERT,
+    min_samples: int = MIN_SAMPLES,
+    max_samples: int = WINDOW_MAX_SAMPLES,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized offline counterpart of AnomalyDetector.evaluate. Returns
+    (z-scores, state codes) where each code indexes STATE_CODES.
+
+    Like the live detector, every sample is weighted by the time since the
+    previous one and the baseline spans `window_seconds` (at least
+    `min_samples`, at most `max_samples` samples). Without timestamps the
+    samples are taken as evenly spaced at the nominal interval. Window sums
+    come from cumulative sums of the centred series, so the cost is O(n log n)
+    regardless of the window.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    if n == 0:
+        return np.empty(0), np.empty(0, dtype=np.int8)
+
+    nominal = UPDATE_INTERVAL_MS / 1000.0
+    w = np.full(n, nominal)
+    if timestamps is not None:
+        step = np.diff(np.asarray(timestamps, dtype=np.float64))
+        w[1:] = np.where(step > 0, step, nominal)
+
+    ref = float(x.mean())
+    c = x - ref
+    cw = _prefix_sums(w)
+    cs = _prefix_sums(w * c)
+    cs2 = _prefix_sums(w * c * c)
+
+    # Oldest sample kept for sample i: as AnomalyDetector.evaluate drops
+    # samples while the remaining ones still span the window.
+    hi = np.arange(1, n + 1)
+    by_time = np.searchsorted(cw, cw[hi] - window_seconds, side="right") - 1
+    lo = np.minimum(by_time, hi - min_samples)
+    lo = np.maximum(lo, np.maximum(hi - max_samples, 0))
+    count = hi - lo
+    total = cw[hi] - cw[lo]
+    mean_c = (cs[hi] - cs[lo]) / total
+    var = (cs2[hi] - cs2[lo]) / total - mean_c * mean_c
+
+    # Cumulative sums leave rounding noise where the true variance is zero.
+    scale = 1.0 + ref * ref + float(c.var())
+    stable = var <= 1e-10 * scale
+    std = np.sqrt(np.where(stable, 1.0, var))
+    z = np.where(stable, 0.0, np.abs(c - mean_c) / std)
+
+    codes = np.full(n, 2, dtype=np.int8)
+    codes[z >= warn_factor] = 3
+    codes[z >= alert_factor] = 4
+    codes[stable] = 1
+    codes[count < min_samples] = 0
+    return z, codes
+
+def forecast_high_load_minutes(history, threshold: float = 80.0) -> Optional[float]:
+    """
+    Linear trend over (timestamp, value) pairs. Regressing on real time
+    instead of the sample index keeps the forecast correct when the
+    sampling interval changes.
+    """
+    if len(history) < 10:
+        return None
+
+    n = len(history)
+    t0 = history[0][0]
+    xs = [t - t0 for t, _ in history]
+    ys = [v for _, v in history]
+
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+
+    num = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    den = sum((x - mean_x) ** 2 for x in xs) or 1.0
+    slope = num / den
+    intercept = mean_y - slope * mean_x
+
+    if slope <= 0:
+        return None
+
+    t_cross = (threshold - intercept) / slope
+    if t_cross <= xs[-1]:
+        return 0.0
+
+    minutes = (t_cross - xs[-1]) / 60.0
+    if 0 < minutes <= 30:
+        return minutes
+    return None
+
+class AdaptiveSampler:
+    """
+    Chooses the next sampling interval from the detector states of the last tick.
+
+    Any WARN/ALERT drops straight to the fast interval. After `calm_ticks`
+    ticks in which every metric was OK or STABLE the interval is stretched
+    step by step up to `max_ms`. LEARN keeps the base interval.
+    """
+
+    def __init__(
+        self,
+        base_ms: int = UPDATE_INTERVAL_MS,
+        fast_ms: int = ADAPTIVE_FAST_INTERVAL_MS,
+        max_ms: int = ADAPTIVE_MAX_INTERVAL_MS,
+        calm_ticks: int = ADAPTIVE_CALM_TICKS,
+        stretch_factor: float = ADAPTIVE_STRETCH_FACTOR,
+    ):
+        self.base_ms = base_ms
+        self.fast_ms = fast_ms
+        self.max_ms = max_ms
+        self.calm_ticks = calm_ticks
+        self.stretch_factor = stretch_factor
+        self.interval_ms = base_ms
+        self._calm = 0
+
+    def reset(self):
+        self.interval_ms = self.base_ms
+        self._calm = 0
+
+    def next_interval_ms(self, states: Iterable[str]) -> int:
+        states = set(states)
+
+        if states & {"WARN", "ALERT"}:
+            self._calm = 0
+            self.interval_ms = self.fast_ms
+        elif "LEARN" in states or not states:
+            self._calm = 0
+            self.interval_ms = self.base_ms
+        else:
+            self._calm += 1
+            if self.interval_ms < self.base_ms:
+                self.interval_ms = self.base_ms
+            elif self._calm >= self.calm_ticks:
+                self._calm = 0
+                self.interval_ms = min(self.max_ms, int(self.interval_ms * self.stretch_factor))
+
+        return self.interval_ms
+
 class SystemMonitorBackend:
     """
     Provides system metrics in the following format:
@@ -110,9 +552,15 @@ class SystemMonitorBackend:
         "Net Up (kB/s)": (wert, "kB/s"),
         "Net Down (kB/s)": (wert, "kB/s")
     }
+
+    With DISK_DETAIL_ENABLED, per-device I/O and per-mount capacity series from
+    DiskCollector follow the network rates.
     """
 
-    def __init__(self):
+    def __init__(self, disk_detail: bool = DISK_DETAIL_ENABLED):
+        # The system drive ("/" or e.g. "C:\\") is resolved once, not per tick.
+        self._disk_root = os.path.abspath(os.sep)
+        self._disks = DiskCollector() if disk_detail else None
         self._last_net = psutil.net_io_counters()
         self._last_time = time.time()
 
@@ -123,11 +571,7 @@ class SystemMonitorBackend:
 
         metrics["RAM (%)"] = (psutil.virtual_memory().percent, "%")
 
-        try:
-            disk = psutil.disk_usage("/")
-        except Exception:
-            disk = psutil.disk_usage("C:\\")
-        metrics["Disk (%)"] = (disk.percent, "%")
+        metrics["Disk (%)"] = (psutil.disk_usage(self._disk_root).percent, "%")
 
         now = time.time()
         net = psutil.net_io_counters()
@@ -142,4 +586,7 @@ class SystemMonitorBackend:
         metrics["Net Up (kB/s)"] = (up, "kB/s")
         metrics["Net Down (kB/s)"] = (down, "kB/s")
 
+        if self._disks is not None:
+            metrics.update(self._disks.collect())
+
         return metrics
\ No newline at end of file
@@ -0,0 +1,314 @@
+import os
+import socket
+import struct
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from config import NETATTR_FD_BUDGET
+
+# inode -> (protocol, state, tx_queue, rx_queue)
+Socket = Tuple[str, int, int, int]
+
+TABLES = ("tcp", "tcp6", "udp", "udp6")
+TCP_ESTABLISHED = 0x01
+TCP_LISTEN = 0x0A
+
+# sock_diag (netlink) constants, see linux/inet_diag.h
+_NETLINK_SOCK_DIAG = 4
+_SOCK_DIAG_BY_FAMILY = 20
+_NLM_F_REQUEST_DUMP = 0x301
+_NLMSG_ERROR = 2
+_NLMSG_DONE = 3
+_INET_DIAG_INFO = 2
+_NLMSG = struct.Struct("=IHHII")
+_DIAG_REQ = struct.Struct("=BBBxI48x")
+_RTATTR = struct.Struct("=HH")
+_DIAG_INODE_OFFSET = 68
+_DIAG_MSG_SIZE = 72
+# tcpi_bytes_acked / tcpi_bytes_received within struct tcp_info
+_TCPI_BYTES = struct.Struct("=QQ")
+_TCPI_BYTES_OFFSET = 120
+# Every state except TIME_WAIT and LISTEN, which carry no traffic.
+_DIAG_STATES = 0xFFFFFFFF & ~((1 << 6) | (1 << 10))
+
+
+@dataclass
+class ProcessNet:
+    """
+    Network usage of one process. pid 0 collects sockets whose owner is
+    not (yet) known, e.g. those of processes we may not inspect.
+    """
+    pid: int
+    name: str
+    tcp: int = 0
+    udp: int = 0
+    listen: int = 0
+    tx_queue: int = 0
+    rx_queue: int = 0
+    up_kbs: Optional[float] = None
+    down_kbs: Optional[float] = None
+
+    @property
+    def sockets(self) -> int:
+        return self.tcp + self.udp
+
+
+def read_socket_table(path: str, proto: str, out: Dict[int, Socket]):
+    """
+    Adds the sockets of one /proc/net table to `out`, keyed by inode.
+    """
+    try:
+        with open(path, "rb") as f:
+            lines = f.read().split(b"\n")[1:]
+    except OSError:
+        return
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 10:
+            continue
+        inode = int(fields[9])
+        if inode:
+            tx, _, rx = fields[4].partition(b":")
+            out[inode] = (proto, int(fields[3], 16), int(tx, 16), int(rx, 16))
+
+
+def tcp_byte_counters() -> Optional[Dict[int, Tuple[int, int]]]:
+    """
+    (bytes sent and acked, bytes received) per TCP socket inode from the
+    kernel's tcp_info, fetched with one sock_diag dump per address family.
+    Returns None where sock_diag is unavailable.
+    """
+    counters: Dict[int, Tuple[int, int]] = {}
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, _NETLINK_SOCK_DIAG)
+    except (AttributeError, OSError):
+        return None
+    try:
+        for seq, family in enumerate((socket.AF_INET, socket.AF_INET6), start=1):
+            req = _DIAG_REQ.pack(family, socket.IPPROTO_TCP, 1 << (_INET_DIAG_INFO - 1), _DIAG_STATES)
+            sock.sendto(_NLMSG.pack(_NLMSG.size + len(req), _SOCK_DIAG_BY_FAMILY, _NLM_F_REQUEST_DUMP, seq, 0) + req, (0, 0))
+            done = False
+            while not done:
+                data = sock.recv(1 << 20)
+                pos = 0
+                while pos + _NLMSG.size <= len(data):
+                    length, msg_type = _NLMSG.unpack_from(data, pos)[:2]
+                    if msg_type in (_NLMSG_DONE, _NLMSG_ERROR) or length < _NLMSG.size:
+                        done = True
+                        break
+                    body = pos + _NLMSG.size
+                    end = pos + length
+                    inode = struct.unpack_from("=I", data, body + _DIAG_INODE_OFFSET)[0]
+                    attr = body + _DIAG_MSG_SIZE
+                    while attr + _RTATTR.size <= end:
+                        attr_len, attr_type = _RTATTR.unpack_from(data, attr)
+                        if attr_len < _RTATTR.size:
+                            break
+                        if attr_type == _INET_DIAG_INFO and attr_len >= _RTATTR.size + _TCPI_BYTES_OFFSET + _TCPI_BYTES.size:
+                            counters[inode] = _TCPI_BYTES.unpack_from(data, attr + _RTATTR.size + _TCPI_BYTES_OFFSET)
+                            break
+                        attr += (attr_len + 3) & ~3
+                    pos += (length + 3) & ~3
+    except OSError:
+        return None
+    finally:
+        sock.close()
+    return counters
+
+
+class NetAttribution:
+    """
+    Attributes sockets from /proc/net/{tcp,tcp6,udp,udp6} to processes.
+
+    The socket -> pid mapping comes from the /proc/<pid>/fd links and is
+    cached per process as {fd: socket inode, or 0 for anything else}.
+    Each refresh spends at most `fd_budget` listdir/readlink calls: new
+    processes first, then the known ones round-robin. A known process only
+    has its new fds read, plus fds whose socket has since closed (the fd
+    number may have been reused). Fds cached as non-sockets are re-read only
+    while there are sockets without an owner; sockets that stay unowned for
+    a full round are given up on (typically other users' processes).
+
+    Byte rates come from tcp_info counters (tcp_byte_counters) and are only
+    available for TCP.
+    """
+
+    def __init__(self, proc: str = "/proc", fd_budget: int = NETATTR_FD_BUDGET):
+        self.proc = proc
+        self.fd_budget = fd_budget
+        self.sockets: Dict[int, Socket] = {}
+        self.fds: Dict[int, Dict[str, int]] = {}
+        self.owner: Dict[int, int] = {}
+        self.denied: Set[int] = set()
+        self.names: Dict[int, str] = {}
+        self.last_cost = 0
+
+        self._queue: Deque[int] = deque()
+        self._cycle_left = 0
+        self._cycle_pending: Set[int] = set()
+        self._given_up: Set[int] = set()
+        self._last_bytes: Dict[int, Tuple[int, int]] = {}
+        self._last_time: Optional[float] = None
+
+    def _forget(self, pid: int):
+        for inode in self.fds.pop(pid, {}).values():
+            if inode and self.owner.get(inode) == pid:
+                del self.owner[inode]
+        self.denied.discard(pid)
+        self.names.pop(pid, None)
+
+    def _scan(self, pid: int, full: bool, budget: int) -> int:
+        """
+        Re-reads the fd table of `pid` and returns the number of syscalls
+        spent. Once `budget` is used up, fds still to be read keep their
+        cached value or stay unknown until the next scan.
+        """
+        path = f"{self.proc}/{pid}/fd"
+        try:
+            entries = os.listdir(path)
+        except PermissionError:
+            self.denied.add(pid)
+            return 1
+        except OSError:
+            return 1
+
+        cost = 1
+        cached = self.fds.get(pid, {})
+        sockets = self.sockets
+        fresh: Dict[str, int] = {}
+        for fd in entries:
+            inode = cached.get(fd)
+            if inode is None or (inode and inode not in sockets) or (full and not inode):
+                if cost >= budget:
+                    if inode is not None:
+                        fresh[fd] = inode
+                    continue
+                cost += 1
+                try:
+                    target = os.readlink(f"{path}/{fd}")
+                except PermissionError:
+                    self.denied.add(pid)
+                    break
+                except OSError:
+                    continue
+                inode = int(target[8:-1]) if target.startswith("socket:[") else 0
+                if inode not in sockets:
+                    inode = 0
+            fresh[fd] = inode
+
+        owner = self.owner
+        for inode in cached.values():
+            if inode and owner.get(inode) == pid:
+                del owner[inode]
+        for inode in fresh.values():
+            if inode:
+                owner[inode] = pid
+        self.fds[pid] = fresh
+        return cost
+
+    def _update_owners(self):
+        try:
+            pids = {int(name) for name in os.listdir(self.proc) if name.isdigit()}
+        except OSError:
+            return
+        for pid in [p for p in self.fds if p not in pids]:
+            self._forget(pid)
+        self.denied &= pids
+        self._queue = deque(p for p in self._queue if p in pids)
+
+        budget = self.fd_budget
+        for pid in pids:
+            if pid not in self.fds and pid not in self.denied and budget > 0:
+                budget -= self._scan(pid, True, budget)
+                self._queue.append(pid)
+
+        unowned = {i for i in self.sockets if i not in self.owner}
+        self._given_up &= unowned
+        pending = unowned - self._given_up
+        if self._cycle_left <= 0:
+            # Whatever was still unowned when the last full round started is not findable.
+            self._given_up |= self._cycle_pending & pending
+            pending -= self._given_up
+            self._cycle_pending = pending
+            self._cycle_left = len(self._queue)
+
+        scanned = 0
+        while budget > 0 and scanned < len(self._queue) and self._cycle_left > 0:
+            pid = self._queue.popleft()
+            self._queue.append(pid)
+            scanned += 1
+            self._cycle_left -= 1
+            if pid not in self.denied:
+                budget -= self._scan(pid, bool(pending), budget)
+
+        self.last_cost = self.fd_budget - budget
+
+    def _name(self, pid: int) -> str:
+        name = self.names.get(pid)
+        if name is None:
+            try:
+                with open(f"{self.proc}/{pid}/comm", "r", encoding="utf-8", errors="replace") as f:
+                    name = f.read().strip()
+            except OSError:
+                name = str(pid)
+            self.names[pid] = name
+        return name
+
+    def refresh(self, now: Optional[float] = None) -> List[ProcessNet]:
+        """
+        Re-reads the socket tables, spends this refresh's fd budget and
+        returns per-process usage, busiest first.
+        """
+        now = time.time() if now is None else now
+        sockets: Dict[int, Socket] = {}
+        for table in TABLES:
+            read_socket_table(f"{self.proc}/net/{table}", table.rstrip("6"), sockets)
+        self.sockets = sockets
+        self._update_owners()
+
+        counters = tcp_byte_counters()
+        elapsed = None if self._last_time is None else max(1e-3, now - self._last_time)
+        self._last_time = now
+
+        usage: Dict[int, ProcessNet] = {}
+        owner = self.owner
+        for inode, (proto, state, tx, rx) in sockets.items():
+            pid = owner.get(inode, 0)
+            entry = usage.get(pid)
+            if entry is None:
+                entry = usage[pid] = ProcessNet(pid, "")
+            if proto == "tcp":
+                if state == TCP_LISTEN:
+                    entry.listen += 1
+                else:
+                    entry.tcp += 1
+            else:
+                entry.udp += 1
+            entry.tx_queue += tx
+            entry.rx_queue += rx
+
+        if counters is not None:
+            if elapsed is not None:
+                for entry in usage.values():
+                    entry.up_kbs = entry.down_kbs = 0.0
+                last = self._last_bytes
+                for inode, (sent, received) in counters.items():
+                    prev = last.get(inode)
+                    entry = usage.get(owner.get(inode, 0))
+                    if prev is None or entry is None:
+                        continue
+                    entry.up_kbs += max(0, sent - prev[0]) / 1024 / elapsed
+                    entry.down_kbs += max(0, received - prev[1]) / 1024 / elapsed
+            self._last_bytes = counters
+
+        result = sorted(
+            usage.values(),
+            key=lambda e: ((e.up_kbs or 0.0) + (e.down_kbs or 0.0), e.sockets, e.listen),
+            reverse=True,
+        )
+        for entry in result:
+            if entry.pid:
+                entry.name = self._name(entry.pid)
+        return result
@@ -0,0 +1,344 @@
+import json
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import (
+    APP_NAME,
+    NOTIFY_BATCH_S,
+    NOTIFY_BATCH_MAX,
+    NOTIFY_MAX_BATCHES_PER_MIN,
+    NOTIFY_DEDUP_S,
+    NOTIFY_RETRIES,
+    NOTIFY_BACKOFF_S,
+    NOTIFY_BACKOFF_MAX_S,
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_TIMEOUT_S,
+)
+
+# States that are worth telling anyone about, by severity; leaving them is a recovery.
+NOTIFY_STATES = ("WARN", "ALERT")
+_SEVERITY = {state: rank for rank, state in enumerate(NOTIFY_STATES, start=1)}
+
+
+@dataclass
+class Notification:
+    timestamp: float
+    host: str
+    metric: str
+    status: str
+    previous: str
+    value: float
+    unit: str = ""
+    z_score: Optional[float] = None
+
+    @property
+    def recovered(self) -> bool:
+        return self.status not in NOTIFY_STATES
+
+    def text(self) -> str:
+        if self.recovered:
+            return f"{self.host}: {self.metric} back to {self.status} ({self.value:.2f} {self.unit})".rstrip()
+        return f"{self.host}: {self.metric} {self.previous} -> {self.status} ({self.value:.2f} {self.unit})".rstrip()
+
+
+class WebhookSink:
+    """
+    POSTs each batch as JSON: {"source": ..., "notifications": [...]}.
+    """
+
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = NOTIFY_TIMEOUT_S):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, batch: List[Notification]):
+        body = json.dumps({"source": APP_NAME, "notifications": [asdict(n) for n in batch]}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class SyslogSink:
+    """
+    One RFC 3164 datagram per notification, to /dev/log or a UDP host:port.
+    """
+
+    name = "syslog"
+    FACILITY_USER = 1
+    SEVERITY = {"ALERT": 2, "WARN": 4}
+    SEVERITY_RECOVERED = 6
+
+    def __init__(self, address=None):
+        if address is None:
+            address = "/dev/log" if os.path.exists("/dev/log") else ("127.0.0.1", 514)
+        self.address = address
+
+    def send(self, batch: List[Notification]):
+        family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            for n in batch:
+                severity = self.SEVERITY.get(n.status, self.SEVERITY_RECOVERED)
+                stamp = time.strftime("%b %d %H:%M:%S", time.localtime(n.timestamp))
+                message = f"<{self.FACILITY_USER * 8 + severity}>{stamp} {n.host} systemmonitor: {n.text()}"
+                sock.sendto(message.encode("utf-8"), self.address)
+
+
+class FileSink:
+    """
+    Appends NDJSON lines in the event-log shape, so the file can be fed to
+    analyze.py and backtest.py like any other capture.
+    """
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def send(self, batch: List[Notification]):
+        lines = "".join(json.dumps(asdict(n)) + "\n" for n in batch)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class DesktopSink:
+    """
+    One desktop notification per batch via notify-send (Linux) or
+    osascript (macOS).
+    """
+
+    name = "desktop"
+
+    def __init__(self, timeout: float = NOTIFY_TIMEOUT_S):
+        self.timeout = timeout
+
+    def send(self, batch: List[Notification]):
+        alerts = sum(1 for n in batch if n.status == "ALERT")
+        title = f"{APP_NAME}: {alerts} ALERT" if alerts else APP_NAME
+        body = "\n".join(n.text() for n in batch)
+        if sys.platform == "darwin":
+            script = f"display notification {json.dumps(body)} with title {json.dumps(title)}"
+            command = ["osascript", "-e", script]
+        elif shutil.which("notify-send"):
+            command = ["notify-send", "-a", APP_NAME, title, body]
+        else:
+            raise OSError("no desktop notification command available")
+        subprocess.run(command, check=True, timeout=self.timeout,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def parse_sink(spec: str):
+    """
+    Sink from a command-line spec: http(s)://URL, syslog, syslog:HOST[:PORT],
+    file:PATH or desktop.
+    """
+    if spec.startswith(("http://", "https://")):
+        return WebhookSink(spec)
+    if spec == "syslog":
+        return SyslogSink()
+    if spec.startswith("syslog:"):
+        target = spec[len("syslog:"):]
+        if target.startswith("/"):
+            return SyslogSink(target)
+        host, _, port = target.partition(":")
+        return SyslogSink((host, int(port) if port else 514))
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    if spec == "desktop":
+        return DesktopSink()
+    raise ValueError(f"unknown notification sink: {spec}")
+
+
+class _SinkWorker:
+    """
+    Delivers to one sink on its own thread, so a slow or unreachable sink
+    only ever delays itself.
+
+    Notifications are collected for `batch_s` and sent together; at most
+    `max_batches_per_min` batches go out per minute. A failed batch is
+    retried with exponential backoff (new notifications join it meanwhile)
+    and dropped after `retries` attempts. When the queue or the pending
+    batch is full, the oldest notifications are dropped.
+    """
+
+    def __init__(self, sink, batch_s: float, batch_max: int, max_batches_per_min: float,
+                 retries: int, backoff_s: float, backoff_max_s: float, queue_size: int):
+        self.sink = sink
+        self.batch_s = batch_s
+        self.batch_max = batch_max
+        self.min_interval = 60.0 / max_batches_per_min if max_batches_per_min > 0 else 0.0
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_error: Optional[BaseException] = None
+
+        self._queue: "queue.Queue[Notification]" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"notify-{sink.name}", daemon=True)
+        self._thread.start()
+
+    def offer(self, notification: Notification):
+        try:
+            self._queue.put_nowait(notification)
+        except queue.Full:
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(notification)
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout: float):
+        self._thread.join(timeout)
+
+    def _run(self):
+        pending: List[Notification] = []
+        first_at = 0.0
+        not_before = 0.0
+        attempt = 0
+
+        while True:
+            stopping = self._stop.is_set()
+            now = time.monotonic()
+            if stopping:
+                wait = 0.0
+            elif pending:
+                wait = max(0.0, max(first_at + self.batch_s, not_before) - now)
+            else:
+                wait = 0.5
+            try:
+                item = self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait()
+                if not pending:
+                    first_at = time.monotonic()
+                pending.append(item)
+                while True:
+                    pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if len(pending) > self.batch_max:
+                self.dropped += len(pending) - self.batch_max
+                del pending[:len(pending) - self.batch_max]
+            if not pending:
+                if stopping:
+                    return
+                continue
+
+            now = time.monotonic()
+            if not stopping and now < max(first_at + self.batch_s, not_before):
+                continue
+
+            try:
+                self.sink.send(pending)
+            except Exception as e:
+                self.last_error = e
+                attempt += 1
+                if stopping or attempt > self.retries:
+                    self.failed += len(pending)
+                    pending = []
+                    attempt = 0
+                else:
+                    not_before = now + min(self.backoff_s * 2 ** (attempt - 1), self.backoff_max_s)
+                continue
+
+            self.sent += len(pending)
+            pending = []
+            attempt = 0
+            not_before = now + self.min_interval
+
+
+class NotificationDispatcher:
+    """
+    Publisher that turns detector state transitions into notifications.
+
+    publish() only compares states and enqueues, so it never waits on a
+    sink. Each metric is compared with the last state actually sent for it,
+    and a change is reported when either side is WARN/ALERT. To keep
+    flapping metrics quiet, a de-escalation that repeats a transition sent
+    within `dedup_s` is held back (not dropped): it goes out once the window
+    has passed, unless the metric returned to the sent state meanwhile.
+    Escalations are never held back, so the last message a sink received
+    always ends up matching the metric's state. Each sink is served by its
+    own _SinkWorker.
+    """
+
+    def __init__(
+        self,
+        sinks: Sequence,
+        hostname: Optional[str] = None,
+        batch_s: float = NOTIFY_BATCH_S,
+        batch_max: int = NOTIFY_BATCH_MAX,
+        max_batches_per_min: float = NOTIFY_MAX_BATCHES_PER_MIN,
+        dedup_s: float = NOTIFY_DEDUP_S,
+        retries: int = NOTIFY_RETRIES,
+        backoff_s: float = NOTIFY_BACKOFF_S,
+        backoff_max_s: float = NOTIFY_BACKOFF_MAX_S,
+        queue_size: int = NOTIFY_QUEUE_SIZE,
+    ):
+        self.hostname = hostname or socket.gethostname()
+        self.dedup_s = dedup_s
+        self.suppressed = 0
+        self._sent_states: Dict[str, str] = {}
+        self._held: set = set()
+        self._last_sent: Dict[Tuple[str, str, str], float] = {}
+        self.workers = [
+            _SinkWorker(sink, batch_s, batch_max, max_batches_per_min, retries, backoff_s, backoff_max_s, queue_size)
+            for sink in sinks
+        ]
+
+    def publish(self, timestamp: float, raw_metrics, statuses):
+        sent_states = self._sent_states
+        for status in statuses:
+            name = status.name
+            state = status.state
+            previous = sent_states.get(name)
+            if state == previous:
+                self._held.discard(name)
+                continue
+            if previous is None or (state not in NOTIFY_STATES and previous not in NOTIFY_STATES):
+                # First sight, or a change nobody is told about (e.g. LEARN -> OK).
+                sent_states[name] = state
+                continue
+
+            key = (name, previous, state)
+            last = self._last_sent.get(key)
+            escalation = _SEVERITY.get(state, 0) > _SEVERITY.get(previous, 0)
+            if not escalation and last is not None and timestamp - last < self.dedup_s:
+                if name not in self._held:
+                    self._held.add(name)
+                    self.suppressed += 1
+                continue
+            self._held.discard(name)
+            self._last_sent[key] = timestamp
+            sent_states[name] = state
+
+            notification = Notification(
+                timestamp, self.hostname, name, state, previous,
+                float(status.value), status.unit, status.z_score,
+            )
+            for worker in self.workers:
+                worker.offer(notification)
+
+    def stop(self, timeout: float = NOTIFY_TIMEOUT_S):
+        # Every worker gets one last attempt at what it still holds.
+        for worker in self.workers:
+            worker.stop()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
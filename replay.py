@@ -0,0 +1,177 @@
+import bisect
+import pickle
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import REPLAY_CHECKPOINT_S, REPLAY_WARMUP_S, REPLAY_MAX_CHECKPOINTS
+from capture import detect_format, iter_binary, open_mmap, sync_points
+
+# (segment index, first sample of its segment, timestamp, metrics)
+_Item = Tuple[int, bool, float, Dict[str, Tuple[float, str]]]
+
+
+class ReplaySource:
+    """
+    Random access to a binary capture through its sync points. Segment i
+    covers the frames from sync point i up to sync point i + 1.
+    """
+
+    def __init__(self, path: str, host: Optional[str] = None):
+        self.path = path
+        self.mm = open_mmap(path)
+        if self.mm is None or detect_format(self.mm) != "binary":
+            raise ValueError(f"{path} is not a binary capture")
+        self.points = sync_points(path, self.mm)
+        if not self.points:
+            raise ValueError(f"{path} contains no samples")
+        self.times = [ts for ts, _ in self.points]
+        self.host = host
+        if self.host is None:
+            self.host = next(iter_binary(self.mm, self.points[0][1], len(self.mm)))[0]
+
+        self.start_ts = self.times[0]
+        self.end_ts = self.start_ts
+        for _, ts, _ in self.segment(len(self.points) - 1):
+            self.end_ts = max(self.end_ts, ts)
+
+    def segment(self, i: int) -> Iterator[Tuple[str, float, Dict[str, Tuple[float, str]]]]:
+        end = self.points[i + 1][1] if i + 1 < len(self.points) else len(self.mm)
+        for host, ts, metrics in iter_binary(self.mm, self.points[i][1], end):
+            if host == self.host:
+                yield host, ts, metrics
+
+    def segment_before(self, ts: float) -> int:
+        return max(0, bisect.bisect_right(self.times, ts) - 1)
+
+    def close(self):
+        self.mm.close()
+
+
+class ReplayEngine:
+    """
+    Drives a sample pipeline from a capture on a replay clock.
+
+    `process(ts, metrics, render)` runs one sample through the pipeline;
+    `render` is only True for the last sample of each advance, so at high
+    speeds intermediate samples update state but are never drawn.
+    `snapshot()` / `restore(state)` capture and reset the pipeline state;
+    restore(None) means a fresh pipeline.
+
+    While playing contiguously from the start, a compressed checkpoint of the
+    pipeline state is stored at the first sync point after every
+    `checkpoint_s` of capture time. A seek restores the nearest checkpoint
+    before the target and fast-forwards from there. When no checkpoint lies
+    within `warmup_s`, the pipeline restarts fresh `warmup_s` before the
+    target: rolling windows are then exact again, while long-horizon state
+    (sketches, heatmap) only covers the warm-up.
+    """
+
+    def __init__(
+        self,
+        source: ReplaySource,
+        process: Callable[[float, Dict[str, Tuple[float, str]], bool], None],
+        snapshot: Callable[[], Any],
+        restore: Callable[[Any], None],
+        checkpoint_s: float = REPLAY_CHECKPOINT_S,
+        warmup_s: float = REPLAY_WARMUP_S,
+        max_checkpoints: int = REPLAY_MAX_CHECKPOINTS,
+    ):
+        self.source = source
+        self.process = process
+        self.snapshot = snapshot
+        self.restore = restore
+        self.checkpoint_s = checkpoint_s
+        self.warmup_s = warmup_s
+        self.max_checkpoints = max_checkpoints
+
+        self.checkpoints: Dict[int, bytes] = {}
+        self._checkpoint_times: List[float] = []
+        self.position = source.start_ts
+        self._exact = True
+        self._reader: Iterator[_Item] = iter(())
+        self._next: Optional[_Item] = None
+        self._start_reading(0)
+        self.restore(None)
+
+    @property
+    def finished(self) -> bool:
+        return self._peek() is None
+
+    def _start_reading(self, segment: int):
+        self._reader = self._read(segment)
+        self._next = None
+
+    def _read(self, segment: int) -> Iterator[_Item]:
+        for i in range(segment, len(self.source.points)):
+            first = True
+            for _, ts, metrics in self.source.segment(i):
+                yield i, first, ts, metrics
+                first = False
+
+    def _peek(self) -> Optional[_Item]:
+        if self._next is None:
+            self._next = next(self._reader, None)
+        return self._next
+
+    def _maybe_checkpoint(self, segment: int, ts: float):
+        if not self._exact or segment in self.checkpoints:
+            return
+        times = self._checkpoint_times
+        if times and ts - times[-1] < self.checkpoint_s:
+            return
+        self.checkpoints[segment] = zlib.compress(pickle.dumps(self.snapshot(), pickle.HIGHEST_PROTOCOL), 1)
+        times.append(ts)
+
+        if len(self.checkpoints) > self.max_checkpoints:
+            # Thin out every other checkpoint and widen the spacing accordingly.
+            keep = sorted(self.checkpoints)[::2]
+            self.checkpoints = {s: self.checkpoints[s] for s in keep}
+            self._checkpoint_times = [self.source.times[s] for s in keep]
+            self.checkpoint_s *= 2
+
+    def advance_to(self, target: float) -> int:
+        """
+        Processes every sample up to `target` and returns how many there were.
+        """
+        processed = 0
+        while True:
+            item = self._peek()
+            if item is None or item[2] > target:
+                break
+            self._next = None
+            segment, first, ts, metrics = item
+            if first:
+                self._maybe_checkpoint(segment, ts)
+            following = self._peek()
+            self.process(ts, metrics, following is None or following[2] > target)
+            processed += 1
+        self.position = min(max(target, self.position), self.source.end_ts)
+        return processed
+
+    def seek(self, target: float) -> int:
+        target = min(max(target, self.source.start_ts), self.source.end_ts)
+        best = None
+        for segment in self.checkpoints:
+            ts = self.source.times[segment]
+            if ts <= target and (best is None or ts > self.source.times[best]):
+                best = segment
+
+        if best is not None and target - self.source.times[best] <= self.warmup_s:
+            self.restore(pickle.loads(zlib.decompress(self.checkpoints[best])))
+            self._exact = True
+            self._start_reading(best)
+            # The checkpoint already holds the state before this segment.
+            self._peek()
+            if self._next is not None:
+                self._next = (self._next[0], False) + self._next[2:]
+        else:
+            start = self.source.segment_before(target - self.warmup_s)
+            self.restore(None)
+            self._exact = start == 0
+            self._start_reading(start)
+
+        self.position = self.source.times[best] if best is not None else self.source.start_ts
+        return self.advance_to(target)
+
+    def close(self):
+        self.source.close()
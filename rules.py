@@ -0,0 +1,446 @@
+"""
+Composite alert rules.
+
+A rule file holds one rule per line, `name [SEVERITY]: expression`, e.g.
+
+    busy_but_idle_net: CPU ALERT for 30 s AND Net Down < 10 kB/s
+    ram_filling [WARN]: RAM forecast < 5 min
+    db_hot: (CPU z > 3 OR Disk > 95) AND NOT RAM OK
+
+Conditions on a metric (referenced by its full name, quoted if it contains
+parentheses, or by the part before the unit, e.g. "Net Down"):
+
+    METRIC ALERT|WARN|OK|STABLE|LEARN   state; WARN also matches ALERT, OK also STABLE
+    METRIC [value] OP NUMBER [unit]     current value
+    METRIC z OP NUMBER                  z-score
+    METRIC forecast OP NUMBER [min]     minutes until forecast high load
+
+with OP one of < <= > >= == !=. Any condition may be followed by
+`for N s|min|h`: it then only counts once it has held that long.
+Conditions combine with AND, OR, NOT and parentheses. # starts a comment.
+"""
+
+import bisect
+import heapq
+import operator
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from monitoring import MetricStatus
+
+RULE_PREFIX = "Rule: "
+SEVERITIES = ("WARN", "ALERT")
+
+STATE_MATCH = {
+    "ALERT": ("ALERT",),
+    "WARN": ("WARN", "ALERT"),
+    "OK": ("OK", "STABLE"),
+    "STABLE": ("STABLE",),
+    "LEARN": ("LEARN",),
+}
+FIELDS = ("value", "z", "forecast")
+OPS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+DURATION_UNITS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600}
+KEYWORDS = {"and", "or", "not", "for"} | set(FIELDS)
+
+_TOKEN = re.compile(r'\s*(?:"([^"]*)"|(<=|>=|==|!=|<|>)|([()])|(-?\d+(?:\.\d+)?)|([^\s()<>=!"]+))')
+_LINE = re.compile(r"^\s*([^\[:]+?)\s*(?:\[(\w+)\])?\s*:\s*(.+)$")
+
+
+class RuleError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Atom:
+    """
+    One condition on one metric. Identical conditions in different rules
+    share a single Atom.
+    """
+    ref: str
+    field: str
+    op: str
+    threshold: object
+    duration: float = 0.0
+
+    def matches(self, name: str) -> bool:
+        name = name.lower()
+        ref = self.ref.lower()
+        return name == ref or name.startswith(ref + " (")
+
+    def compile(self) -> Callable[[MetricStatus, Optional[float]], bool]:
+        if self.field == "state":
+            states = self.threshold
+            return lambda s, f: s.state in states
+        op = OPS[self.op]
+        limit = self.threshold
+        if self.field == "value":
+            return lambda s, f: op(s.value, limit)
+        if self.field == "z":
+            return lambda s, f: s.z_score is not None and op(s.z_score, limit)
+        return lambda s, f: f is not None and op(f, limit)
+
+
+@dataclass
+class Rule:
+    name: str
+    severity: str
+    expression: str
+    atom_ids: Tuple[int, ...]
+    test: Callable[[List[bool]], bool]
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None or m.end() == pos:
+            raise RuleError(f"unexpected input at {text[pos:]!r}")
+        pos = m.end()
+        for kind, value in zip(("name", "op", "paren", "num", "word"), m.groups()):
+            if value is not None:
+                tokens.append((kind, value))
+                break
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent over the token list; builds a Python expression over
+    the atom truth list `a` while registering atoms in `atoms`.
+    """
+
+    def __init__(self, text: str, atoms: Dict[Atom, int]):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.atoms = atoms
+        self.used: List[int] = []
+
+    def _peek(self) -> Tuple[str, str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else ("end", "")
+
+    def _next(self) -> Tuple[str, str]:
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def _is_word(self, *words: str) -> bool:
+        kind, value = self._peek()
+        return kind == "word" and value.lower() in words
+
+    def parse(self) -> str:
+        source = self._or()
+        if self._peek()[0] != "end":
+            raise RuleError(f"unexpected {self._peek()[1]!r}")
+        return source
+
+    def _or(self) -> str:
+        parts = [self._and()]
+        while self._is_word("or"):
+            self._next()
+            parts.append(self._and())
+        return parts[0] if len(parts) == 1 else "(" + " or ".join(parts) + ")"
+
+    def _and(self) -> str:
+        parts = [self._not()]
+        while self._is_word("and"):
+            self._next()
+            parts.append(self._not())
+        return parts[0] if len(parts) == 1 else "(" + " and ".join(parts) + ")"
+
+    def _not(self) -> str:
+        if self._is_word("not"):
+            self._next()
+            return f"(not {self._not()})"
+        if self._peek() == ("paren", "("):
+            self._next()
+            inner = self._or()
+            if self._next() != ("paren", ")"):
+                raise RuleError("missing ')'")
+            return inner
+        return self._atom()
+
+    def _number(self) -> float:
+        kind, value = self._next()
+        if kind != "num":
+            raise RuleError(f"expected a number, got {value!r}")
+        return float(value)
+
+    def _atom(self) -> str:
+        words = []
+        if self._peek()[0] == "name":
+            words.append(self._next()[1])
+        else:
+            while self._peek()[0] == "word" and self._peek()[1].lower() not in KEYWORDS \
+                    and self._peek()[1].upper() not in STATE_MATCH:
+                words.append(self._next()[1])
+        if not words:
+            raise RuleError(f"expected a metric name, got {self._peek()[1]!r}")
+        ref = " ".join(words)
+
+        kind, value = self._peek()
+        if kind == "word" and value.upper() in STATE_MATCH:
+            self._next()
+            field, op, threshold = "state", "in", STATE_MATCH[value.upper()]
+        else:
+            field = "value"
+            if kind == "word" and value.lower() in FIELDS:
+                field = self._next()[1].lower()
+            kind, op = self._next()
+            if kind != "op":
+                raise RuleError(f"expected a state or comparison after {ref!r}")
+            threshold = self._number()
+            # A unit after the number is documentation only ("10 kB/s", "5 min").
+            if self._peek()[0] == "word" and self._peek()[1].lower() not in KEYWORDS:
+                self._next()
+
+        duration = 0.0
+        if self._is_word("for"):
+            self._next()
+            duration = self._number()
+            if self._peek()[0] == "word" and self._peek()[1].lower() in DURATION_UNITS:
+                duration *= DURATION_UNITS[self._next()[1].lower()]
+
+        atom = Atom(ref, field, op, threshold, duration)
+        index = self.atoms.setdefault(atom, len(self.atoms))
+        self.used.append(index)
+        return f"a[{index}]"
+
+
+class RuleState:
+    """
+    Evaluation state of a RuleSet for one host. Plain lists only, so it
+    pickles cheaply (replay checkpoints, fleet pool workers).
+    """
+
+    def __init__(self, n_atoms: int, statuses: List[MetricStatus]):
+        self.raw = [False] * n_atoms
+        self.held = [False] * n_atoms
+        self.since = [0.0] * n_atoms
+        self.due: List[Tuple[float, int, float]] = []
+        self.positions: Dict[int, int] = {}
+        self.active = [False] * len(statuses)
+        self.flipped: List[int] = []
+        self.statuses = statuses
+        # Set once every rule has been evaluated; until then a rule that is
+        # true with all conditions false (e.g. NOT ...) would never be raised.
+        self.primed = False
+
+
+class _Group:
+    """
+    Ordered comparisons of one field of one metric with the same operator,
+    sorted by threshold. For a given input the true atoms are a prefix
+    (> / >=) or a suffix (< / <=) of the sorted list, so one bisect finds
+    the boundary and only the atoms between the old and new boundary flip.
+    """
+
+    __slots__ = ("gid", "field", "prefix", "find", "thresholds", "ids")
+
+    def __init__(self, gid: int, field: str, op: str, atoms: List[Tuple[float, int]]):
+        atoms.sort()
+        self.gid = gid
+        self.field = field
+        self.prefix = op in (">", ">=")
+        self.find = bisect.bisect_left if op in (">", "<=") else bisect.bisect_right
+        self.thresholds = [t for t, _ in atoms]
+        self.ids = [i for _, i in atoms]
+
+    def boundary(self, x: Optional[float]) -> int:
+        if x is None:
+            return 0 if self.prefix else len(self.ids)
+        return self.find(self.thresholds, x)
+
+
+class RuleSet:
+    """
+    Parsed and compiled rules.
+
+    Conditions are deduplicated across rules and indexed by metric, and
+    every rule is compiled to a lambda over the condition truth list. Per
+    metric, ordered comparisons are compiled into threshold-sorted groups
+    (_Group); states and ==/!= are tested directly. A rule is re-evaluated
+    only when one of its conditions flipped (or a `for` duration elapsed),
+    so a tick costs a bisect per group plus the flips, not O(rules).
+    """
+
+    def __init__(self, text: str = ""):
+        self.text = text
+        self.rules: List[Rule] = []
+        atom_index: Dict[Atom, int] = {}
+
+        for lineno, line in enumerate(text.splitlines(), start=1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            m = _LINE.match(line)
+            if m is None:
+                raise RuleError(f"line {lineno}: expected 'name [SEVERITY]: expression'")
+            name, severity, expression = m.group(1), (m.group(2) or "ALERT").upper(), m.group(3)
+            if severity not in SEVERITIES:
+                raise RuleError(f"line {lineno}: severity must be WARN or ALERT")
+            try:
+                parser = _Parser(expression, atom_index)
+                source = parser.parse()
+            except RuleError as e:
+                raise RuleError(f"line {lineno}: {e}") from None
+            test = eval(compile(f"lambda a: bool({source})", f"<rule {name}>", "eval"), {"__builtins__": {}, "bool": bool})
+            self.rules.append(Rule(name, severity, expression, tuple(sorted(set(parser.used))), test))
+
+        self.atoms: List[Atom] = sorted(atom_index, key=atom_index.get)
+        self._tests = [atom.compile() for atom in self.atoms]
+        self._rules_of_atom: List[List[int]] = [[] for _ in self.atoms]
+        for r, rule in enumerate(self.rules):
+            for i in rule.atom_ids:
+                self._rules_of_atom[i].append(r)
+        self._by_name: Dict[str, Tuple[int, ...]] = {}
+        self._plans: Dict[str, Tuple[List[_Group], Tuple[int, ...]]] = {}
+        # (inactive, active) status per rule, shared by all states.
+        self._statuses = [(self._status(rule, False), self._status(rule, True)) for rule in self.rules]
+        self._next_gid = 0
+        self._forecast_by_name: Dict[str, bool] = {}
+
+    def __reduce__(self):
+        return RuleSet, (self.text,)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @classmethod
+    def load(cls, path: str) -> "RuleSet":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read())
+
+    def _atoms_for(self, name: str) -> Tuple[int, ...]:
+        ids = self._by_name.get(name)
+        if ids is None:
+            ids = self._by_name[name] = tuple(i for i, atom in enumerate(self.atoms) if atom.matches(name))
+        return ids
+
+    def _plan(self, name: str) -> Tuple[List[_Group], Tuple[int, ...]]:
+        """
+        (sorted comparison groups, directly tested atom ids) for one metric.
+        """
+        plan = self._plans.get(name)
+        if plan is None:
+            grouped: Dict[Tuple[str, str], List[Tuple[float, int]]] = {}
+            direct = []
+            for i in self._atoms_for(name):
+                atom = self.atoms[i]
+                if atom.field != "state" and atom.op in ("<", "<=", ">", ">="):
+                    grouped.setdefault((atom.field, atom.op), []).append((atom.threshold, i))
+                else:
+                    direct.append(i)
+            groups = []
+            for (field, op), atoms in grouped.items():
+                groups.append(_Group(self._next_gid, field, op, atoms))
+                self._next_gid += 1
+            plan = self._plans[name] = (groups, tuple(direct))
+        return plan
+
+    def needs_forecast(self, name: str) -> bool:
+        needed = self._forecast_by_name.get(name)
+        if needed is None:
+            needed = self._forecast_by_name[name] = any(
+                self.atoms[i].field == "forecast" for i in self._atoms_for(name)
+            )
+        return needed
+
+    def _status(self, rule: Rule, active: bool) -> MetricStatus:
+        return MetricStatus(
+            name=RULE_PREFIX + rule.name,
+            value=1.0 if active else 0.0,
+            unit="",
+            state=rule.severity if active else "OK",
+            z_score=None,
+            mean=None,
+            stdev=None,
+            samples=0,
+        )
+
+    def new_state(self) -> RuleState:
+        return RuleState(len(self.atoms), [inactive for inactive, _ in self._statuses])
+
+    def evaluate(self, state: RuleState, timestamp: float, statuses: Sequence[MetricStatus],
+                 forecasts: Optional[Dict[str, Optional[float]]] = None) -> List[MetricStatus]:
+        """
+        Feeds one tick's detector statuses (and forecast minutes for the
+        metrics where needs_forecast() is true) and returns one status per
+        rule: its severity while active, OK otherwise. The returned list is
+        owned by `state` and updated in place; `state.flipped` lists the
+        rules that changed in this call.
+        """
+        raw, held, since, due = state.raw, state.held, state.since, state.due
+        positions = state.positions
+        tests, atoms = self._tests, self.atoms
+        changed = []
+
+        def flip(i: int, value: bool):
+            raw[i] = value
+            if value:
+                since[i] = timestamp
+                if atoms[i].duration > 0:
+                    heapq.heappush(due, (timestamp + atoms[i].duration, i, timestamp))
+                    return
+            if held[i] != value:
+                held[i] = value
+                changed.append(i)
+
+        for status in statuses:
+            groups, direct = self._plan(status.name)
+            if not groups and not direct:
+                continue
+            forecast = forecasts.get(status.name) if forecasts else None
+
+            for group in groups:
+                field = group.field
+                x = status.value if field == "value" else status.z_score if field == "z" else forecast
+                new = group.boundary(x)
+                old = positions.get(group.gid)
+                if old is None:
+                    old = group.boundary(None)
+                if new == old:
+                    continue
+                positions[group.gid] = new
+                value = (new > old) == group.prefix
+                for i in group.ids[min(old, new):max(old, new)]:
+                    if raw[i] != value:
+                        flip(i, value)
+
+            for i in direct:
+                value = tests[i](status, forecast)
+                if value != raw[i]:
+                    flip(i, value)
+
+        while due and due[0][0] <= timestamp:
+            _, i, started = heapq.heappop(due)
+            if raw[i] and since[i] == started and not held[i]:
+                held[i] = True
+                changed.append(i)
+
+        state.flipped = flipped = []
+        if not state.primed:
+            state.primed = True
+            affected = range(len(self.rules))
+        else:
+            affected = set()
+            for i in changed:
+                affected.update(self._rules_of_atom[i])
+        for r in affected:
+            rule = self.rules[r]
+            active = rule.test(held)
+            if active != state.active[r]:
+                state.active[r] = active
+                state.statuses[r] = self._statuses[r][active]
+                flipped.append(r)
+        return state.statuses
@@ -0,0 +1,291 @@
+import errno
+import json
+import os
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import psutil
+
+from config import SHM_RING_NAME, SHM_RING_CAPACITY, SHM_RING_MAX_METRICS
+
+# Header slots (uint64). SEQ is a seqlock counter: odd while a write is in progress.
+# PID is the process id of the writer, so a new writer can tell a live ring
+# from one left behind by a crash.
+_MAGIC = 0x534D52494E470002  # "SMRING" + layout version 2
+H_MAGIC, H_CAPACITY, H_MAX_METRICS, H_SEQ, H_WRITTEN, H_NAMES_VERSION, H_NAMES_LEN, H_PID = range(8)
+_HEADER_SLOTS = 8
+_HEADER_BYTES = _HEADER_SLOTS * 8
+_NAMES_BYTES = 64 * 1024
+
+# Segments created by this process; attaching to them must not touch their tracker entry.
+_CREATED = set()
+
+
+def _data_offset() -> int:
+    return _HEADER_BYTES + _NAMES_BYTES
+
+
+def _size(capacity: int, max_metrics: int) -> int:
+    # Every sample is written twice (slot and slot + capacity), so the latest
+    # N rows are always one contiguous slice and can be handed out as a view.
+    return _data_offset() + 2 * capacity * (max_metrics + 1) * 8
+
+
+def _untrack(shm: shared_memory.SharedMemory):
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(shm._name, "shared_memory")
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached segments with the resource tracker,
+        # which would unlink them when a reader exits.
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _CREATED:
+            _untrack(shm)
+        return shm
+
+
+def _owner(shm: shared_memory.SharedMemory) -> Optional[int]:
+    """
+    Process id of the writer of an existing segment, or None if it is not a
+    ring of this layout.
+    """
+    if shm.size < _HEADER_BYTES:
+        return None
+    header = np.ndarray((_HEADER_SLOTS,), dtype=np.uint64, buffer=shm.buf, offset=0)
+    if int(header[H_MAGIC]) != _MAGIC:
+        return None
+    pid = int(header[H_PID])
+    del header
+    return pid
+
+
+class _RingLayout:
+    def __init__(self, shm: shared_memory.SharedMemory, capacity: int, max_metrics: int):
+        self.shm = shm
+        self.capacity = capacity
+        self.max_metrics = max_metrics
+        self.header = np.ndarray((_HEADER_SLOTS,), dtype=np.uint64, buffer=shm.buf, offset=0)
+        self.rows = np.ndarray(
+            (2 * capacity, max_metrics + 1),
+            dtype=np.float64,
+            buffer=shm.buf,
+            offset=_data_offset(),
+        )
+
+    def read_names(self) -> List[Tuple[str, str]]:
+        n = int(self.header[H_NAMES_LEN])
+        raw = bytes(self.shm.buf[_HEADER_BYTES:_HEADER_BYTES + n])
+        return [tuple(e) for e in json.loads(raw.decode("utf-8"))] if n else []
+
+
+class ShmRingWriter:
+    """
+    Single-writer ring buffer of samples in shared memory.
+
+    Column 0 holds the timestamp, column i + 1 the metric with index i in the
+    name table. Metrics missing from a tick are stored as NaN. Works as a
+    publisher, so it can be attached to the GUI or the headless loop.
+
+    A segment of the same name is only replaced if its writer process is
+    gone; otherwise FileExistsError is raised and the live ring is left alone.
+    """
+
+    def __init__(self, name: str = SHM_RING_NAME, capacity: int = SHM_RING_CAPACITY,
+                 max_metrics: int = SHM_RING_MAX_METRICS):
+        size = _size(capacity, max_metrics)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            if name in _CREATED:
+                raise FileExistsError(errno.EEXIST, f"sample ring is in use by process {os.getpid()}", name) from None
+            # Attached tracked, so that unlink() below stays balanced.
+            existing = shared_memory.SharedMemory(name=name)
+            pid = _owner(existing)
+            existing.close()
+            if pid is None or psutil.pid_exists(pid):
+                _untrack(existing)
+                if pid is None:
+                    raise FileExistsError(errno.EEXIST, "shared memory segment exists and is not a sample ring", name) from None
+                raise FileExistsError(errno.EEXIST, f"sample ring is in use by process {pid}", name) from None
+            existing.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.name = name
+        _CREATED.add(name)
+        self.layout = _RingLayout(self.shm, capacity, max_metrics)
+        header = self.layout.header
+        header[:] = 0
+        header[H_CAPACITY] = capacity
+        header[H_MAX_METRICS] = max_metrics
+        header[H_PID] = os.getpid()
+        header[H_MAGIC] = _MAGIC
+
+        self.names: List[Tuple[str, str]] = []
+        self._index: Dict[str, int] = {}
+        self._row = np.full(max_metrics + 1, np.nan)
+
+    def _register(self, name: str, unit: str) -> Optional[int]:
+        if len(self.names) >= self.layout.max_metrics:
+            return None
+        encoded = json.dumps(self.names + [(name, unit)]).encode("utf-8")
+        if len(encoded) > _NAMES_BYTES:
+            return None
+
+        idx = len(self.names)
+        self.names.append((name, unit))
+        self._index[name] = idx
+        self.shm.buf[_HEADER_BYTES:_HEADER_BYTES + len(encoded)] = encoded
+        header = self.layout.header
+        header[H_NAMES_LEN] = len(encoded)
+        header[H_NAMES_VERSION] += 1
+        return idx
+
+    def publish(self, timestamp: float, raw_metrics, statuses=None):
+        layout = self.layout
+        header = layout.header
+        header[H_SEQ] += 1
+
+        row = self._row
+        row.fill(np.nan)
+        row[0] = timestamp
+        index = self._index
+        for name, (value, unit) in raw_metrics.items():
+            idx = index.get(name)
+            if idx is None:
+                idx = self._register(name, unit)
+                if idx is None:
+                    continue
+            row[idx + 1] = value
+
+        written = int(header[H_WRITTEN])
+        slot = written % layout.capacity
+        layout.rows[slot] = row
+        layout.rows[slot + layout.capacity] = row
+        header[H_WRITTEN] = written + 1
+        header[H_SEQ] += 1
+
+    def close(self):
+        self.layout = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        _CREATED.discard(self.name)
+
+    def stop(self):
+        self.close()
+
+
+class SampleWindow:
+    """
+    Zero-copy window over the latest samples. `timestamps` and `values` are
+    views into shared memory; they stay valid until the writer has gone
+    round the ring, which `ShmRingReader.is_valid(window)` reports.
+    """
+
+    __slots__ = ("timestamps", "values", "names", "end")
+
+    def __init__(self, timestamps: np.ndarray, values: np.ndarray, names: List[Tuple[str, str]], end: int):
+        self.timestamps = timestamps
+        self.values = values
+        self.names = names
+        self.end = end
+
+    def column(self, name: str) -> Optional[np.ndarray]:
+        for i, (n, _) in enumerate(self.names):
+            if n == name:
+                return self.values[:, i]
+        return None
+
+
+class ShmRingReader:
+    """
+    Attaches to a ring created by ShmRingWriter from any local process.
+    """
+
+    def __init__(self, name: str = SHM_RING_NAME):
+        self.shm = _attach(name)
+        header = np.ndarray((_HEADER_SLOTS,), dtype=np.uint64, buffer=self.shm.buf, offset=0)
+        if int(header[H_MAGIC]) != _MAGIC:
+            self.shm.close()
+            raise ValueError(f"shared memory segment '{name}' is not a sample ring")
+        self.layout = _RingLayout(self.shm, int(header[H_CAPACITY]), int(header[H_MAX_METRICS]))
+        self._names: List[Tuple[str, str]] = []
+        self._names_version = -1
+
+    @property
+    def written(self) -> int:
+        return int(self.layout.header[H_WRITTEN])
+
+    @property
+    def names(self) -> List[Tuple[str, str]]:
+        return self.latest(0).names
+
+    def latest(self, n: int) -> SampleWindow:
+        layout = self.layout
+        header = layout.header
+        n = min(n, layout.capacity - 1)
+
+        while True:
+            seq = int(header[H_SEQ])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            written = int(header[H_WRITTEN])
+            version = int(header[H_NAMES_VERSION])
+            names = self._names
+            if version != self._names_version:
+                try:
+                    names = layout.read_names()
+                except ValueError:
+                    continue
+            if int(header[H_SEQ]) == seq:
+                break
+
+        self._names = names
+        self._names_version = version
+
+        n = min(n, written)
+        end = written % layout.capacity + layout.capacity
+        rows = layout.rows[end - n:end]
+        return SampleWindow(rows[:, 0], rows[:, 1:len(names) + 1], names, written)
+
+    def is_valid(self, window: SampleWindow) -> bool:
+        # Rows of `window` are overwritten once the writer wraps onto them.
+        return self.written - window.end < self.layout.capacity - len(window.timestamps)
+
+    def close(self):
+        self.layout = None
+        self.shm.close()
+
+
+class ShmRingSource:
+    """
+    Drop-in replacement for SystemMonitorBackend that reads from the ring,
+    so the UI process can leave sampling to a separate collector process.
+    collect() returns an empty dict while no new sample has arrived.
+    """
+
+    def __init__(self, name: str = SHM_RING_NAME):
+        self.reader = ShmRingReader(name)
+        self._seen = self.reader.written
+
+    def collect(self) -> Dict[str, Tuple[float, str]]:
+        window = self.reader.latest(1)
+        if window.end == self._seen or not len(window.timestamps):
+            return {}
+        self._seen = window.end
+
+        row = window.values[0].copy()
+        return {
+            name: (float(v), unit)
+            for (name, unit), v in zip(window.names, row)
+            if v == v
+        }
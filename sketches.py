@@ -0,0 +1,245 @@
+import math
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from config import (
+    SKETCH_RELATIVE_ACCURACY,
+    SKETCH_MAX_BINS,
+    SKETCH_HOURS_KEPT,
+    SKETCH_DAYS_KEPT,
+)
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch style).
+
+    Values are mapped to logarithmic bins, so every quantile is accurate to
+    `relative_accuracy` of its true value. Insert is O(1); memory is bounded by
+    `max_bins` per sign, collapsing the lowest bins when the limit is hit.
+    NaN and infinite values have no bin and are skipped.
+    """
+
+    __slots__ = ("relative_accuracy", "max_bins", "_gamma_ln", "pos", "neg", "floors", "zero", "count", "min", "max")
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY, max_bins: int = SKETCH_MAX_BINS):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._gamma_ln = math.log(gamma)
+        self.pos: Dict[int, int] = {}
+        self.neg: Dict[int, int] = {}
+        # Lowest key each store may hold after a collapse; smaller keys map onto it.
+        self.floors = {"pos": None, "neg": None}
+        self.zero = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, x: float) -> int:
+        return math.ceil(math.log(x) / self._gamma_ln)
+
+    def _value(self, key: int) -> float:
+        # Midpoint of the bin (gamma^(k-1), gamma^k] in relative terms.
+        return 2.0 * math.exp(key * self._gamma_ln) / (1.0 + math.exp(self._gamma_ln))
+
+    def add(self, x: float, weight: int = 1):
+        if not math.isfinite(x):
+            return
+        if x > 0:
+            side = "pos"
+            key = self._key(x)
+        elif x < 0:
+            side = "neg"
+            key = self._key(-x)
+        else:
+            self.zero += weight
+            side = None
+
+        if side is not None:
+            self._insert(side, key, weight)
+
+        self.count += weight
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def add_many(self, values):
+        """
+        Bulk insert of a NumPy array; bins are computed vectorized and
+        counted with np.unique, so the Python loop runs per bin, not per value.
+        """
+        x = np.asarray(values, dtype=np.float64)
+        x = x[np.isfinite(x)]
+        if not len(x):
+            return
+
+        for side, part in (("pos", x[x > 0]), ("neg", -x[x < 0])):
+            if len(part):
+                keys = np.ceil(np.log(part) / self._gamma_ln).astype(np.int64)
+                uniq, counts = np.unique(keys, return_counts=True)
+                for key, n in zip(uniq.tolist(), counts.tolist()):
+                    self._insert(side, key, n)
+
+        self.zero += int(np.count_nonzero(x == 0))
+        self.count += len(x)
+        self.min = min(self.min, float(x.min()))
+        self.max = max(self.max, float(x.max()))
+
+    def _insert(self, side: str, key: int, weight: int):
+        store = self.pos if side == "pos" else self.neg
+        floor = self.floors[side]
+        if floor is not None and key < floor:
+            key = floor
+        store[key] = store.get(key, 0) + weight
+        if len(store) > self.max_bins:
+            self._collapse(side)
+
+    def _collapse(self, side: str):
+        # Fold the lowest-magnitude bins into one, leaving headroom so the
+        # sort is paid once per many inserts rather than on every insert.
+        store = self.pos if side == "pos" else self.neg
+        keys = sorted(store)
+        target = int(self.max_bins * 0.9)
+        fold = keys[: len(keys) - target + 1]
+        total = sum(store.pop(k) for k in fold)
+        store[fold[-1]] = total
+        self.floors[side] = fold[-1]
+
+    def merge(self, other: "DDSketch"):
+        if abs(other._gamma_ln - self._gamma_ln) > 1e-12:
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        for side in ("pos", "neg"):
+            theirs = other.floors[side]
+            ours = self.floors[side]
+            if theirs is not None and (ours is None or theirs > ours):
+                self._raise_floor(side, theirs)
+            for key, n in (other.pos if side == "pos" else other.neg).items():
+                self._insert(side, key, n)
+        self.zero += other.zero
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _raise_floor(self, side: str, floor: int):
+        store = self.pos if side == "pos" else self.neg
+        below = [k for k in store if k < floor]
+        if below:
+            store[floor] = store.get(floor, 0) + sum(store.pop(k) for k in below)
+        self.floors[side] = floor
+
+    def copy(self) -> "DDSketch":
+        dup = DDSketch(self.relative_accuracy, self.max_bins)
+        dup.pos = dict(self.pos)
+        dup.neg = dict(self.neg)
+        dup.floors = dict(self.floors)
+        dup.zero = self.zero
+        dup.count = self.count
+        dup.min = self.min
+        dup.max = self.max
+        return dup
+
+    def quantiles(self, qs: Sequence[float]) -> Optional[Dict[float, float]]:
+        """
+        Returns {q: value} for every q in 0..1, or None for an empty sketch.
+        All requested quantiles are answered in a single pass over the bins.
+        """
+        if self.count == 0:
+            return None
+
+        order = sorted(qs)
+        ranks = [q * (self.count - 1) for q in order]
+        result: Dict[float, float] = {}
+        i = 0
+        seen = 0
+
+        def walk(bins: Iterable, value_of):
+            nonlocal i, seen
+            for key, n in bins:
+                seen += n
+                while i < len(order) and ranks[i] < seen:
+                    result[order[i]] = min(max(value_of(key), self.min), self.max)
+                    i += 1
+                if i == len(order):
+                    return
+
+        walk(sorted(self.neg.items(), reverse=True), lambda k: -self._value(k))
+        walk([(None, self.zero)] if self.zero else [], lambda k: 0.0)
+        walk(sorted(self.pos.items()), self._value)
+        while i < len(order):
+            result[order[i]] = self.max
+            i += 1
+        return result
+
+    @classmethod
+    def merged(cls, sketches: Iterable["DDSketch"]) -> Optional["DDSketch"]:
+        out = None
+        for sk in sketches:
+            if out is None:
+                out = sk.copy()
+            else:
+                out.merge(sk)
+        return out
+
+
+class SketchRollup:
+    """
+    Per-metric long-horizon baseline made of mergeable sketches.
+
+    Samples go into the current hour; closed hours are kept for a day and
+    closed days for a week. Daily and weekly views are built by merging,
+    never by re-reading raw samples.
+    """
+
+    def __init__(self, hours_kept: int = SKETCH_HOURS_KEPT, days_kept: int = SKETCH_DAYS_KEPT):
+        self.current = DDSketch()
+        self.hours: deque = deque(maxlen=hours_kept)
+        self.days: deque = deque(maxlen=days_kept)
+        self._hour: Optional[int] = None
+        self._day: Optional[int] = None
+        self._baseline: Optional[DDSketch] = None
+
+    def add(self, value: float, wall_time: Optional[float] = None):
+        if wall_time is None:
+            wall_time = time.time()
+        hour = int(wall_time // 3600)
+        if hour != self._hour:
+            self._roll(hour, wall_time)
+        self.current.add(value)
+
+    def _roll(self, hour: int, wall_time: float):
+        day = int(wall_time // 86400)
+        if self._hour is not None and self.current.count:
+            self.hours.append(self.current)
+            self.current = DDSketch()
+        if self._day is not None and day != self._day:
+            closed = DDSketch.merged(self.hours)
+            if closed is not None:
+                self.days.append(closed)
+            self.hours.clear()
+        self._hour = hour
+        self._day = day
+        self._baseline = DDSketch.merged(list(self.days) + list(self.hours))
+
+    def daily(self) -> Optional[DDSketch]:
+        return DDSketch.merged(list(self.hours) + [self.current])
+
+    def weekly(self) -> Optional[DDSketch]:
+        """
+        Every closed day and hour plus the current hour. The closed part is
+        cached at each hour rollover, so this costs a single merge.
+        """
+        if self._baseline is None:
+            return self.current.copy()
+        out = self._baseline.copy()
+        out.merge(self.current)
+        return out
+
+    @property
+    def count(self) -> int:
+        base = self._baseline.count if self._baseline is not None else 0
+        return base + self.current.count
@@ -0,0 +1,129 @@
+"""
+Startup benchmark.
+
+Usage:
+    python startup_bench.py --runs 5 --imports 15
+
+Starts the dashboard in fresh interpreters and reports per run how long the
+imports (Qt and ui_main) took, how long the window took to construct and the
+time from launching the interpreter to the first painted frame, plus the
+medians. With --imports N the N modules with the highest own import time
+(from `python -X importtime`) are listed as well.
+
+Set QT_QPA_PLATFORM=offscreen to run it without a display.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PHASES = ("imports", "window", "first_frame")
+
+
+def _child():
+    """
+    One cold start, run in its own interpreter. Prints one JSON line.
+    """
+    started = time.perf_counter()
+    from PySide6.QtCore import QEvent, QObject, QTimer
+    from PySide6.QtWidgets import QApplication
+    import ui_main
+    imported = time.perf_counter()
+
+    app = QApplication(sys.argv[:1])
+    window = ui_main.SystemMonitorUI()
+    built = time.perf_counter()
+
+    def done():
+        print(json.dumps({
+            "imports": imported - started,
+            "window": built - imported,
+            "painted_at": time.time(),
+        }), flush=True)
+        os._exit(0)
+
+    class FirstPaint(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint:
+                obj.removeEventFilter(self)
+                # Fires once the frame has been painted and flushed.
+                QTimer.singleShot(0, done)
+            return False
+
+    first_paint = FirstPaint()
+    window.installEventFilter(first_paint)
+    window.show()
+    app.exec()
+
+
+def measure_run(timeout: float) -> Dict[str, float]:
+    launched = time.time()
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        cwd=HERE, capture_output=True, text=True, timeout=timeout, check=True,
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["first_frame"] = result.pop("painted_at") - launched
+    return result
+
+
+def slowest_imports(n: int) -> List[Tuple[str, float, float]]:
+    """
+    (module, own ms, cumulative ms) of the `n` modules with the highest own
+    import time.
+    """
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import PySide6.QtWidgets, ui_main"],
+        cwd=HERE, capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        rows.append((fields[2].strip(), int(fields[0]) / 1000, int(fields[1]) / 1000))
+    rows.sort(key=lambda r: r[1], reverse=True)
+    return rows[:n]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="startup_bench.py", description="Startup benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--imports", type=int, default=15, help="list the N slowest imports (0: none)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per run")
+    parser.add_argument("--json", action="store_true", help="print all results as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child()
+        return
+
+    runs = [measure_run(args.timeout) for _ in range(args.runs)]
+    medians = {phase: statistics.median(r[phase] for r in runs) for phase in PHASES}
+    imports = slowest_imports(args.imports) if args.imports > 0 else []
+
+    if args.json:
+        json.dump({"runs": runs, "median": medians, "imports": imports}, sys.stdout, indent=2)
+        print()
+        return
+
+    for i, r in enumerate(runs, start=1):
+        print(f"run {i}: " + ", ".join(f"{phase} {r[phase] * 1000:.0f} ms" for phase in PHASES))
+    print("median: " + ", ".join(f"{phase} {medians[phase] * 1000:.0f} ms" for phase in PHASES))
+    if imports:
+        print(f"\n{'module':<48} {'own ms':>8} {'cum. ms':>8}")
+        for name, own, cumulative in imports:
+            print(f"{name:<48} {own:>8.1f} {cumulative:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import asyncio
+import errno
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+from collections import deque
+from fnmatch import fnmatchcase
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import STREAM_SOCKET_PATH, STREAM_TCP_HOST, STREAM_TCP_PORT, STREAM_CLIENT_BUFFER
+from monitoring import MetricStatus
+
+_dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+# (timestamp, {name: value}, {name: state}); built once per tick and shared by all clients.
+Snapshot = Tuple[float, Dict[str, float], Dict[str, str]]
+
+
+class _Client:
+    """
+    Per-connection state. Pending snapshots live in a bounded deque that drops
+    the oldest entry when full. Deltas are computed when a frame is actually
+    written, against what this client last received, so dropping snapshots
+    never leaves the client with a wrong view.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, buffer_size: int):
+        self.writer = writer
+        self.patterns: List[str] = []
+        self.pending: deque = deque(maxlen=buffer_size)
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+        self.seq = 0
+        self.ids: Dict[str, int] = {}
+        self.matches: Dict[str, bool] = {}
+        self.last_values: Dict[str, float] = {}
+        self.last_states: Dict[str, str] = {}
+
+    def subscribe(self, patterns: Sequence[str]):
+        self.patterns = [str(p) for p in patterns]
+        self.matches.clear()
+        self.last_values.clear()
+        self.last_states.clear()
+
+    def wants(self, name: str) -> bool:
+        hit = self.matches.get(name)
+        if hit is None:
+            hit = self.matches[name] = any(fnmatchcase(name, p) for p in self.patterns)
+        return hit
+
+    def offer(self, snapshot: Snapshot):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(snapshot)
+        self.wakeup.set()
+
+    def frame(self, snapshot: Snapshot) -> bytes:
+        ts, values, states = snapshot
+        new_names = {}
+        changed_values = []
+        changed_states = []
+
+        for name, value in values.items():
+            if not self.wants(name):
+                continue
+            mid = self.ids.get(name)
+            if mid is None:
+                mid = self.ids[name] = len(self.ids)
+                new_names[mid] = name
+            if self.last_values.get(name) != value:
+                self.last_values[name] = value
+                changed_values.append([mid, value])
+            state = states.get(name)
+            if state is not None and self.last_states.get(name) != state:
+                self.last_states[name] = state
+                changed_states.append([mid, state])
+
+        self.seq += 1
+        frame = {"seq": self.seq, "t": ts}
+        if new_names:
+            frame["n"] = new_names
+        if changed_values:
+            frame["v"] = changed_values
+        if changed_states:
+            frame["s"] = changed_states
+        if self.dropped:
+            frame["dropped"] = self.dropped
+            self.dropped = 0
+        return _dumps(frame).encode("utf-8") + b"\n"
+
+
+class SubscriptionServer:
+    """
+    Local live feed for other tools (tray widgets, dashboards).
+
+    Clients connect to a Unix socket (TCP on localhost where Unix sockets are
+    unavailable) and send {"subscribe": ["CPU*", "Net*"]}. They then receive
+    newline-delimited JSON frames holding only changed values and state
+    transitions. Metric names are sent once and referenced by id afterwards.
+
+    The asyncio loop runs in its own thread; publish() only hands the tick
+    over with call_soon_threadsafe.
+
+    The socket is created with mode 0600, so only the owner can read the
+    feed. A socket left behind by a crashed instance is replaced; start()
+    raises OSError if another instance still serves the path or the path is
+    not a socket.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = STREAM_SOCKET_PATH,
+        host: str = STREAM_TCP_HOST,
+        port: int = STREAM_TCP_PORT,
+        buffer_size: int = STREAM_CLIENT_BUFFER,
+    ):
+        self.path = path if path and hasattr(asyncio, "start_unix_server") and sys.platform != "win32" else None
+        self.host = host
+        self.port = port
+        self.buffer_size = buffer_size
+        self.clients: List[_Client] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._error: Optional[OSError] = None
+        self._inode: Optional[Tuple[int, int]] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="stream-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            self._thread = None
+            self._ready.clear()
+            raise self._error
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._start_server())
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            loop.close()
+            return
+        self._loop = loop
+        self._ready.set()
+        loop.run_forever()
+        loop.close()
+
+    def _remove_stale_socket(self):
+        """
+        Unlinks self.path only if it is a socket nobody is listening on.
+        """
+        try:
+            mode = os.lstat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise OSError(errno.EEXIST, "exists and is not a socket", self.path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                pass
+            else:
+                raise OSError(errno.EADDRINUSE, "another instance is serving this socket", self.path)
+        os.unlink(self.path)
+
+    async def _start_server(self):
+        if self.path is not None:
+            self._remove_stale_socket()
+            # The umask covers the window between bind() and chmod(); it is
+            # process-wide, so it is only held for the bind itself.
+            umask = os.umask(0o177)
+            try:
+                self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+            finally:
+                os.umask(umask)
+            os.chmod(self.path, 0o600)
+            st = os.stat(self.path)
+            self._inode = (st.st_dev, st.st_ino)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        loop = self._loop
+        if loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for client in list(self.clients):
+                client.writer.close()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._server.wait_closed()
+            loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), loop)
+        self._thread.join(timeout=5)
+        self._unlink_own_socket()
+        self._loop = None
+        self._thread = None
+        self._ready.clear()
+
+    def _unlink_own_socket(self):
+        # Leave the path alone if another instance has taken it over since.
+        if self._inode is None:
+            return
+        try:
+            st = os.lstat(self.path)
+            if (st.st_dev, st.st_ino) == self._inode:
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._inode = None
+
+    def publish(self, timestamp: float, raw_metrics, statuses: List[MetricStatus]):
+        if self._loop is None or not self.clients:
+            return
+        values = {name: value for name, (value, _) in raw_metrics.items()}
+        states = {s.name: s.state for s in statuses}
+        for s in statuses:
+            values.setdefault(s.name, s.value)
+        self._loop.call_soon_threadsafe(self._broadcast, (timestamp, values, states))
+
+    def _broadcast(self, snapshot: Snapshot):
+        for client in self.clients:
+            if client.patterns:
+                client.offer(snapshot)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = _Client(writer, self.buffer_size)
+        self.clients.append(client)
+        sender = asyncio.ensure_future(self._send_loop(client))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(request, dict) and isinstance(request.get("subscribe"), list):
+                    client.subscribe(request["subscribe"])
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except ValueError:
+            # readline() gives up on a request longer than the stream limit;
+            # such a client is disconnected.
+            pass
+        finally:
+            sender.cancel()
+            self.clients.remove(client)
+            writer.close()
+
+    async def _send_loop(self, client: _Client):
+        try:
+            while True:
+                await client.wakeup.wait()
+                client.wakeup.clear()
+                while client.pending:
+                    frame = client.frame(client.pending.popleft())
+                    client.writer.write(frame)
+                    await client.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+
+class StreamClient:
+    """
+    Minimal consumer for the subscription feed. Keeps the decoded full view
+    of every subscribed metric in `values` and `states`.
+    """
+
+    def __init__(self, patterns: Sequence[str], path: Optional[str] = STREAM_SOCKET_PATH,
+                 host: str = STREAM_TCP_HOST, port: int = STREAM_TCP_PORT):
+        self.patterns = list(patterns)
+        self.path = path
+        self.host = host
+        self.port = port
+        self.names: Dict[int, str] = {}
+        self.values: Dict[str, float] = {}
+        self.states: Dict[str, str] = {}
+        self.dropped = 0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self):
+        if self.path is not None and sys.platform != "win32":
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write(_dumps({"subscribe": self.patterns}).encode("utf-8") + b"\n")
+        await self._writer.drain()
+
+    async def next_frame(self) -> dict:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("stream closed")
+        frame = json.loads(line)
+        for mid, name in frame.get("n", {}).items():
+            self.names[int(mid)] = name
+        for mid, value in frame.get("v", ()):
+            self.values[self.names[mid]] = value
+        for mid, state in frame.get("s", ()):
+            self.states[self.names[mid]] = state
+        self.dropped += frame.get("dropped", 0)
+        return frame
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+from capture import (
+    CaptureRecorder,
+    INDEX_SUFFIX,
+    detect_format,
+    iter_binary,
+    iter_json_array,
+    open_mmap,
+    read_index,
+    scan_sync_points,
+    sync_points,
+)
+
+
+def _metrics(i):
+    return {"CPU (%)": (float(i), "%"), "RAM (%)": (50.0 + i, "%")}
+
+
+def _record(path, n, sync_every=4):
+    recorder = CaptureRecorder(str(path), hostname="host-a", sync_every=sync_every)
+    for i in range(n):
+        recorder.publish(1000.0 + i, _metrics(i))
+    return recorder
+
+
+def test_binary_round_trip(tmp_path):
+    path = tmp_path / "run.smcap"
+    _record(path, 10).stop()
+
+    mm = open_mmap(str(path))
+    assert detect_format(mm) == "binary"
+    samples = list(iter_binary(mm))
+    assert [ts for _, ts, _ in samples] == [1000.0 + i for i in range(10)]
+    assert all(host == "host-a" for host, _, _ in samples)
+    assert samples[3][2] == _metrics(3)
+    assert [off for _, off in read_index(str(path))] == [off for _, off in scan_sync_points(mm)]
+
+
+@pytest.mark.parametrize("cut", [1, 5, 11, 20])
+def test_truncated_last_frame_is_skipped(tmp_path, cut):
+    path = tmp_path / "run.smcap"
+    _record(path, 10).stop()
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - cut)
+
+    mm = open_mmap(str(path))
+    samples = list(iter_binary(mm))
+    assert [ts for _, ts, _ in samples] == [1000.0 + i for i in range(9)]
+    assert all(off < len(mm) for _, off in scan_sync_points(mm))
+
+
+def test_index_never_points_past_written_data(tmp_path):
+    path = tmp_path / "live.smcap"
+    recorder = _record(path, 9, sync_every=2)
+    # Nothing flushed yet since the last sync point; the index must still
+    # only name offsets that are already in the data file.
+    size = os.path.getsize(path)
+    index = read_index(str(path))
+    assert len(index) == 5
+    assert all(off <= size for _, off in index)
+
+    mm = open_mmap(str(path))
+    for ts, off in sync_points(str(path), mm):
+        first = next(iter_binary(mm, off), None)
+        assert first is None or first[1] == ts
+    recorder.stop()
+
+
+def test_json_array_keeps_multibyte_characters_across_chunks(tmp_path):
+    records = [{"timestamp": i, "metric": "Temperatur °C ✓ 温度", "status": "OK"} for i in range(50)]
+    path = tmp_path / "events.json"
+    path.write_bytes(json.dumps(records, ensure_ascii=False).encode("utf-8"))
+
+    mm = open_mmap(str(path))
+    assert detect_format(mm) == "json"
+    for chunk_bytes in (1, 2, 3, 7, 64):
+        assert list(iter_json_array(mm, chunk_bytes=chunk_bytes)) == records
+
+
+def test_index_sidecar_is_created(tmp_path):
+    path = tmp_path / "run.smcap"
+    _record(path, 1).stop()
+    assert os.path.exists(str(path) + INDEX_SUFFIX)
@@ -0,0 +1,66 @@
+import pytest
+
+from diskstats import DiskCollector, parse_diskstats, parse_mountinfo
+
+
+def _line(name, reads, read_sectors, read_ms, writes, write_sectors, write_ms, major=259, minor=0):
+    return (f" {major} {minor} {name} {reads} 0 {read_sectors} {read_ms} "
+            f"{writes} 0 {write_sectors} {write_ms} 0 0 0 0 0 0 0 0 0")
+
+
+@pytest.fixture
+def fake_proc(tmp_path):
+    proc = tmp_path / "proc"
+    (proc / "self").mkdir(parents=True)
+    block = tmp_path / "block"
+    (block / "nvme0n1").mkdir(parents=True)
+    (block / "loop0").mkdir()
+    (proc / "filesystems").write_text("nodev\tproc\n\text4\n")
+    (proc / "self" / "mountinfo").write_text("30 1 0:22 / /proc rw - proc proc rw\n")
+
+    def write(*lines):
+        (proc / "diskstats").write_text("\n".join(lines) + "\n")
+
+    write(_line("nvme0n1", 100, 800, 50, 10, 80, 20), _line("nvme0n1p1", 90, 720, 40, 9, 72, 18, minor=1),
+          _line("loop0", 5, 40, 1, 0, 0, 0, major=7))
+    return str(proc), str(block), write
+
+
+def test_parse_diskstats_counts_bytes():
+    counters = parse_diskstats(_line("sda", 3, 16, 7, 2, 8, 5).encode())
+    assert counters == {"sda": (3, 16 * 512, 7, 2, 8 * 512, 5)}
+
+
+def test_parse_mountinfo_collapses_bind_mounts():
+    data = (b"28 1 254:0 / / rw - ext4 /dev/vda rw\n"
+            b"29 28 254:1 / /home\\040dir rw - xfs /dev/vdb rw\n"
+            b"31 28 254:0 /var/x /srv/bind rw shared:1 - ext4 /dev/vda rw\n"
+            b"30 28 0:22 / /proc rw - proc proc rw\n")
+    assert parse_mountinfo(data, {"ext4", "xfs"}) == [("/", "ext4"), ("/home dir", "xfs")]
+
+
+def test_rates_and_latency_of_whole_devices(fake_proc):
+    proc, block, write = fake_proc
+    collector = DiskCollector(proc=proc, sys_block=block)
+    start = collector._last_time
+    write(_line("nvme0n1", 110, 880, 80, 20, 160, 40), _line("loop0", 9, 72, 2, 0, 0, 0, major=7))
+
+    metrics = collector.collect(start + 2.0)
+    assert metrics["IO nvme0n1 Read (kB/s)"] == (80 * 512 / 1024 / 2.0, "kB/s")
+    assert metrics["IO nvme0n1 Ops (ops/s)"] == (10.0, "ops/s")
+    assert metrics["IO nvme0n1 Latency (ms)"] == ((30 + 20) / 20, "ms")
+    assert not [name for name in metrics if "loop0" in name or "p1" in name]
+
+
+def test_latency_is_left_out_of_idle_ticks(fake_proc):
+    proc, block, write = fake_proc
+    collector = DiskCollector(proc=proc, sys_block=block)
+    start = collector._last_time
+
+    metrics = collector.collect(start + 1.0)
+    assert metrics["IO nvme0n1 Ops (ops/s)"] == (0.0, "ops/s")
+    assert "IO nvme0n1 Latency (ms)" not in metrics
+
+    write(_line("nvme0n1", 104, 832, 58, 10, 80, 20))
+    metrics = collector.collect(start + 2.0)
+    assert metrics["IO nvme0n1 Latency (ms)"] == (2.0, "ms")
@@ -0,0 +1,110 @@
+import csv
+import gzip
+import json
+import os
+
+import pytest
+
+from capture import normalize
+from export import ExportJob, format_for_path
+from timeseries import EventHistory, HistoryStore
+
+EVENTS = 100_000
+SAMPLES = 20_000
+STATES = ("OK", "WARN", "ALERT")
+
+
+@pytest.fixture(scope="module")
+def sources():
+    events = EventHistory(chunk_size=4096)
+    for i in range(EVENTS):
+        events.append(1000.0 + i * 0.01, f"Metric {i % 7}", STATES[i % 3], float(i))
+    history = HistoryStore(block_size=1024, retention_s=None)
+    for i in range(SAMPLES):
+        history.append_snapshot(1000.0 + i, {"CPU (%)": (i / 100.0, "%"), "Net, \"eth0\" (kB/s)": (float(i % 50), "kB/s")})
+    return events.snapshot(), history.snapshot()
+
+
+def _read_rows(path, fmt, compressed):
+    opener = gzip.open if compressed else open
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            return list(csv.reader(f))
+        if fmt == "json":
+            return json.load(f)
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("name", ["out.ndjson", "out.csv", "out.json", "out.jsonl.gz"])
+def test_large_export_is_complete(tmp_path, sources, name):
+    events, history = sources
+    path = str(tmp_path / name)
+    fmt, compressed = format_for_path(path)
+    job = ExportJob(path, events, history)
+    job.start()
+    job.join(60)
+
+    assert job.done and job.error is None
+    assert job.written == job.total == EVENTS + 2 * SAMPLES
+    assert os.listdir(tmp_path) == [name]
+
+    rows = _read_rows(path, fmt, compressed)
+    if fmt == "csv":
+        assert rows[0] == ["kind", "timestamp", "metric", "value", "unit", "status"]
+        rows = rows[1:]
+        assert len(rows) == job.total
+        assert rows[0] == ["event", "1000.000", "Metric 0", "0.0", "", "OK"]
+        assert rows[-1] == ["sample", f"{1000.0 + SAMPLES - 1:.3f}", "Net, \"eth0\" (kB/s)",
+                            str(float((SAMPLES - 1) % 50)), "kB/s", ""]
+        return
+
+    assert len(rows) == job.total
+    records = [normalize(r) for r in rows]
+    assert records[EVENTS - 1] == ("event", "", pytest.approx(1000.0 + (EVENTS - 1) * 0.01),
+                                   f"Metric {(EVENTS - 1) % 7}", "OK", float(EVENTS - 1))
+    samples = records[EVENTS:]
+    assert all(r[0] == "sample" for r in samples)
+    assert samples[SAMPLES - 1][3] == {"CPU (%)": ((SAMPLES - 1) / 100.0, "%")}
+    assert samples[-1][3] == {"Net, \"eth0\" (kB/s)": (float((SAMPLES - 1) % 50), "kB/s")}
+
+
+def test_writes_stay_chunk_sized(tmp_path, sources, monkeypatch):
+    # Output is produced a chunk or block at a time, never as one big string.
+    events, history = sources
+    sizes = []
+    real_open = ExportJob._open
+
+    class Recording:
+        def __init__(self, f):
+            self.f = f
+
+        def write(self, text):
+            sizes.append(len(text))
+            return self.f.write(text)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return self.f.__exit__(*exc)
+
+    monkeypatch.setattr(ExportJob, "_open", lambda self, path: Recording(real_open(self, path)))
+    job = ExportJob(str(tmp_path / "out.json"), events, history)
+    job.start()
+    job.join(60)
+
+    assert job.error is None and job.written == job.total
+    assert len(sizes) > (EVENTS // 4096) + 2 * (SAMPLES // 1024)
+    assert max(sizes) < 4096 * 200
+
+
+def test_cancelled_export_leaves_nothing_behind(tmp_path, sources):
+    events, history = sources
+    job = ExportJob(str(tmp_path / "out.csv"), events, history)
+    job.cancel()
+    job.start()
+    job.join(60)
+
+    assert job.done and job.cancelled and job.error is None
+    assert job.written < job.total
+    assert os.listdir(tmp_path) == []
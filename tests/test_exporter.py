@@ -0,0 +1,83 @@
+import gzip
+import math
+import socket
+import urllib.request
+
+import pytest
+
+import app
+from exporter import OpenMetricsExporter, _fmt, render_openmetrics
+from headless import HeadlessMonitor
+from instrumentation import SelfUsage
+from monitoring import MetricStatus
+
+
+@pytest.mark.parametrize("value, text", [
+    (None, "NaN"),
+    (math.nan, "NaN"),
+    (math.inf, "+Inf"),
+    (-math.inf, "-Inf"),
+    (1.5, "1.5"),
+    (60, "60.0"),
+    (-0.25, "-0.25"),
+])
+def test_fmt(value, text):
+    assert _fmt(value) == text
+
+
+def test_render_spells_non_finite_values():
+    statuses = [MetricStatus("Ratio", math.inf, "", "OK", math.nan, None, -math.inf, 10)]
+    lines = render_openmetrics(statuses, 1000.0).decode().splitlines()
+    assert 'systemmonitor_value{metric="Ratio",unit=""} +Inf' in lines
+    assert 'systemmonitor_zscore{metric="Ratio",unit=""} NaN' in lines
+    assert 'systemmonitor_baseline_stdev{metric="Ratio",unit=""} -Inf' in lines
+    assert not [line for line in lines if line.endswith((" nan", " inf", " -inf"))]
+    assert lines[-1] == "# EOF"
+
+
+def test_serves_latest_tick():
+    exporter = OpenMetricsExporter("127.0.0.1", 0)
+    exporter.start()
+    try:
+        exporter.publish(1000.0, {}, [MetricStatus("CPU (%)", 12.5, "%", "OK", 0.5, 12.0, 1.0, 60)])
+        request = urllib.request.Request(f"http://127.0.0.1:{exporter.port}/metrics",
+                                         headers={"Accept-Encoding": "gzip"})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            body = gzip.decompress(response.read()).decode()
+        assert 'systemmonitor_value{metric="CPU (%)",unit="%"} 12.5' in body.splitlines()
+    finally:
+        exporter.stop()
+
+
+def test_headless_tick_exports_its_own_usage():
+    usage = SelfUsage()
+    exporter = OpenMetricsExporter("127.0.0.1", 0, self_usage=usage)
+    monitor = HeadlessMonitor(adaptive=False, publishers=[exporter], self_usage=usage)
+    monitor.tick()
+
+    lines = exporter.page.body.decode().splitlines()
+    rss = [line for line in lines if line.startswith("systemmonitor_process_resident_memory_bytes ")]
+    assert len(rss) == 1 and float(rss[0].split()[1]) > 0
+    assert any(line.startswith("systemmonitor_process_cpu_percent ") for line in lines)
+    assert monitor.profiler.histograms["collect"].count == 1
+    assert monitor.profiler.histograms["publish"].count == 1
+    assert not [name for name in monitor.backend.collect() if name.startswith("Monitor ")]
+
+
+@pytest.fixture
+def busy_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(1)
+        yield sock.getsockname()[1]
+
+
+def test_busy_port_raises_a_clear_error(busy_port):
+    with pytest.raises(OSError, match=f"cannot listen on 127.0.0.1:{busy_port}"):
+        OpenMetricsExporter("127.0.0.1", busy_port).start()
+
+
+def test_busy_port_disables_the_exporter(busy_port, capsys):
+    args = app.parse_args(["--exporter", "--exporter-host", "127.0.0.1", "--exporter-port", str(busy_port)])
+    assert app.build_publishers(args) == []
+    assert "metrics exporter disabled" in capsys.readouterr().err
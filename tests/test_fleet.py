@@ -0,0 +1,127 @@
+import os
+import signal
+import socket
+import time
+
+import pytest
+
+import app
+from fleet import AgentPublisher, Aggregator, _shard
+from rules import RuleSet
+
+
+def _metrics(i):
+    return {"CPU (%)": (10.0 + i % 5, "%"), "RAM (%)": (40.0 + i % 3, "%")}
+
+
+def _wait(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+@pytest.fixture
+def fleet():
+    started = []
+
+    def make(n_agents, **kwargs):
+        aggregator = Aggregator(port=0, flush_ms=50, **kwargs)
+        aggregator.start()
+        agents = [AgentPublisher("127.0.0.1", aggregator.port, hostname=f"host-{i:02d}") for i in range(n_agents)]
+        for agent in agents:
+            agent.start()
+        started.append((aggregator, agents))
+        return aggregator, agents
+
+    yield make
+    for aggregator, agents in started:
+        for agent in agents:
+            agent.stop()
+        aggregator.stop()
+
+
+def _tick(agents, i):
+    for agent in agents:
+        agent.publish(1000.0 + i, _metrics(i), [])
+
+
+def _feed(aggregator, agents, until, start=0, ticks=200):
+    for i in range(start, start + ticks):
+        _tick(agents, i)
+        if until():
+            return True
+        time.sleep(0.05)
+    return until()
+
+
+def test_results_arrive_from_every_agent(fleet):
+    aggregator, agents = fleet(8, workers=0)
+    assert _feed(aggregator, agents, lambda: len(aggregator.snapshot()) == 8)
+
+    snapshot = aggregator.snapshot()
+    assert sorted(snapshot) == [f"host-{i:02d}" for i in range(8)]
+    result = snapshot["host-03"]
+    assert sorted(s.name for s in result.statuses) == ["CPU (%)", "RAM (%)"]
+    assert "CPU (%)" in result.forecasts
+    assert not aggregator.pool_active
+    assert aggregator.flush_errors == 0
+
+
+def test_inline_models_and_rules_belong_to_the_instance(fleet):
+    ruled, ruled_agents = fleet(2, workers=0, rules=RuleSet("busy: CPU > 0"))
+    plain, plain_agents = fleet(2, workers=0)
+    assert _feed(ruled, ruled_agents + plain_agents,
+                 lambda: len(ruled.snapshot()) == 2 and len(plain.snapshot()) == 2)
+
+    assert {s.name for s in ruled.snapshot()["host-00"].statuses} >= {"Rule: busy"}
+    assert "Rule: busy" not in {s.name for s in plain.snapshot()["host-00"].statuses}
+    assert set(ruled._models) == set(plain._models) == {"host-00", "host-01"}
+    assert ruled._models["host-00"] is not plain._models["host-00"]
+
+
+def test_pool_takes_over_and_survives_a_dead_worker(fleet):
+    aggregator, agents = fleet(4, workers=2, pool_threshold=2)
+    assert _feed(aggregator, agents, lambda: aggregator.pool_active and len(aggregator.snapshot()) == 4)
+    assert aggregator._models == {}
+
+    owner = _shard("host-00", len(aggregator._executors))
+    victim = next(iter(aggregator._executors[owner]._processes.values()))
+    os.kill(victim.pid, signal.SIGKILL)
+    victim.join(10)
+
+    last = {host: r.timestamp for host, r in aggregator.snapshot().items()}
+    assert _feed(aggregator, agents, lambda: aggregator.flush_errors > 0 and all(
+        r.timestamp > last[host] for host, r in aggregator.snapshot().items()
+    ), start=1000)
+    assert aggregator.pool_active
+    assert aggregator._executors[owner]._processes
+
+
+def test_disconnected_hosts_are_forgotten(fleet):
+    aggregator, agents = fleet(3, workers=0)
+    assert _feed(aggregator, agents, lambda: len(aggregator._connected_hosts) == 3)
+
+    agents[0].stop()
+    assert _wait(lambda: set(aggregator._connected_hosts) == {"host-01", "host-02"})
+
+
+@pytest.fixture
+def busy_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(1)
+        yield sock.getsockname()[1]
+
+
+def test_busy_port_raises_instead_of_hanging(busy_port):
+    aggregator = Aggregator("127.0.0.1", busy_port)
+    with pytest.raises(OSError):
+        aggregator.start()
+    assert aggregator._thread is None
+
+
+def test_busy_port_disables_the_aggregator(busy_port, capsys):
+    args = app.parse_args(["--aggregate", "--fleet-host", "127.0.0.1", "--fleet-port", str(busy_port)])
+    assert app.build_aggregator(args) is None
+    assert "fleet aggregator disabled" in capsys.readouterr().err
@@ -0,0 +1,46 @@
+from headless import HeadlessMonitor
+from instrumentation import PublishErrors
+
+
+class _Recorder:
+    def __init__(self):
+        self.ticks = 0
+
+    def publish(self, timestamp, raw_metrics, statuses):
+        self.ticks += 1
+
+    def stop(self):
+        pass
+
+
+class _Broken(_Recorder):
+    def publish(self, timestamp, raw_metrics, statuses):
+        raise BrokenPipeError("sink went away")
+
+
+def test_failing_publisher_does_not_starve_the_others(capsys):
+    before, after = _Recorder(), _Recorder()
+    monitor = HeadlessMonitor(adaptive=False, publishers=[before, _Broken(), after])
+    for _ in range(3):
+        monitor.tick()
+
+    assert (before.ticks, after.ticks) == (3, 3)
+    assert monitor.publish_errors.errors == {"_Broken": 3}
+    assert isinstance(monitor.publish_errors.last_error, BrokenPipeError)
+    err = capsys.readouterr().err.splitlines()
+    assert err == ["_Broken: publish failed: BrokenPipeError: sink went away"]
+
+
+def test_reports_are_rate_limited_per_publisher(capsys):
+    errors = PublishErrors(log_every_s=0.0)
+    errors.publish_all([_Broken()], 1.0, {}, [])
+    errors.log_every_s = 3600.0
+    errors.publish_all([_Broken(), _Broken()], 2.0, {}, [])
+    errors.log_every_s = 0.0
+    errors.publish_all([_Broken()], 3.0, {}, [])
+
+    assert errors.errors == {"_Broken": 4}
+    assert capsys.readouterr().err.splitlines() == [
+        "_Broken: publish failed: BrokenPipeError: sink went away",
+        "_Broken: publish failed: BrokenPipeError: sink went away (2 more since the last report)",
+    ]
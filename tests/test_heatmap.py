@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from heatmap import TOTAL, HeatmapStore
+
+
+def _saved(tmp_path):
+    path = str(tmp_path / "heatmap.npz")
+    store = HeatmapStore(path=path)
+    store.add("CPU (%)", 2.0, time.time())
+    store.save()
+    return path
+
+
+def test_round_trip(tmp_path):
+    path = _saved(tmp_path)
+    store = HeatmapStore.load(path)
+    assert store.names == [TOTAL, "CPU (%)"]
+    assert store.matrix("CPU (%)").sum() == pytest.approx(2.0, rel=1e-3)
+
+
+@pytest.mark.parametrize("damage", ["truncate", "garbage", "empty", "corrupt_member"])
+def test_damaged_file_gives_an_empty_store(tmp_path, damage):
+    path = _saved(tmp_path)
+    with open(path, "rb") as f:
+        data = f.read()
+    if damage == "truncate":
+        data = data[:len(data) // 2]
+    elif damage == "garbage":
+        data = b"not a zip file at all" * 10
+    elif damage == "empty":
+        data = b""
+    else:
+        # Keep the zip structure but flip bytes inside the compressed member.
+        middle = len(data) // 3
+        data = data[:middle] + bytes(b ^ 0xFF for b in data[middle:middle + 16]) + data[middle + 16:]
+    with open(path, "wb") as f:
+        f.write(data)
+
+    store = HeatmapStore.load(path)
+    assert store.names == [TOTAL]
+    assert store.path == path
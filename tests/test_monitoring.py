@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+import pytest
+
+from monitoring import (
+    STATE_CODES,
+    AdaptiveSampler,
+    AnomalyDetector,
+    MultivariateDetector,
+    SystemMonitorBackend,
+    rolling_states,
+)
+
+
+@pytest.mark.parametrize("interval, expected", [(1.0, 60), (0.25, 240), (0.1, 600), (10.0, 10)])
+def test_detector_window_spans_seconds_not_samples(interval, expected):
+    detector = AnomalyDetector(window_seconds=60.0, min_samples=10, max_samples=600, use_sketches=False)
+    for i in range(2000):
+        status = detector.evaluate("CPU (%)", 10.0 + i % 7, "%", timestamp=i * interval)
+    assert status.samples == expected
+
+
+def test_detector_without_timestamps_keeps_nominal_window():
+    detector = AnomalyDetector(window_seconds=60.0, use_sketches=False)
+    for i in range(200):
+        status = detector.evaluate("CPU (%)", float(i % 5), "%")
+    assert status.samples == 60
+
+
+def test_fast_sampling_keeps_the_long_baseline():
+    # One minute of calm at 1 s, then fast sampling: 15 s of fast samples
+    # must not push the calm minute out of the baseline.
+    detector = AnomalyDetector(window_seconds=60.0, use_sketches=False)
+    t = 0.0
+    for i in range(60):
+        detector.evaluate("CPU (%)", 10.0 + i % 3, "%", timestamp=t)
+        t += 1.0
+    for _ in range(60):
+        t += 0.25
+        status = detector.evaluate("CPU (%)", 11.0, "%", timestamp=t)
+    # About 45 s of the calm minute remain next to the 15 s of fast samples.
+    assert 100 <= status.samples <= 105
+    assert 10.0 < status.mean < 11.5
+
+
+@pytest.mark.parametrize("timed", [True, False])
+def test_rolling_states_match_the_live_detector(timed):
+    rng = np.random.default_rng(1)
+    ts = 1000.0 + np.cumsum(rng.choice([0.25, 0.5, 1.0, 2.0, 4.0], size=2000))
+    values = rng.normal(10.0, 2.0, size=2000)
+    values[1000:1010] += 20.0
+
+    detector = AnomalyDetector(window_seconds=60.0, min_samples=10, max_samples=200, use_sketches=False)
+    statuses = [detector.evaluate("CPU (%)", float(v), "%", timestamp=float(t) if timed else None)
+                for t, v in zip(ts, values)]
+    z, codes = rolling_states(values, ts if timed else None, 60.0, min_samples=10, max_samples=200)
+
+    assert [STATE_CODES[c] for c in codes] == [s.state for s in statuses]
+    scored = codes > 0
+    assert z[scored] == pytest.approx([s.z_score for s in statuses if s.state != "LEARN"], rel=1e-9)
+
+
+def test_window_size_is_a_deprecated_alias():
+    with pytest.deprecated_call():
+        detector = AnomalyDetector(window_size=30)
+    assert detector.window_seconds == 30 * detector.nominal_interval
+
+
+def _mv_samples(n, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        cpu = float(rng.normal(20.0, 5.0))
+        yield {
+            "CPU (%)": cpu,
+            "RAM (%)": 50.0,  # constant: only the variance floor keeps it finite
+            "Load": cpu / 10.0 + float(rng.normal(0.0, 0.2)),
+            "Net (kB/s)": float(rng.lognormal(3.0, 1.0)),
+            "Temp": 45.0 + 1e-9 * (i % 2),
+        }
+
+
+@pytest.mark.parametrize("refresh_every", [1, 32, 10 ** 9])
+def test_mahalanobis_matches_a_full_inverse(refresh_every):
+    detector = MultivariateDetector(refresh_every=refresh_every, min_samples=10)
+    for i, values in enumerate(_mv_samples(400)):
+        if detector.names:
+            x = np.array([values[n] for n in detector.names])
+            d = x - detector.mean
+            expected = float(d @ np.linalg.inv(detector.cov + np.diag(detector.floor)) @ d)
+        status = detector.evaluate(values, timestamp=i * 1.5)
+        if status.state == "LEARN":
+            continue
+
+        assert status.distance ** 2 == pytest.approx(expected, rel=1e-6)
+        k = len(detector.names)
+        c = 2.0 / (9.0 * k)
+        assert status.z_score == pytest.approx(((expected / k) ** (1 / 3) - (1 - c)) / math.sqrt(c), rel=1e-6)
+
+    reference = np.linalg.inv(detector.cov + np.diag(detector.floor))
+    assert np.allclose(detector.precision, reference, rtol=1e-6, atol=1e-9 * np.abs(reference).max())
+
+
+def test_variance_floor_holds_between_refreshes():
+    detector = MultivariateDetector(refresh_every=10 ** 9)
+    for i, values in enumerate(_mv_samples(300)):
+        detector.evaluate(values, timestamp=float(i))
+    ram = detector.names.index("RAM (%)")
+    # The constant metric's precision stays at 1 / floor instead of growing as the floor decays.
+    assert detector.precision[ram, ram] == pytest.approx(1.0 / detector.floor[ram], rel=1e-6)
+
+
+def test_sampler_speeds_up_on_warn_and_stretches_when_calm():
+    sampler = AdaptiveSampler(base_ms=1000, fast_ms=250, max_ms=4000, calm_ticks=2, stretch_factor=2.0)
+    assert sampler.next_interval_ms(["OK", "WARN"]) == 250
+    assert sampler.next_interval_ms(["OK"]) == 1000
+    assert sampler.next_interval_ms(["STABLE"]) == 2000
+    assert sampler.next_interval_ms(["OK"]) == 2000
+    assert sampler.next_interval_ms(["OK"]) == 4000
+    assert sampler.next_interval_ms(["LEARN", "OK"]) == 1000
+
+
+def test_collect_has_no_self_metrics():
+    # The monitor's own usage must never reach the sampler, detectors or logs.
+    backend = SystemMonitorBackend(disk_detail=False)
+    assert not [name for name in backend.collect() if name.startswith("Monitor ")]
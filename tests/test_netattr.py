@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import netattr
+from netattr import TCP_ESTABLISHED, TCP_LISTEN, NetAttribution, read_socket_table
+
+TCP = (
+    "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+    "   0: 0100007F:0CEA 00000000:0000 0A 00000000:00000000 00:00000000 00000000  1000        0 1001 1 0000000000000000 100 0 0 10 0\n"
+    "   1: 0100007F:D2B4 0100007F:0CEA 01 00000010:00000020 02:000A7D8B 00000000  1000        0 1002 2 0000000000000000 20 4 30 10 -1\n"
+    "   2: 0100007F:D2B6 0100007F:0CEA 06 00000000:00000000 03:00001770 00000000     0        0 0 3 0000000000000000\n"
+)
+TCP6 = (
+    "  sl  local_address                         remote_address                        st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+    "   0: 00000000000000000000000001000000:1F90 00000000000000000000000000000000:0000 0A 00000000:00000000 00:00000000 00000000  1000        0 2001 1 0000000000000000 100 0 0 10 0\n"
+    "   1: 00000000000000000000000001000000:E1A2 00000000000000000000000001000000:1F90 01 000001F4:00000000 01:00000015 00000000  1000        0 2002 1 0000000000000000 20 4 1 10 -1\n"
+)
+UDP = (
+    "   sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode ref pointer drops\n"
+    "  123: 00000000:0044 00000000:0000 07 00000000:00000100 00:00000000 00000000     0        0 3001 2 0000000000000000 0\n"
+    "  456: 3500007F:0035 00000000:0000 07 00000000:00000000 00:00000000 00000000   101        0 3002 2 0000000000000000 0\n"
+)
+
+
+def test_read_socket_table(tmp_path):
+    for name, text in (("tcp", TCP), ("tcp6", TCP6), ("udp", UDP)):
+        (tmp_path / name).write_text(text)
+
+    sockets = {}
+    read_socket_table(str(tmp_path / "tcp"), "tcp", sockets)
+    read_socket_table(str(tmp_path / "tcp6"), "tcp", sockets)
+    read_socket_table(str(tmp_path / "udp"), "udp", sockets)
+    read_socket_table(str(tmp_path / "udp6"), "udp", sockets)  # missing table
+
+    # The TIME_WAIT socket has no inode and is left out.
+    assert sockets == {
+        1001: ("tcp", TCP_LISTEN, 0, 0),
+        1002: ("tcp", TCP_ESTABLISHED, 0x10, 0x20),
+        2001: ("tcp", TCP_LISTEN, 0, 0),
+        2002: ("tcp", TCP_ESTABLISHED, 500, 0),
+        3001: ("udp", 7, 0, 256),
+        3002: ("udp", 7, 0, 0),
+    }
+
+
+def test_truncated_lines_are_skipped(tmp_path):
+    (tmp_path / "tcp").write_text(TCP.splitlines()[0] + "\n   0: 0100007F:0CEA 00000000:0000 0A\n\n")
+    sockets = {}
+    read_socket_table(str(tmp_path / "tcp"), "tcp", sockets)
+    assert sockets == {}
+
+
+@pytest.fixture
+def fake_proc(tmp_path):
+    proc = tmp_path / "proc"
+    (proc / "net").mkdir(parents=True)
+    for name, text in (("tcp", TCP), ("tcp6", TCP6), ("udp", UDP), ("udp6", UDP.splitlines()[0] + "\n")):
+        (proc / "net" / name).write_text(text)
+
+    def process(pid, comm, targets):
+        fd = proc / str(pid) / "fd"
+        fd.mkdir(parents=True)
+        (proc / str(pid) / "comm").write_text(comm + "\n")
+        for i, target in enumerate(targets):
+            os.symlink(target, fd / str(i))
+
+    process(10, "server", ["/dev/null", "socket:[1001]", "socket:[2001]", "pipe:[77]"])
+    process(20, "client", ["socket:[1002]", "socket:[2002]", "socket:[3001]"])
+    return str(proc)
+
+
+def test_sockets_are_attributed_to_their_processes(fake_proc, monkeypatch):
+    monkeypatch.setattr(netattr, "tcp_byte_counters", lambda: None)
+    usage = {e.pid: e for e in NetAttribution(proc=fake_proc).refresh(1000.0)}
+
+    assert (usage[10].name, usage[10].listen, usage[10].tcp, usage[10].udp) == ("server", 2, 0, 0)
+    assert (usage[20].name, usage[20].tcp, usage[20].udp) == ("client", 2, 1)
+    assert (usage[20].tx_queue, usage[20].rx_queue) == (0x10 + 500, 0x20 + 256)
+    # Nobody owns the second UDP socket.
+    assert (usage[0].udp, usage[0].sockets) == (1, 1)
+    assert usage[20].up_kbs is None
+
+
+def test_byte_rates_come_from_tcp_counters(fake_proc, monkeypatch):
+    counters = {1002: (0, 0), 2002: (1000, 5000)}
+    monkeypatch.setattr(netattr, "tcp_byte_counters", lambda: dict(counters))
+    attribution = NetAttribution(proc=fake_proc)
+    attribution.refresh(1000.0)
+
+    counters.update({1002: (2048, 1024), 2002: (1000 + 2048, 5000 + 1024)})
+    usage = attribution.refresh(1002.0)
+    assert usage[0].pid == 20
+    assert (usage[0].up_kbs, usage[0].down_kbs) == (2.0, 1.0)
+    assert (usage[1].up_kbs, usage[1].down_kbs) == (0.0, 0.0)
+
+
+def test_fd_budget_spreads_the_scan_over_refreshes(fake_proc, monkeypatch):
+    monkeypatch.setattr(netattr, "tcp_byte_counters", lambda: None)
+    attribution = NetAttribution(proc=fake_proc, fd_budget=3)
+    attribution.refresh(1000.0)
+    assert attribution.last_cost <= 3
+    assert len(attribution.owner) < 5
+
+    for i in range(1, 6):
+        attribution.refresh(1000.0 + i)
+        assert attribution.last_cost <= 3
+    assert attribution.owner == {1001: 10, 2001: 10, 1002: 20, 2002: 20, 3001: 20}
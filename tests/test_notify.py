@@ -0,0 +1,231 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from monitoring import MetricStatus
+from notify import NotificationDispatcher, WebhookSink
+
+
+class StandIn:
+    """
+    Local webhook receiver. Answers 503 to the first `fail` requests and
+    sleeps `delay` seconds before each answer.
+    """
+
+    def __init__(self, fail=0, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.batches = []
+        self.attempts = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                stand_in.attempts.append(time.monotonic())
+                if stand_in.delay:
+                    time.sleep(stand_in.delay)
+                if stand_in.fail > 0:
+                    stand_in.fail -= 1
+                    self.send_response(503)
+                else:
+                    stand_in.batches.append(json.loads(body)["notifications"])
+                    self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait_for(self, n, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.batches) < n and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.batches
+
+
+@pytest.fixture
+def stand_in():
+    servers = []
+
+    def make(**kwargs):
+        servers.append(StandIn(**kwargs))
+        return servers[-1]
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+def _status(name, state, value=1.0):
+    return MetricStatus(name, value, "%", state, None, None, None, 10)
+
+
+def _dispatcher(url, **kwargs):
+    options = dict(hostname="test", batch_s=0.05, max_batches_per_min=0, retries=3, backoff_s=0.1)
+    options.update(kwargs)
+    return NotificationDispatcher([WebhookSink(url, timeout=5.0)], **options)
+
+
+def test_transitions_are_batched(stand_in):
+    server = stand_in()
+    dispatcher = _dispatcher(server.url, batch_s=0.3)
+    names = [f"M{i}" for i in range(5)]
+    dispatcher.publish(0.0, {}, [_status(n, "OK") for n in names])
+    dispatcher.publish(1.0, {}, [_status(n, "ALERT") for n in names[:3]])
+    dispatcher.publish(2.0, {}, [_status(n, "WARN") for n in names[3:]])
+
+    batches = server.wait_for(1)
+    time.sleep(0.2)
+    dispatcher.stop()
+    assert len(batches) == 1
+    assert [(n["metric"], n["status"], n["previous"]) for n in batches[0]] == [
+        ("M0", "ALERT", "OK"), ("M1", "ALERT", "OK"), ("M2", "ALERT", "OK"),
+        ("M3", "WARN", "OK"), ("M4", "WARN", "OK"),
+    ]
+    assert batches[0][0]["host"] == "test"
+
+
+def test_503_is_retried_with_backoff(stand_in):
+    server = stand_in(fail=2)
+    dispatcher = _dispatcher(server.url, backoff_s=0.2)
+    dispatcher.publish(0.0, {}, [_status("CPU", "OK")])
+    dispatcher.publish(1.0, {}, [_status("CPU", "ALERT")])
+
+    batches = server.wait_for(1)
+    dispatcher.stop()
+    worker = dispatcher.workers[0]
+    assert [n["status"] for n in batches[0]] == ["ALERT"]
+    assert len(server.attempts) == 3
+    gaps = [b - a for a, b in zip(server.attempts, server.attempts[1:])]
+    assert gaps[0] >= 0.2 * 0.9
+    assert gaps[1] >= 0.4 * 0.9
+    assert (worker.sent, worker.failed) == (1, 0)
+
+
+def test_batch_is_dropped_after_retries(stand_in):
+    server = stand_in(fail=100)
+    dispatcher = _dispatcher(server.url, retries=2, backoff_s=0.05)
+    dispatcher.publish(0.0, {}, [_status("CPU", "OK")])
+    dispatcher.publish(1.0, {}, [_status("CPU", "ALERT")])
+
+    worker = dispatcher.workers[0]
+    deadline = time.monotonic() + 5.0
+    while worker.failed == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.stop()
+    assert len(server.attempts) == 3
+    assert (worker.sent, worker.failed) == (0, 1)
+    assert worker.last_error is not None
+
+
+def test_batches_are_rate_limited(stand_in):
+    server = stand_in()
+    dispatcher = _dispatcher(server.url, batch_s=0.01, max_batches_per_min=120)
+    dispatcher.publish(0.0, {}, [_status("CPU", "OK"), _status("RAM", "OK")])
+    dispatcher.publish(1.0, {}, [_status("CPU", "ALERT")])
+    server.wait_for(1)
+    dispatcher.publish(2.0, {}, [_status("RAM", "ALERT")])
+
+    batches = server.wait_for(2)
+    dispatcher.stop()
+    assert len(batches) == 2
+    # 120 batches per minute: at least 0.5 s between two posts.
+    assert server.attempts[1] - server.attempts[0] >= 0.5 * 0.9
+
+
+def test_slow_sink_does_not_block_publish(stand_in):
+    server = stand_in(delay=1.0)
+    dispatcher = _dispatcher(server.url, batch_s=0.0)
+    statuses = [_status(f"M{i}", "OK") for i in range(100)]
+    dispatcher.publish(0.0, {}, statuses)
+
+    started = time.perf_counter()
+    for tick in range(1, 21):
+        state = "ALERT" if tick % 2 else "OK"
+        dispatcher.publish(tick * 400.0, {}, [_status(s.name, state) for s in statuses])
+    elapsed = time.perf_counter() - started
+    dispatcher.stop(timeout=0.0)
+    assert elapsed < 0.5
+
+
+def _delivered(server, count):
+    batches = server.wait_for(count)
+    return [(n["metric"], n["previous"], n["status"]) for batch in batches for n in batch]
+
+
+def test_recovery_inside_dedup_window_is_held_until_it_expires(stand_in):
+    server = stand_in()
+    dispatcher = _dispatcher(server.url, dedup_s=300.0)
+    dispatcher.publish(0.0, {}, [_status("CPU", "OK")])
+    dispatcher.publish(10.0, {}, [_status("CPU", "ALERT")])
+    dispatcher.publish(20.0, {}, [_status("CPU", "OK")])
+    assert _delivered(server, 1) == [("CPU", "OK", "ALERT"), ("CPU", "ALERT", "OK")]
+
+    # The second alert is an escalation away from the last sent state: never suppressed.
+    dispatcher.publish(30.0, {}, [_status("CPU", "ALERT")])
+    assert _delivered(server, 2)[-1] == ("CPU", "OK", "ALERT")
+
+    # The second recovery repeats one sent 20 s ago: held back, not lost.
+    dispatcher.publish(40.0, {}, [_status("CPU", "OK")])
+    dispatcher.publish(50.0, {}, [_status("CPU", "OK")])
+    time.sleep(0.2)
+    assert len(server.batches) == 2
+    assert dispatcher.suppressed == 1
+
+    dispatcher.publish(320.0, {}, [_status("CPU", "OK")])
+    delivered = _delivered(server, 3)
+    dispatcher.stop()
+    assert delivered[-1] == ("CPU", "ALERT", "OK")
+    assert dispatcher.suppressed == 1
+
+
+def test_flapping_metric_ends_in_its_real_state(stand_in):
+    server = stand_in()
+    dispatcher = _dispatcher(server.url, dedup_s=300.0)
+    dispatcher.publish(0.0, {}, [_status("CPU", "OK")])
+    for tick in range(1, 8):
+        dispatcher.publish(tick * 10.0, {}, [_status("CPU", "ALERT" if tick % 2 else "OK")])
+
+    time.sleep(0.3)
+    dispatcher.stop()
+    delivered = [(n["previous"], n["status"]) for batch in server.batches for n in batch]
+    assert delivered[-1] == ("OK", "ALERT")
+    # Each message continues from the one before it.
+    assert all(a[1] == b[0] for a, b in zip(delivered, delivered[1:]))
+
+
+def test_held_recovery_is_discarded_when_the_alert_comes_back(stand_in):
+    server = stand_in()
+    dispatcher = _dispatcher(server.url, dedup_s=300.0)
+    for t, state in ((0.0, "OK"), (10.0, "ALERT"), (20.0, "OK"), (30.0, "ALERT"), (40.0, "OK"), (50.0, "ALERT")):
+        dispatcher.publish(t, {}, [_status("CPU", state)])
+    dispatcher.publish(400.0, {}, [_status("CPU", "ALERT")])
+
+    time.sleep(0.3)
+    dispatcher.stop()
+    delivered = [(n["previous"], n["status"]) for batch in server.batches for n in batch]
+    assert delivered == [("OK", "ALERT"), ("ALERT", "OK"), ("OK", "ALERT")]
+
+
+def test_changes_outside_notify_states_are_silent(stand_in):
+    server = stand_in()
+    dispatcher = _dispatcher(server.url)
+    for t, state in ((0.0, "LEARN"), (1.0, "OK"), (2.0, "STABLE"), (3.0, "WARN"), (4.0, "ALERT")):
+        dispatcher.publish(t, {}, [_status("CPU", state)])
+
+    time.sleep(0.3)
+    dispatcher.stop()
+    delivered = [(n["previous"], n["status"]) for batch in server.batches for n in batch]
+    assert delivered == [("STABLE", "WARN"), ("WARN", "ALERT")]
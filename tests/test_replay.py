@@ -0,0 +1,76 @@
+import pytest
+
+from capture import CaptureRecorder
+from monitoring import AnomalyDetector
+from replay import ReplayEngine, ReplaySource
+
+START = 1000.0
+
+
+def _record(path, n=600):
+    recorder = CaptureRecorder(str(path), hostname="host-a", sync_every=4)
+    for i in range(n):
+        spike = 40.0 if 300 <= i < 310 else 0.0
+        recorder.publish(START + i, {"CPU (%)": (10.0 + i % 7 + spike, "%"), "RAM (%)": (50.0 + i % 3, "%")})
+    recorder.stop()
+    return str(path)
+
+
+class _Pipeline:
+    def __init__(self):
+        self.restore(None)
+
+    def process(self, ts, metrics, render):
+        for name, (value, unit) in metrics.items():
+            self.detector.evaluate(name, value, unit, timestamp=ts)
+        self.processed += 1
+
+    def snapshot(self):
+        return {"detector": self.detector, "processed": self.processed}
+
+    def restore(self, state):
+        if state is None:
+            state = {"detector": AnomalyDetector(), "processed": 0}
+        self.detector = state["detector"]
+        self.processed = state["processed"]
+
+    def probe(self, ts):
+        return [self.detector.evaluate(name, 12.0, "%", timestamp=ts + 0.5) for name in ("CPU (%)", "RAM (%)")]
+
+
+def _engine(path, pipeline):
+    return ReplayEngine(ReplaySource(path), pipeline.process, pipeline.snapshot, pipeline.restore,
+                        checkpoint_s=40.0, warmup_s=100.0)
+
+
+@pytest.mark.parametrize("offset", [5.0, 123.0, 305.0, 420.0, 599.0])
+def test_seek_matches_linear_replay(tmp_path, offset):
+    path = _record(tmp_path / "run.smcap")
+    target = START + offset
+
+    linear = _Pipeline()
+    engine = _engine(path, linear)
+    engine.advance_to(target)
+    engine.close()
+
+    seeking = _Pipeline()
+    engine = _engine(path, seeking)
+    engine.advance_to(START + 599.0)
+    assert engine.checkpoints
+    engine.seek(target)
+    assert engine.position == target
+    engine.close()
+
+    assert seeking.processed == linear.processed
+    assert seeking.probe(target) == linear.probe(target)
+
+
+def test_checkpoints_start_at_sync_points(tmp_path):
+    path = _record(tmp_path / "run.smcap")
+    pipeline = _Pipeline()
+    engine = _engine(path, pipeline)
+    engine.advance_to(START + 599.0)
+    times = sorted(engine.source.times[s] for s in engine.checkpoints)
+    assert times[0] == START
+    assert all(b - a >= 40.0 for a, b in zip(times, times[1:]))
+    engine.close()
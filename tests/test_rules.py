@@ -0,0 +1,111 @@
+import pickle
+import random
+
+import pytest
+
+from monitoring import MetricStatus
+from rules import RuleError, RuleSet
+
+
+def _status(name, value, state="OK", z=None):
+    return MetricStatus(name, value, "", state, z, None, None, 10)
+
+
+def _states(statuses):
+    return [s.state for s in statuses]
+
+
+class BruteForce:
+    """
+    Reference evaluation: every condition and every rule on every tick.
+    """
+
+    def __init__(self, rules: RuleSet):
+        self.rules = rules
+        self.tests = [atom.compile() for atom in rules.atoms]
+        self.raw = [False] * len(rules.atoms)
+        self.since = [0.0] * len(rules.atoms)
+
+    def evaluate(self, timestamp, statuses, forecasts=None):
+        for status in statuses:
+            forecast = (forecasts or {}).get(status.name)
+            for i, atom in enumerate(self.rules.atoms):
+                if atom.matches(status.name):
+                    value = self.tests[i](status, forecast)
+                    if value and not self.raw[i]:
+                        self.since[i] = timestamp
+                    self.raw[i] = value
+        held = [
+            raw and timestamp - since >= atom.duration
+            for raw, since, atom in zip(self.raw, self.since, self.rules.atoms)
+        ]
+        return [rule.severity if rule.test(held) else "OK" for rule in self.rules.rules]
+
+
+def test_rule_true_with_all_conditions_false_is_raised_on_first_tick():
+    rules = RuleSet("r1: CPU > 90\nr3 [WARN]: NOT CPU > 90\n")
+    state = rules.new_state()
+    assert _states(rules.evaluate(state, 0.0, [_status("CPU (%)", 50.0)])) == ["OK", "WARN"]
+    assert sorted(state.flipped) == [1]
+    assert _states(rules.evaluate(state, 1.0, [_status("CPU (%)", 95.0)])) == ["ALERT", "OK"]
+
+
+def test_duration_and_forecast():
+    rules = RuleSet("busy: CPU ALERT for 30 s AND Net Down < 10 kB/s\nram [WARN]: RAM forecast < 5 min\n")
+    state = rules.new_state()
+    assert rules.needs_forecast("RAM (%)") and not rules.needs_forecast("CPU (%)")
+
+    def tick(t, cpu_state, net, forecast=None):
+        statuses = [_status("CPU (%)", 90, cpu_state), _status("Net Down (kB/s)", net), _status("RAM (%)", 50)]
+        return _states(rules.evaluate(state, t, statuses, {"RAM (%)": forecast}))
+
+    assert tick(0, "ALERT", 5) == ["OK", "OK"]
+    assert tick(29, "ALERT", 5) == ["OK", "OK"]
+    assert tick(30, "ALERT", 5, 3.0) == ["ALERT", "WARN"]
+    assert tick(31, "ALERT", 50) == ["OK", "OK"]
+
+
+@pytest.mark.parametrize("text", [
+    "x: CPU >", "x: (CPU ALERT", "x [INFO]: CPU ALERT", "nocolon", "x: > 5", "x: CPU ALERT AND",
+])
+def test_parse_errors(text):
+    with pytest.raises(RuleError):
+        RuleSet(text)
+
+
+def test_pickles_by_text():
+    rules = RuleSet("a: CPU > 5\n")
+    state = rules.new_state()
+    rules.evaluate(state, 0.0, [_status("CPU (%)", 10.0)])
+    copy = pickle.loads(pickle.dumps(rules))
+    assert copy.text == rules.text and len(copy) == 1
+    assert pickle.loads(pickle.dumps(state)).active == [True]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_incremental_plan_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    metrics = [f"m{i} (%)" for i in range(6)]
+    lines = []
+    for k in range(300):
+        a, b = rnd.sample(range(len(metrics)), 2)
+        op = rnd.choice(["<", "<=", ">", ">=", "==", "!="])
+        duration = rnd.choice(["", "", " for 3 s", " for 10 s"])
+        left = f"m{a} {rnd.choice(['', 'z '])}{op} {rnd.randint(0, 100) if op[0] != '=' and op != '!=' else rnd.choice([0, 50])}{duration}"
+        right = rnd.choice([f"m{b} WARN", f"m{b} OK", f"m{b} forecast < {rnd.randint(1, 30)}", f"m{b} z > {rnd.randint(-2, 3)}"])
+        template = rnd.choice(["{l} AND {r}", "{l} OR {r}", "NOT {l}", "NOT ({l} OR {r})", "{l} AND NOT {r}"])
+        lines.append(f"r{k}: " + template.format(l=left, r=right))
+    rules = RuleSet("\n".join(lines))
+    reference = BruteForce(rules)
+    state = rules.new_state()
+
+    for t in range(200):
+        statuses = [
+            _status(m, float(rnd.choice([0, 50, rnd.randint(0, 100)])),
+                    rnd.choice(["OK", "OK", "STABLE", "WARN", "ALERT", "LEARN"]),
+                    rnd.choice([None, rnd.gauss(0, 2)]))
+            for m in metrics if rnd.random() > 0.1
+        ]
+        forecasts = {m: rnd.choice([None, float(rnd.randint(0, 40))]) for m in metrics}
+        got = _states(rules.evaluate(state, float(t), statuses, forecasts))
+        assert got == reference.evaluate(float(t), statuses, forecasts), f"tick {t}"
@@ -0,0 +1,95 @@
+import itertools
+import os
+import subprocess
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import pytest
+
+from shm_ring import ShmRingReader, ShmRingWriter
+
+_counter = itertools.count()
+
+
+@pytest.fixture
+def ring_name():
+    return f"smtest_{os.getpid()}_{next(_counter)}"
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A writer that dies without cleaning up; the segment is untracked so that
+# its resource tracker does not remove it either, as after a SIGKILL.
+_CRASH = """
+import os, sys
+from multiprocessing import resource_tracker
+from shm_ring import ShmRingWriter
+writer = ShmRingWriter(sys.argv[1], capacity=8, max_metrics=4)
+writer.publish(1.0, {"CPU (%)": (1.0, "%")})
+resource_tracker.unregister(writer.shm._name, "shared_memory")
+os._exit(0)
+"""
+
+
+def _tick(writer, ts):
+    writer.publish(ts, {"CPU (%)": (ts * 2, "%"), "RAM (%)": (50.0, "%")})
+
+
+def test_round_trip(ring_name):
+    writer = ShmRingWriter(ring_name, capacity=8, max_metrics=4)
+    reader = ShmRingReader(ring_name)
+    try:
+        for ts in range(1, 12):
+            _tick(writer, float(ts))
+        window = reader.latest(3)
+        assert list(window.timestamps) == [9.0, 10.0, 11.0]
+        assert list(window.column("CPU (%)")) == [18.0, 20.0, 22.0]
+        assert reader.is_valid(window)
+    finally:
+        del window
+        reader.close()
+        writer.close()
+
+
+def test_live_ring_is_not_replaced(ring_name):
+    writer = ShmRingWriter(ring_name, capacity=8, max_metrics=4)
+    try:
+        _tick(writer, 1.0)
+        with pytest.raises(FileExistsError, match=f"in use by process {os.getpid()}"):
+            ShmRingWriter(ring_name, capacity=8, max_metrics=4)
+
+        _tick(writer, 2.0)
+        reader = ShmRingReader(ring_name)
+        assert reader.written == 2
+        reader.close()
+    finally:
+        writer.close()
+
+
+def test_ring_of_a_dead_writer_is_reclaimed(ring_name):
+    subprocess.run([sys.executable, "-c", _CRASH, ring_name], cwd=ROOT, check=True)
+    stale = ShmRingReader(ring_name)
+    assert stale.written == 1
+    stale.close()
+
+    writer = ShmRingWriter(ring_name, capacity=16, max_metrics=4)
+    try:
+        reader = ShmRingReader(ring_name)
+        assert (reader.written, reader.layout.capacity) == (0, 16)
+        reader.close()
+    finally:
+        writer.close()
+
+
+def test_foreign_segment_is_left_alone(ring_name):
+    foreign = shared_memory.SharedMemory(name=ring_name, create=True, size=4096)
+    try:
+        foreign.buf[:4] = b"keep"
+        with pytest.raises(FileExistsError, match="not a sample ring"):
+            ShmRingWriter(ring_name, capacity=8, max_metrics=4)
+        assert bytes(foreign.buf[:4]) == b"keep"
+    finally:
+        foreign.close()
+        # The refused writer stopped tracking the segment; keep unlink() balanced.
+        resource_tracker.register(foreign._name, "shared_memory")
+        foreign.unlink()
@@ -0,0 +1,107 @@
+import math
+
+import numpy as np
+import pytest
+
+from sketches import DDSketch
+
+QS = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+def _exact(values, q):
+    # The sketch answers with the sample at rank floor(q * (n - 1)).
+    return np.sort(values)[int(q * (len(values) - 1))]
+
+
+def _values(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.concatenate((rng.lognormal(3.0, 1.5, n), -rng.lognormal(0.0, 1.0, n // 10), np.zeros(n // 20)))
+
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_quantiles_stay_within_the_relative_error_bound(accuracy):
+    values = _values()
+    sketch = DDSketch(relative_accuracy=accuracy, max_bins=4096)
+    for x in values:
+        sketch.add(float(x))
+
+    result = sketch.quantiles(QS)
+    for q in QS:
+        exact = _exact(values, q)
+        assert abs(result[q] - exact) <= accuracy * abs(exact) + 1e-12, q
+
+
+def test_add_many_matches_add():
+    values = _values(5000)
+    one, bulk = DDSketch(), DDSketch()
+    for x in values:
+        one.add(float(x))
+    bulk.add_many(values)
+    assert (bulk.pos, bulk.neg, bulk.zero, bulk.count) == (one.pos, one.neg, one.zero, one.count)
+    assert bulk.quantiles(QS) == one.quantiles(QS)
+
+
+def test_merge_equals_a_sketch_of_everything():
+    values = _values()
+    whole = DDSketch()
+    whole.add_many(values)
+
+    parts = [DDSketch() for _ in range(3)]
+    for part, chunk in zip(parts, np.array_split(values, 3)):
+        part.add_many(chunk)
+    merged = DDSketch.merged(parts)
+
+    assert (merged.pos, merged.neg, merged.zero) == (whole.pos, whole.neg, whole.zero)
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+    assert merged.quantiles(QS) == whole.quantiles(QS)
+    assert parts[0].count == len(np.array_split(values, 3)[0])
+
+
+def test_merge_rejects_other_accuracy():
+    with pytest.raises(ValueError):
+        DDSketch(relative_accuracy=0.01).merge(DDSketch(relative_accuracy=0.02))
+
+
+def test_collapse_bounds_bins_and_keeps_upper_quantiles():
+    values = np.random.default_rng(1).lognormal(0.0, 1.0, 20000)
+    sketch = DDSketch(relative_accuracy=0.01, max_bins=256)
+    sketch.add_many(values)
+
+    assert len(sketch.pos) <= 256
+    assert sketch.count == len(values)
+    assert sum(sketch.pos.values()) == len(values)
+    # Only the lowest bins are folded: upper quantiles keep their accuracy,
+    # the lowest ones are answered by the (higher) floor bin.
+    result = sketch.quantiles((0.01, 0.5, 0.99))
+    for q in (0.5, 0.99):
+        assert result[q] == pytest.approx(_exact(values, q), rel=0.01)
+    assert result[0.01] > _exact(values, 0.01)
+
+    # Values below the collapsed floor land in the floor bin.
+    floor = sketch.floors["pos"]
+    sketch.add(float(values.min()) / 10)
+    assert min(sketch.pos) == floor
+
+
+def test_merge_respects_the_other_floor():
+    values = np.random.default_rng(2).lognormal(0.0, 4.0, 5000)
+    collapsed = DDSketch(max_bins=32)
+    collapsed.add_many(values)
+    fine = DDSketch(max_bins=32)
+    fine.add_many(values[:50])
+
+    fine.merge(collapsed)
+    assert min(fine.pos) >= collapsed.floors["pos"]
+    assert fine.count == 5050
+
+
+@pytest.mark.parametrize("bad", [math.inf, -math.inf, math.nan])
+def test_non_finite_values_are_skipped(bad):
+    sketch = DDSketch()
+    sketch.add(1.0)
+    sketch.add(bad)
+    sketch.add_many(np.array([2.0, bad]))
+
+    assert sketch.count == 2
+    assert sketch.zero == 0
+    assert (sketch.min, sketch.max) == (1.0, 2.0)
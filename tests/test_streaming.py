@@ -0,0 +1,185 @@
+import asyncio
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import time
+
+import pytest
+
+from monitoring import MetricStatus
+from streaming import StreamClient, SubscriptionServer
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+
+@pytest.fixture
+def sock_path():
+    # tmp_path can exceed the ~100 byte limit of Unix socket paths.
+    directory = tempfile.mkdtemp(prefix="smstream")
+    yield os.path.join(directory, "feed.sock")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def server(sock_path):
+    started = SubscriptionServer(path=sock_path, buffer_size=4)
+    started.start()
+    yield started
+    started.stop()
+
+
+def _status(name, value, state="OK"):
+    return MetricStatus(name, value, "%", state, None, None, None, 10)
+
+
+def _publish(server, ts, values, states=None):
+    states = states or {}
+    raw = {name: (value, "%") for name, value in values.items()}
+    server.publish(ts, raw, [_status(n, v, states.get(n, "OK")) for n, v in values.items()])
+
+
+async def _connect(server, patterns):
+    client = StreamClient(patterns, path=server.path)
+    await client.connect()
+    deadline = time.monotonic() + 5.0
+    while not (server.clients and all(c.patterns for c in server.clients)):
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+    return client
+
+
+async def _frame(client):
+    return await asyncio.wait_for(client.next_frame(), 5.0)
+
+
+def test_subscription_filters_metrics(server):
+    async def run():
+        client = await _connect(server, ["CPU*", "Net Down*"])
+        _publish(server, 1.0, {"CPU (%)": 10.0, "RAM (%)": 50.0, "Net Down (kB/s)": 3.0})
+        frame = await _frame(client)
+        await client.close()
+        return client, frame
+
+    client, frame = asyncio.run(run())
+    assert frame["seq"] == 1 and frame["t"] == 1.0
+    assert sorted(frame["n"].values()) == ["CPU (%)", "Net Down (kB/s)"]
+    assert client.values == {"CPU (%)": 10.0, "Net Down (kB/s)": 3.0}
+    assert client.states == {"CPU (%)": "OK", "Net Down (kB/s)": "OK"}
+
+
+def test_frames_carry_only_changes(server):
+    async def run():
+        client = await _connect(server, ["*"])
+        frames = []
+        _publish(server, 1.0, {"CPU (%)": 10.0, "RAM (%)": 50.0})
+        frames.append(await _frame(client))
+        _publish(server, 2.0, {"CPU (%)": 10.0, "RAM (%)": 50.0})
+        frames.append(await _frame(client))
+        _publish(server, 3.0, {"CPU (%)": 95.0, "RAM (%)": 50.0}, {"CPU (%)": "ALERT"})
+        frames.append(await _frame(client))
+        await client.close()
+        return client, frames
+
+    client, (first, same, changed) = asyncio.run(run())
+    assert len(first["n"]) == 2 and len(first["v"]) == 2 and len(first["s"]) == 2
+    assert same == {"seq": 2, "t": 2.0}
+    cpu = next(mid for mid, name in client.names.items() if name == "CPU (%)")
+    assert "n" not in changed
+    assert changed["v"] == [[cpu, 95.0]]
+    assert changed["s"] == [[cpu, "ALERT"]]
+    assert client.values == {"CPU (%)": 95.0, "RAM (%)": 50.0}
+    assert client.states == {"CPU (%)": "ALERT", "RAM (%)": "OK"}
+
+
+def test_slow_client_drops_oldest_and_converges(server):
+    names = [f"Metric {i:04d} (%)" for i in range(1000)]
+    ticks = 200
+
+    async def run():
+        client = await _connect(server, ["*"])
+        # The client does not read while the ticks arrive, so the socket
+        # buffers fill up and the server-side deque overflows.
+        for tick in range(1, ticks + 1):
+            _publish(server, float(tick), {name: float(tick * 10000 + i) for i, name in enumerate(names)})
+            await asyncio.sleep(0.002)
+        frames = []
+        while not frames or frames[-1]["t"] < ticks:
+            frames.append(await _frame(client))
+        await client.close()
+        return client, frames
+
+    client, frames = asyncio.run(run())
+    assert client.dropped > 0
+    assert len(frames) + client.dropped == ticks
+    assert [f["seq"] for f in frames] == list(range(1, len(frames) + 1))
+    assert client.values == {name: float(ticks * 10000 + i) for i, name in enumerate(names)}
+
+
+def test_over_long_request_disconnects_only_that_client(server, caplog):
+    async def run():
+        reader, writer = await asyncio.open_unix_connection(server.path)
+        # Just over the 64 KiB stream limit.
+        writer.write(b'{"subscribe": ["' + b"x" * (1 << 16) + b'"]}\n')
+        try:
+            await writer.drain()
+            closed = await asyncio.wait_for(reader.read(), 5.0)
+        except ConnectionError:
+            closed = b""  # the server hung up before taking the whole line
+        writer.close()
+
+        client = await _connect(server, ["CPU*"])
+        _publish(server, 1.0, {"CPU (%)": 10.0})
+        frame = await _frame(client)
+        await client.close()
+        return closed, frame
+
+    closed, frame = asyncio.run(run())
+    assert closed == b""
+    assert frame["t"] == 1.0
+    assert not [r for r in caplog.records if r.name == "asyncio"]
+
+
+def test_socket_is_private(server):
+    assert stat.S_IMODE(os.stat(server.path).st_mode) == 0o600
+
+
+def test_live_socket_is_not_taken_over(server):
+    second = SubscriptionServer(path=server.path)
+    with pytest.raises(OSError, match="another instance"):
+        second.start()
+
+    async def run():
+        client = await _connect(server, ["*"])
+        _publish(server, 1.0, {"CPU (%)": 1.0})
+        frame = await _frame(client)
+        await client.close()
+        return frame
+
+    assert asyncio.run(run())["v"] == [[0, 1.0]]
+
+
+def test_stale_socket_is_replaced(sock_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(sock_path)
+    stale.close()
+
+    server = SubscriptionServer(path=sock_path)
+    server.start()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.connect(sock_path)
+    finally:
+        server.stop()
+    assert not os.path.exists(sock_path)
+
+
+def test_regular_file_is_left_alone(sock_path):
+    with open(sock_path, "w") as f:
+        f.write("keep me")
+
+    with pytest.raises(OSError, match="not a socket"):
+        SubscriptionServer(path=sock_path).start()
+    with open(sock_path) as f:
+        assert f.read() == "keep me"
@@ -0,0 +1,178 @@
+import math
+
+import numpy as np
+import pytest
+
+import timeseries
+from timeseries import CompressedSeries, EventHistory, HistoryStore, decode_block, encode_block
+
+
+def _bits(values):
+    return np.asarray(values, dtype=np.float64).view(np.int64).tolist()
+
+
+def _round_trip(ts, values):
+    out_ts, out_vals = decode_block(encode_block(ts, values), len(ts))
+    assert out_ts.tolist() == list(ts)
+    # Bit-exact, so NaN payloads and the sign of zero survive as well.
+    assert _bits(out_vals) == _bits(values)
+
+
+def test_regular_series():
+    ts = [1_700_000_000_000 + 1000 * i for i in range(500)]
+    _round_trip(ts, [20.0 + math.sin(i / 10) for i in range(500)])
+
+
+def test_special_values():
+    values = [1.0, math.nan, math.inf, -math.inf, 0.0, -0.0, 5e-324, 1.7976931348623157e308, math.nan, 1.0]
+    _round_trip([1000 * i for i in range(len(values))], values)
+
+
+def test_repeated_values_compress_to_a_bit_each():
+    ts = [1000 * i for i in range(1000)]
+    data = encode_block(ts, [42.5] * 1000)
+    _round_trip(ts, [42.5] * 1000)
+    # Two 64-bit headers, one bucketed first delta, then a bit per timestamp and value.
+    assert len(data) <= 16 + 2 + 2 * 1000 // 8 + 1
+
+
+@pytest.mark.parametrize("step", [0, 1, 63, 64, 65, 255, 256, 257, 2047, 2048, 2049, 10 ** 6, 10 ** 12])
+def test_delta_of_delta_bucket_edges(step):
+    # Each step change lands on (or just past) the edge of a timestamp bucket.
+    ts = [0, 1000, 2000, 2000 + 1000 + step, 3000 + 2 * (1000 + step), 3000 + 2 * (1000 + step) + 1000]
+    _round_trip(ts, [float(i) for i in range(len(ts))])
+
+
+def test_irregular_and_backwards_timestamps():
+    rng = np.random.default_rng(0)
+    ts = np.cumsum(rng.integers(-5000, 120_000, size=2000)).tolist()
+    values = rng.normal(0.0, 1e6, size=2000).tolist()
+    _round_trip(ts, values)
+
+
+def test_single_sample_block():
+    _round_trip([123], [math.nan])
+
+
+def test_xor_with_full_width_significand():
+    # Values whose XOR has neither leading nor trailing zeros (64 significant bits).
+    a, b = np.array([1, -2], dtype=np.int64).view(np.float64)  # 0x00..01 and 0xFF..FE
+    _round_trip([0, 1, 2, 3], [a, b, a, b])
+
+
+def _series(n, block_size=64, start=1000.0, step=0.5):
+    series = CompressedSeries(block_size=block_size, retention_s=None)
+    ts = start + step * np.arange(n)
+    values = np.where(np.arange(n) % 97 == 0, np.nan, np.sin(np.arange(n) / 7.0))
+    for t, v in zip(ts, values):
+        series.append(float(t), float(v))
+    return series, ts, values
+
+
+def test_series_crosses_block_boundaries():
+    series, ts, values = _series(64 * 3 + 10)
+    assert len(series.blocks) == 3
+    assert len(series) == len(ts)
+
+    out_ts, out_vals = series.to_arrays()
+    assert out_ts.tolist() == ts.tolist()
+    assert _bits(out_vals) == _bits(values)
+    assert series.recent(5) == pytest.approx(values[-5:].tolist())
+
+
+@pytest.mark.parametrize("start, end", [
+    (None, None),
+    (1000.0, 1010.0),
+    (1031.5, 1032.0),   # last sample of a block and first of the next
+    (1031.7, 1031.9),   # between two samples
+    (1080.0, None),     # ends in the uncompressed tail
+    (None, 999.0),      # before everything
+    (2000.0, 3000.0),   # after everything
+])
+def test_range_queries(start, end):
+    series, ts, values = _series(64 * 3 + 10)
+    mask = np.ones(len(ts), dtype=bool)
+    if start is not None:
+        mask &= ts >= start
+    if end is not None:
+        mask &= ts <= end
+
+    out_ts, out_vals = series.to_arrays(start, end)
+    assert out_ts.tolist() == ts[mask].tolist()
+    assert _bits(out_vals) == _bits(values[mask])
+
+
+def test_range_query_skips_blocks_without_decoding(monkeypatch):
+    series, _, _ = _series(64 * 4)
+    decoded = []
+    real = timeseries.decode_block
+    monkeypatch.setattr(timeseries, "decode_block", lambda data, n: decoded.append(n) or real(data, n))
+
+    list(series.iter_blocks(1000.0 + 64 * 0.5 + 1, 1000.0 + 64 * 0.5 + 2))
+    assert decoded == [64]
+
+
+def test_retention_drops_whole_blocks():
+    series = CompressedSeries(block_size=10, retention_s=20.0)
+    for i in range(100):
+        series.append(float(i), float(i))
+    out_ts, _ = series.to_arrays()
+    assert out_ts[0] >= 99 - 20 - 10
+    assert out_ts[-1] == 99.0
+    assert len(series) == len(out_ts)
+
+
+def test_snapshot_is_not_affected_by_later_appends():
+    series, ts, _ = _series(100)
+    copy = series.snapshot()
+    series.append(5000.0, 1.0)
+    assert copy.to_arrays()[0].tolist() == ts.tolist()
+
+
+def test_history_store_keeps_one_series_per_metric():
+    store = HistoryStore(block_size=16, retention_s=None)
+    for i in range(50):
+        metrics = {"CPU (%)": (float(i), "%")}
+        if i % 2:
+            metrics["Disk Read (kB/s)"] = (i * 10.0, "kB/s")
+        store.append_snapshot(100.0 + i, metrics)
+
+    assert store.names() == ["CPU (%)", "Disk Read (kB/s)"]
+    assert store.units == {"CPU (%)": "%", "Disk Read (kB/s)": "kB/s"}
+    ts, values = store.snapshot().series["Disk Read (kB/s)"].to_arrays(110.0, 120.0)
+    assert ts.tolist() == [111.0, 113.0, 115.0, 117.0, 119.0]
+    assert values.tolist() == [110.0, 130.0, 150.0, 170.0, 190.0]
+    assert store.nbytes > 0
+
+
+def _events(n, chunk_size=4, max_events=1000):
+    history = EventHistory(chunk_size=chunk_size, max_events=max_events)
+    for i in range(n):
+        history.append(float(i), "CPU (%)", "WARN", float(i))
+    return history
+
+
+@pytest.mark.parametrize("n", [0, 1, 3, 4, 5, 9, 10, 11, 50])
+def test_event_tail_crosses_chunk_boundaries(n):
+    history = _events(10)
+    assert [r[0] for r in history.tail(n)] == [float(i) for i in range(max(0, 10 - n), 10)]
+
+
+def test_event_tail_of_an_empty_history():
+    assert _events(0).tail(5) == []
+
+
+def test_oldest_event_chunks_are_dropped():
+    history = _events(30, chunk_size=4, max_events=12)
+    assert len(history.chunks) == 3
+    assert len(history) == 10
+    assert [r[0] for r in history.tail(100)] == [float(i) for i in range(20, 30)]
+    assert history.tail(1) == [(29.0, "CPU (%)", "WARN", 29.0)]
+
+
+def test_event_snapshot_is_not_affected_by_later_appends():
+    history = _events(6)
+    chunks = history.snapshot()
+    history.append(6.0, "RAM (%)", "ALERT", 1.0)
+    assert [len(c) for c in chunks] == [4, 2]
+    assert len(history.tail(10)) == 7
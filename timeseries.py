@@ -0,0 +1,378 @@
+import struct
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import EVENT_HISTORY_CHUNK, EVENT_HISTORY_MAX, HISTORY_BLOCK_SIZE, HISTORY_RETENTION_HOURS
+
+_pack_double = struct.Struct(">d").pack
+_unpack_u64 = struct.Struct(">Q").unpack
+
+
+def _f2u(x: float) -> int:
+    return _unpack_u64(_pack_double(x))[0]
+
+
+def _u2f(u: int) -> float:
+    return struct.unpack(">d", u.to_bytes(8, "big"))[0]
+
+
+class BitWriter:
+    """
+    Append-only bit stream. Bits are kept in a small integer accumulator
+    and flushed byte by byte, so writing stays O(1) per call.
+    """
+
+    __slots__ = ("out", "acc", "nbits", "total")
+
+    def __init__(self):
+        self.out = bytearray()
+        self.acc = 0
+        self.nbits = 0
+        self.total = 0
+
+    def write(self, value: int, n: int):
+        self.acc = (self.acc << n) | (value & ((1 << n) - 1))
+        self.nbits += n
+        self.total += n
+        if self.nbits >= 64:
+            out = self.out
+            while self.nbits >= 8:
+                self.nbits -= 8
+                out.append((self.acc >> self.nbits) & 0xFF)
+            self.acc &= (1 << self.nbits) - 1
+
+    def getvalue(self) -> bytes:
+        out = bytearray(self.out)
+        acc, nbits = self.acc, self.nbits
+        while nbits >= 8:
+            nbits -= 8
+            out.append((acc >> nbits) & 0xFF)
+        if nbits:
+            out.append((acc << (8 - nbits)) & 0xFF)
+        return bytes(out)
+
+
+class BitReader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes):
+        # Padding lets read() always slice 9 bytes without bounds checks.
+        self.data = data + b"\0" * 9
+        self.pos = 0
+
+    def read(self, n: int) -> int:
+        pos = self.pos
+        byte = pos >> 3
+        chunk = int.from_bytes(self.data[byte:byte + 9], "big")
+        shift = 72 - (pos & 7) - n
+        self.pos = pos + n
+        return (chunk >> shift) & ((1 << n) - 1)
+
+    def read_bit(self) -> int:
+        pos = self.pos
+        self.pos = pos + 1
+        return (self.data[pos >> 3] >> (7 - (pos & 7))) & 1
+
+
+# (prefix, prefix bits, payload bits) for delta-of-delta timestamp buckets.
+_DOD_BUCKETS = (
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+)
+
+
+def encode_block(timestamps: Sequence[int], values: Sequence[float]) -> bytes:
+    """
+    Gorilla encoding: delta-of-delta millisecond timestamps and XOR-ed
+    float values with leading/trailing zero compression.
+    """
+    w = BitWriter()
+    write = w.write
+
+    t_prev = timestamps[0]
+    v_prev = _f2u(values[0])
+    write(t_prev, 64)
+    write(v_prev, 64)
+
+    delta_prev = 0
+    lead_prev, trail_prev = 65, 0
+
+    for i in range(1, len(timestamps)):
+        t = timestamps[i]
+        delta = t - t_prev
+        dod = delta - delta_prev
+        t_prev, delta_prev = t, delta
+
+        if dod == 0:
+            write(0, 1)
+        else:
+            for prefix, plen, bits in _DOD_BUCKETS:
+                half = 1 << (bits - 1)
+                if -half < dod <= half:
+                    write(prefix, plen)
+                    write(dod + half - 1, bits)
+                    break
+            else:
+                write(0b1111, 4)
+                write(dod, 64)
+
+        v = _f2u(values[i])
+        xor = v ^ v_prev
+        v_prev = v
+
+        if xor == 0:
+            write(0, 1)
+            continue
+
+        lead = min(64 - xor.bit_length(), 31)
+        trail = (xor & -xor).bit_length() - 1
+        if lead >= lead_prev and trail >= trail_prev:
+            write(0b10, 2)
+            write(xor >> trail_prev, 64 - lead_prev - trail_prev)
+        else:
+            sig = 64 - lead - trail
+            write(0b11, 2)
+            write(lead, 5)
+            write(sig & 63, 6)
+            write(xor >> trail, sig)
+            lead_prev, trail_prev = lead, trail
+
+    return w.getvalue()
+
+
+def decode_block(data: bytes, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    ts = np.empty(count, dtype=np.int64)
+    vals = np.empty(count, dtype=np.float64)
+
+    r = BitReader(data)
+    read, read_bit = r.read, r.read_bit
+
+    t = read(64)
+    v = read(64)
+    ts[0] = t
+    vals[0] = _u2f(v)
+
+    delta = 0
+    lead, trail = 0, 0
+
+    for i in range(1, count):
+        if read_bit() == 0:
+            dod = 0
+        elif read_bit() == 0:
+            dod = read(7) - 63
+        elif read_bit() == 0:
+            dod = read(9) - 255
+        elif read_bit() == 0:
+            dod = read(12) - 2047
+        else:
+            dod = read(64)
+            if dod >= 1 << 63:
+                dod -= 1 << 64
+        delta += dod
+        t += delta
+        ts[i] = t
+
+        if read_bit():
+            if read_bit():
+                lead = read(5)
+                sig = read(6) or 64
+                trail = 64 - lead - sig
+            v ^= read(64 - lead - trail) << trail
+        vals[i] = _u2f(v)
+
+    return ts, vals
+
+
+class _Block:
+    __slots__ = ("first_ts", "last_ts", "count", "data")
+
+    def __init__(self, first_ts: int, last_ts: int, count: int, data: bytes):
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+        self.count = count
+        self.data = data
+
+
+class CompressedSeries:
+    """
+    In-memory (timestamp, value) series in Gorilla-compressed blocks.
+
+    The newest samples stay in plain lists until `block_size` is reached and
+    are then sealed into one compressed block. Blocks older than `retention_s`
+    are dropped whole.
+    """
+
+    def __init__(self, block_size: int = HISTORY_BLOCK_SIZE, retention_s: Optional[float] = HISTORY_RETENTION_HOURS * 3600):
+        self.block_size = block_size
+        self.retention_ms = None if retention_s is None else int(retention_s * 1000)
+        self.blocks: List[_Block] = []
+        self._hot_ts: List[int] = []
+        self._hot_vals: List[float] = []
+        self._sealed = 0
+
+    def append(self, timestamp: float, value: float):
+        ts = int(round(timestamp * 1000))
+        self._hot_ts.append(ts)
+        self._hot_vals.append(float(value))
+        if len(self._hot_ts) >= self.block_size:
+            self._seal()
+
+    def _seal(self):
+        ts, vals = self._hot_ts, self._hot_vals
+        self.blocks.append(_Block(ts[0], ts[-1], len(ts), encode_block(ts, vals)))
+        self._sealed += len(ts)
+        self._hot_ts = []
+        self._hot_vals = []
+
+        if self.retention_ms is not None:
+            cutoff = ts[-1] - self.retention_ms
+            while self.blocks and self.blocks[0].last_ts < cutoff:
+                self._sealed -= self.blocks.pop(0).count
+
+    def __len__(self) -> int:
+        return self._sealed + len(self._hot_ts)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(b.data) for b in self.blocks) + 16 * len(self._hot_ts)
+
+    def recent(self, n: int) -> List[float]:
+        """
+        Last `n` values from the uncompressed tail, for hot-path readers.
+        """
+        return self._hot_vals[-n:]
+
+    def iter_blocks(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Decodes one block at a time as (timestamps in s, values) arrays,
+        skipping blocks outside [start, end] without decoding them.
+        """
+        lo = None if start is None else int(start * 1000)
+        hi = None if end is None else int(end * 1000)
+
+        for block in list(self.blocks):
+            if lo is not None and block.last_ts < lo:
+                continue
+            if hi is not None and block.first_ts > hi:
+                break
+            ts, vals = decode_block(block.data, block.count)
+            yield from self._clip(ts, vals, lo, hi)
+
+        if self._hot_ts:
+            ts = np.array(self._hot_ts, dtype=np.int64)
+            vals = np.array(self._hot_vals, dtype=np.float64)
+            yield from self._clip(ts, vals, lo, hi)
+
+    @staticmethod
+    def _clip(ts, vals, lo, hi):
+        if lo is not None or hi is not None:
+            mask = np.ones(len(ts), dtype=bool)
+            if lo is not None:
+                mask &= ts >= lo
+            if hi is not None:
+                mask &= ts <= hi
+            ts, vals = ts[mask], vals[mask]
+        if len(ts):
+            yield ts / 1000.0, vals
+
+    def snapshot(self) -> "CompressedSeries":
+        """
+        Copy that shares the sealed blocks, so readers on other threads can
+        iterate it while this series keeps growing.
+        """
+        copy = CompressedSeries(self.block_size, None)
+        copy.retention_ms = self.retention_ms
+        copy.blocks = list(self.blocks)
+        copy._hot_ts = list(self._hot_ts)
+        copy._hot_vals = list(self._hot_vals)
+        copy._sealed = self._sealed
+        return copy
+
+    def to_arrays(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        parts = list(self.iter_blocks(start, end))
+        if not parts:
+            return np.empty(0), np.empty(0)
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+class HistoryStore:
+    """
+    One CompressedSeries per metric, fed with a full collect() snapshot per tick.
+    """
+
+    def __init__(self, block_size: int = HISTORY_BLOCK_SIZE, retention_s: Optional[float] = HISTORY_RETENTION_HOURS * 3600):
+        self.block_size = block_size
+        self.retention_s = retention_s
+        self.series: Dict[str, CompressedSeries] = {}
+        self.units: Dict[str, str] = {}
+
+    def append_snapshot(self, timestamp: float, metrics: Dict[str, Tuple[float, str]]):
+        series = self.series
+        for name, (value, unit) in metrics.items():
+            s = series.get(name)
+            if s is None:
+                s = series[name] = CompressedSeries(self.block_size, self.retention_s)
+                self.units[name] = unit
+            s.append(timestamp, value)
+
+    def names(self) -> List[str]:
+        return list(self.series)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for s in self.series.values())
+
+    def snapshot(self) -> "HistoryStore":
+        copy = HistoryStore(self.block_size, self.retention_s)
+        copy.series = {name: s.snapshot() for name, s in self.series.items()}
+        copy.units = dict(self.units)
+        return copy
+
+
+class EventHistory:
+    """
+    Append-only (timestamp, metric, state, value) records in fixed-size
+    chunks, independent of the event table that only shows the newest rows.
+    The oldest chunk is dropped once more than `max_events` are held.
+    """
+
+    def __init__(self, chunk_size: int = EVENT_HISTORY_CHUNK, max_events: int = EVENT_HISTORY_MAX):
+        self.chunk_size = chunk_size
+        self.max_chunks = max(1, max_events // chunk_size)
+        self.chunks: List[list] = [[]]
+        self._count = 0
+
+    def append(self, timestamp: float, metric: str, state: str, value: float):
+        chunk = self.chunks[-1]
+        if len(chunk) >= self.chunk_size:
+            chunk = []
+            self.chunks.append(chunk)
+            if len(self.chunks) > self.max_chunks:
+                self._count -= len(self.chunks.pop(0))
+        chunk.append((timestamp, metric, state, value))
+        self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def tail(self, n: int) -> List[tuple]:
+        """
+        The newest `n` records, oldest first.
+        """
+        records: List[tuple] = []
+        for chunk in reversed(self.chunks):
+            if len(records) >= n:
+                break
+            records[:0] = chunk[-(n - len(records)):]
+        return records
+
+    def snapshot(self) -> List[list]:
+        """
+        Chunks as of now. Full chunks are never modified again and are
+        shared; only the open one is copied.
+        """
+        chunks = list(self.chunks)
+        chunks[-1] = list(chunks[-1])
+        return chunks
@@ -1,9 +1,11 @@
+import os
+import time
 import psutil
 from datetime import datetime
 from collections import deque
  
-from PySide6.QtCore import Qt, QTimer
-from PySide6.QtGui import QFont, QColor, QPainter, QPen
+from PySide6.QtCore import Qt, QTimer, Signal, QRectF
+from PySide6.QtGui import QFont, QColor, QPainter, QPen, QImage
 from PySide6.QtWidgets import (
     QWidget,
     QLabel,
@@ -15,9 +17,21 @@ from PySide6.QtWidgets import (
     QTableWidgetItem,
     QHeaderView,
     QAbstractItemView,
+    QComboBox,
+    QSlider,
 )
 
-from config import THEME_TEXT, FONT_FAMILY
+from config import (
+    THEME_TEXT,
+    FONT_FAMILY,
+    EVENTLOG_MAX_ROWS,
+    REPLAY_SPEEDS,
+    HEATMAP_REPAINT_MS,
+    NETATTR_REFRESH_MS,
+    NETATTR_TOP_N,
+)
+from heatmap import HeatmapStore, STATE_WEIGHTS, TOTAL
+from netattr import NetAttribution
 
 class MetricCard(QFrame):
     def __init__(self, title: str, translations: dict, lang: str):
@@ -93,7 +107,11 @@ class MetricCard(QFrame):
         self._apply_state_style(status.state)
 
 class ProcessMonitorWidget(QWidget):
-    def __init__(self):
+    """
+    Top processes by CPU. Scans only while visible, starting when shown.
+    """
+
+    def __init__(self, refresh_ms: int = 3000):
         super().__init__()
 
         layout = QVBoxLayout()
@@ -125,9 +143,9 @@ class ProcessMonitorWidget(QWidget):
         layout.addWidget(self.table)
         self.setLayout(layout)
 
+        self.refresh_ms = refresh_ms
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_processes)
-        self.timer.start(3000)
 
     def update_processes(self):
         processes = []
@@ -180,21 +198,38 @@ class ProcessMonitorWidget(QWidget):
         except Exception as e:
             QMessageBox.warning(self, "Fehler", f"Prozess konnte nicht beendet werden:\n{e}")
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_processes()
+        self.timer.start(self.refresh_ms)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
+
 class LiveGraphWidget(QWidget):
     def __init__(self, color: QColor = QColor("#10b981")):
         super().__init__()
         self.values = deque(maxlen=60)
         self.color = color
+        self.profiler = None
         self.setMinimumHeight(80)
 
-    def add_value(self, v: float):
+    def add_value(self, v: float, repaint: bool = True):
         self.values.append(v)
-        self.update()
+        if repaint:
+            self.update()
 
     def paintEvent(self, event):
         if not self.values:
             return
 
+        start = time.perf_counter_ns()
+        self._paint_graph()
+        if self.profiler is not None:
+            self.profiler.record("repaint", time.perf_counter_ns() - start)
+
+    def _paint_graph(self):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
         pen = QPen(self.color, 2)
@@ -213,46 +248,209 @@ class LiveGraphWidget(QWidget):
         for i in range(len(points) - 1):
             painter.drawLine(points[i][0], points[i][1], points[i + 1][0], points[i + 1][1])
 
+# Continuous scale from a dim amber through amber (WARN) to red (ALERT);
+# empty cells keep the previous background color.
+_HEAT_EMPTY = QColor("#111827")
+_HEAT_STOPS = ((0.0, (0x3b, 0x2f, 0x1e)), (0.5, (0xfb, 0xbf, 0x24)), (1.0, (0xef, 0x44, 0x44)))
+
+
+def _build_heat_lut(stops, size: int = 256):
+    lut = []
+    for i in range(size):
+        x = i / (size - 1)
+        for (x0, c0), (x1, c1) in zip(stops, stops[1:]):
+            if x <= x1:
+                f = (x - x0) / (x1 - x0)
+                lut.append(QColor(*(round(a + (b - a) * f) for a, b in zip(c0, c1))))
+                break
+    return lut
+
+
+_HEAT_LUT = _build_heat_lut(_HEAT_STOPS)
+
+
+def _heat_color(level: float) -> QColor:
+    if level <= 0:
+        return _HEAT_EMPTY
+    return _HEAT_LUT[min(255, int(level * 255))]
+
+
 class HeatmapWidget(QWidget):
-    def __init__(self):
+    """
+    Shows one row of a HeatmapStore (all metrics by default) on a continuous
+    color scale. Cells are drawn into a cached QImage that is rebuilt only
+    when the shown row or the widget size changes, and repaints requested by
+    new events are throttled to one per `repaint_ms`.
+    """
+
+    metrics_changed = Signal()
+
+    def __init__(self, store: HeatmapStore = None, repaint_ms: int = HEATMAP_REPAINT_MS):
         super().__init__()
         self.setMinimumHeight(160)
-        self.data = [[0 for _ in range(24)] for _ in range(7)]
+        self.store = store if store is not None else HeatmapStore()
+        self.selected_metric = TOTAL
+        self.repaint_ms = repaint_ms
+        self.profiler = None
+        self._image = None
+        self._image_key = None
+        self._repaint_pending = False
+        self._known_metrics = len(self.store.names)
+
+    def set_store(self, store: HeatmapStore):
+        self.store = store
+        self._image_key = None
+        self._known_metrics = len(store.names)
+        self.metrics_changed.emit()
+        self.update()
 
-    def add_event(self, state: str):
-        now = datetime.now()
-        day = now.weekday()
-        hour = now.hour
+    def set_metric(self, metric: str):
+        if metric != self.selected_metric:
+            self.selected_metric = metric
+            self.update()
 
-        if state == "WARN":
-            self.data[day][hour] += 1
-        elif state == "ALERT":
-            self.data[day][hour] += 2
+    def add_event(self, state: str, timestamp: float = None, repaint: bool = True, metric: str = None):
+        weight = STATE_WEIGHTS.get(state)
+        if weight is None:
+            return
+        self.store.add(metric, weight, timestamp)
 
+        if len(self.store.names) != self._known_metrics:
+            self._known_metrics = len(self.store.names)
+            self.metrics_changed.emit()
+
+        if repaint and not self._repaint_pending and self.selected_metric in (TOTAL, metric):
+            self._repaint_pending = True
+            QTimer.singleShot(self.repaint_ms, self._throttled_repaint)
+
+    def _throttled_repaint(self):
+        self._repaint_pending = False
         self.update()
 
     def paintEvent(self, event):
+        start = time.perf_counter_ns()
+        key = (self.selected_metric, self.store.version(self.selected_metric), self.width(), self.height())
+        if key != self._image_key:
+            self._image = self._render_image()
+            self._image_key = key
         painter = QPainter(self)
+        painter.drawImage(0, 0, self._image)
+        painter.end()
+        if self.profiler is not None:
+            self.profiler.record("repaint", time.perf_counter_ns() - start)
+
+    def _render_image(self) -> QImage:
+        image = QImage(self.size(), QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
         w = self.width() / 24
         h = self.height() / 7
 
+        levels = self.store.relative(self.selected_metric)
         for d in range(7):
             for h_i in range(24):
-                val = self.data[d][h_i]
+                painter.fillRect(QRectF(h_i * w, d * h, w - 1, h - 1), _heat_color(levels[d, h_i]))
+        painter.end()
+        return image
 
-                if val == 0:
-                    color = QColor("#111827")
-                elif val == 1:
-                    color = QColor("#fbbf24")
-                else:
-                    color = QColor("#ef4444")
 
-                painter.fillRect(h_i * w, d * h, w - 1, h - 1, color)
+class NetworkProcessWidget(QWidget):
+    """
+    Per-process sockets and TCP throughput from NetAttribution (Linux only).
+    Refreshes only while visible.
+    """
+
+    def __init__(self, translations: dict, lang: str, refresh_ms: int = NETATTR_REFRESH_MS, top_n: int = NETATTR_TOP_N):
+        super().__init__()
+
+        self.translations = translations
+        self.lang = lang
+        self.top_n = top_n
+        self.attribution = NetAttribution() if os.path.isdir("/proc/net") else None
+
+        layout = QVBoxLayout()
+        layout.setSpacing(6)
+
+        self.title_label = QLabel("")
+        self.title_label.setFont(QFont(FONT_FAMILY, 10, QFont.Bold))
+        self.summary_label = QLabel("")
+
+        self.table = QTableWidget(0, 8)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        layout.addWidget(self.title_label)
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+        self.update_language(lang)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        if self.attribution is not None:
+            self.timer.start(refresh_ms)
+
+    def update_language(self, lang: str):
+        self.lang = lang
+        tr = self.translations[self.lang]
+        self.title_label.setText(tr["netproc_title"])
+        self.table.setHorizontalHeaderLabels(
+            ["PID", "Name", "Up (kB/s)", "Down (kB/s)", "TCP", "UDP", "Listen", tr["netproc_queue"]]
+        )
+        if self.attribution is None:
+            self.summary_label.setText(tr["netproc_unavailable"])
+
+    def _set(self, row: int, col: int, text: str):
+        item = self.table.item(row, col)
+        if item is None:
+            item = QTableWidgetItem()
+            self.table.setItem(row, col, item)
+        if item.text() != text:
+            item.setText(text)
+
+    def refresh(self):
+        if self.attribution is None or not self.isVisible():
+            return
+        tr = self.translations[self.lang]
+        usage = self.attribution.refresh()
+
+        sockets = len(self.attribution.sockets)
+        owned = len(self.attribution.owner)
+        self.summary_label.setText(tr["netproc_summary"].format(
+            sockets=sockets, owned=owned, processes=sum(1 for u in usage if u.pid),
+        ))
+
+        rows = usage[:self.top_n]
+        self.table.setRowCount(len(rows))
+        for row, u in enumerate(rows):
+            self._set(row, 0, str(u.pid) if u.pid else "–")
+            self._set(row, 1, u.name if u.pid else tr["netproc_unattributed"])
+            self._set(row, 2, "–" if u.up_kbs is None else f"{u.up_kbs:.1f}")
+            self._set(row, 3, "–" if u.down_kbs is None else f"{u.down_kbs:.1f}")
+            self._set(row, 4, str(u.tcp))
+            self._set(row, 5, str(u.udp))
+            self._set(row, 6, str(u.listen))
+            self._set(row, 7, f"{u.tx_queue} / {u.rx_queue}")
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+
 
 class EventLogWidget(QWidget):
-    def __init__(self):
+    """
+    Events are buffered and inserted in one batch per event-loop pass, so a
+    burst (e.g. a fast replay) costs one table update instead of one per row.
+    Only the newest `max_rows` rows are kept.
+    """
+
+    def __init__(self, max_rows: int = EVENTLOG_MAX_ROWS):
         super().__init__()
 
+        self.max_rows = max_rows
+        self._pending = []
+
         layout = QVBoxLayout()
 
         self.table = QTableWidget(0, 4)
@@ -262,16 +460,43 @@ class EventLogWidget(QWidget):
         layout.addWidget(self.table)
         self.setLayout(layout)
 
-    def add_event(self, metric_name: str, state: str, value: float):
-        row = self.table.rowCount()
-        self.table.insertRow(row)
+    def add_event(self, metric_name: str, state: str, value: float, timestamp: float = None):
+        when = datetime.now() if timestamp is None else datetime.fromtimestamp(timestamp)
+        if not self._pending:
+            QTimer.singleShot(0, self._flush)
+        self._pending.append((when.strftime("%Y-%m-%d %H:%M:%S"), metric_name, state, f"{value:.2f}"))
 
-        self.table.setItem(row, 0, QTableWidgetItem(datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        self.table.setItem(row, 1, QTableWidgetItem(metric_name))
-        self.table.setItem(row, 2, QTableWidgetItem(state))
-        self.table.setItem(row, 3, QTableWidgetItem(f"{value:.2f}"))
+    def _flush(self):
+        pending = self._pending[-self.max_rows:]
+        self._pending = []
+        if not pending:
+            return
+
+        table = self.table
+        table.setUpdatesEnabled(False)
+        overflow = table.rowCount() + len(pending) - self.max_rows
+        if overflow > 0:
+            table.model().removeRows(0, min(overflow, table.rowCount()))
+
+        row = table.rowCount()
+        table.setRowCount(row + len(pending))
+        for offset, texts in enumerate(pending):
+            for col, text in enumerate(texts):
+                table.setItem(row + offset, col, QTableWidgetItem(text))
+        table.setUpdatesEnabled(True)
+
+    def clear(self):
+        self._pending = []
+        self.table.setRowCount(0)
+
+    def set_events(self, events):
+        self.clear()
+        for e in events:
+            self._pending.append((e["timestamp"], e["metric"], e["status"], f"{e['value']:.2f}"))
+        self._flush()
 
     def get_events(self):
+        self._flush()
         events = []
         rows = self.table.rowCount()
 
@@ -283,4 +508,257 @@ class EventLogWidget(QWidget):
                 "value": float(self.table.item(r, 3).text().replace(",", ".")),
             })
 
-        return events
\ No newline at end of file
+        return events
+
+class DiagnosticsWidget(QWidget):
+    """
+    Shows per-stage tick timings from a TickProfiler and the
+    resource usage of the monitor process itself.
+    """
+
+    COLUMNS = ("last_ms", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+    def __init__(self, translations: dict, lang: str):
+        super().__init__()
+
+        self.translations = translations
+        self.lang = lang
+
+        layout = QVBoxLayout()
+        layout.setSpacing(6)
+
+        self.self_label = QLabel("")
+        self.self_label.setFont(QFont(FONT_FAMILY, 10, QFont.Bold))
+
+        self.table = QTableWidget(0, len(self.COLUMNS) + 2)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        layout.addWidget(self.self_label)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+        self.update_language(lang)
+
+    def update_language(self, lang: str):
+        self.lang = lang
+        tr = self.translations[self.lang]
+        self.table.setHorizontalHeaderLabels([
+            tr["diag_stage"],
+            tr["diag_count"],
+            "Last (ms)",
+            "Mean (ms)",
+            "p50 (ms)",
+            "p95 (ms)",
+            "p99 (ms)",
+            "Max (ms)",
+        ])
+
+    def update_diagnostics(self, summary: dict, self_cpu: float, self_rss_mb: float):
+        tr = self.translations[self.lang]
+        self.self_label.setText(tr["diag_self"].format(cpu=self_cpu, rss=self_rss_mb))
+
+        self.table.setRowCount(len(summary))
+        for row, (stage, stats) in enumerate(summary.items()):
+            self.table.setItem(row, 0, QTableWidgetItem(stage))
+            self.table.setItem(row, 1, QTableWidgetItem(str(stats["count"])))
+            for col, key in enumerate(self.COLUMNS, start=2):
+                val = stats[key]
+                self.table.setItem(row, col, QTableWidgetItem("–" if val is None else f"{val:.3f}"))
+
+
+class FleetWidget(QWidget):
+    """
+    One row per remote host reported by the aggregator.
+    Table items are reused between refreshes to keep large fleets cheap.
+    """
+
+    METRIC_COLUMNS = ("CPU (%)", "RAM (%)", "Disk (%)", "Net Up (kB/s)", "Net Down (kB/s)")
+    STATE_COLORS = {
+        "OK": "#10b981",
+        "STABLE": "#10b981",
+        "WARN": "#fbbf24",
+        "ALERT": "#ef4444",
+    }
+
+    def __init__(self, translations: dict, lang: str):
+        super().__init__()
+
+        self.translations = translations
+        self.lang = lang
+
+        layout = QVBoxLayout()
+        self.summary_label = QLabel("")
+        self.summary_label.setFont(QFont(FONT_FAMILY, 10, QFont.Bold))
+
+        self.table = QTableWidget(0, 4 + len(self.METRIC_COLUMNS))
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+        self.update_language(lang)
+
+    def update_language(self, lang: str):
+        self.lang = lang
+        tr = self.translations[self.lang]
+        self.table.setHorizontalHeaderLabels(
+            [tr["fleet_host"], tr["status_label"], tr["fleet_last_seen"]]
+            + list(self.METRIC_COLUMNS)
+            + [tr["fleet_forecast"]]
+        )
+
+    def _set(self, row: int, col: int, text: str, color: str = None):
+        item = self.table.item(row, col)
+        if item is None:
+            item = QTableWidgetItem()
+            self.table.setItem(row, col, item)
+        if item.text() != text:
+            item.setText(text)
+        if color is not None:
+            item.setForeground(QColor(color))
+
+    def update_fleet(self, results: dict, now: float, stale_after: float):
+        tr = self.translations[self.lang]
+        severity = {"ALERT": 0, "WARN": 1, "LEARN": 2, "OK": 3, "STABLE": 4}
+
+        rows = []
+        for host, result in results.items():
+            state = result.worst_state
+            if now - result.timestamp > stale_after:
+                state = "OFFLINE"
+            rows.append((severity.get(state, -1), host, state, result))
+        rows.sort()
+
+        counts = {}
+        for _, _, state, _ in rows:
+            counts[state] = counts.get(state, 0) + 1
+        self.summary_label.setText(tr["fleet_summary"].format(
+            hosts=len(rows),
+            alert=counts.get("ALERT", 0),
+            warn=counts.get("WARN", 0),
+            offline=counts.get("OFFLINE", 0),
+        ))
+
+        self.table.setRowCount(len(rows))
+        for row, (_, host, state, result) in enumerate(rows):
+            values = {s.name: s.value for s in result.statuses}
+            self._set(row, 0, host)
+            self._set(row, 1, tr["fleet_offline"] if state == "OFFLINE" else state,
+                      self.STATE_COLORS.get(state, "#6b7280"))
+            self._set(row, 2, f"{max(0.0, now - result.timestamp):.0f} s")
+            for col, name in enumerate(self.METRIC_COLUMNS, start=3):
+                val = values.get(name)
+                self._set(row, col, "–" if val is None else f"{val:.1f}")
+            soonest = [m for m in result.forecasts.values() if m is not None]
+            self._set(row, 3 + len(self.METRIC_COLUMNS),
+                      f"{min(soonest):.1f} min" if soonest else "–")
+
+
+class ReplayBar(QWidget):
+    """
+    Transport controls for replay mode: play/pause, speed, a seek slider
+    over the capture's time range and a button back to live data.
+    """
+
+    play_toggled = Signal(bool)
+    speed_changed = Signal(float)
+    seek_requested = Signal(float)
+    exit_requested = Signal()
+
+    STEPS = 10000
+
+    def __init__(self, translations: dict, lang: str):
+        super().__init__()
+
+        self.translations = translations
+        self.lang = lang
+        self.playing = False
+        self.start_ts = 0.0
+        self.end_ts = 0.0
+        self.name = ""
+
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.title_label = QLabel("")
+        self.title_label.setFont(QFont(FONT_FAMILY, 9, QFont.Bold))
+
+        self.play_button = QPushButton("")
+        self.play_button.clicked.connect(self._on_play_clicked)
+
+        self.speed_combo = QComboBox()
+        for speed in REPLAY_SPEEDS:
+            self.speed_combo.addItem(f"{speed:g}×", userData=float(speed))
+        self.speed_combo.currentIndexChanged.connect(
+            lambda i: self.speed_changed.emit(self.speed_combo.itemData(i))
+        )
+
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setRange(0, self.STEPS)
+        self.slider.sliderReleased.connect(self._on_slider_released)
+        self.slider.actionTriggered.connect(self._on_slider_action)
+
+        self.time_label = QLabel("")
+        self.time_label.setFont(QFont(FONT_FAMILY, 9))
+
+        self.live_button = QPushButton("")
+        self.live_button.clicked.connect(self.exit_requested.emit)
+
+        layout.addWidget(self.title_label)
+        layout.addWidget(self.play_button)
+        layout.addWidget(self.speed_combo)
+        layout.addWidget(self.slider, 1)
+        layout.addWidget(self.time_label)
+        layout.addWidget(self.live_button)
+        self.setLayout(layout)
+
+        self.update_language(lang)
+
+    @property
+    def speed(self) -> float:
+        return self.speed_combo.currentData()
+
+    def update_language(self, lang: str):
+        self.lang = lang
+        tr = self.translations[self.lang]
+        self.title_label.setText(tr["replay_title"].format(name=self.name))
+        self.play_button.setText(tr["replay_pause"] if self.playing else tr["replay_play"])
+        self.live_button.setText(tr["replay_live"])
+
+    def set_capture(self, name: str, start_ts: float, end_ts: float):
+        self.name = name
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.update_language(self.lang)
+        self.set_position(start_ts)
+
+    def set_playing(self, playing: bool):
+        self.playing = playing
+        self.update_language(self.lang)
+
+    def set_position(self, ts: float):
+        if not self.slider.isSliderDown():
+            span = self.end_ts - self.start_ts
+            step = int((ts - self.start_ts) / span * self.STEPS) if span > 0 else 0
+            self.slider.blockSignals(True)
+            self.slider.setValue(step)
+            self.slider.blockSignals(False)
+        self.time_label.setText(datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"))
+
+    def _slider_ts(self) -> float:
+        return self.start_ts + (self.end_ts - self.start_ts) * self.slider.sliderPosition() / self.STEPS
+
+    def _on_play_clicked(self):
+        self.set_playing(not self.playing)
+        self.play_toggled.emit(self.playing)
+
+    def _on_slider_released(self):
+        self.seek_requested.emit(self._slider_ts())
+
+    def _on_slider_action(self, action: int):
+        # Clicks on the groove and keyboard steps; drags seek on release.
+        if not self.slider.isSliderDown():
+            self.seek_requested.emit(self._slider_ts())
@@ -1,9 +1,9 @@
 import os
 import sys
-import json
-import webbrowser
 import platform
+import time
 from collections import defaultdict, deque
+from contextlib import contextmanager
 from datetime import datetime
  
 from PySide6.QtCore import Qt, QTimer
@@ -19,6 +19,7 @@ from PySide6.QtWidgets import (
     QMessageBox,
     QCheckBox,
     QFileDialog,
+    QProgressDialog,
 )
 
 from config import (
@@ -29,6 +30,15 @@ from config import (
     APP_AUTHOR,
     GITHUB_URL,
     UPDATE_INTERVAL_MS,
+    ADAPTIVE_SAMPLING,
+    MULTIVARIATE_ENABLED,
+    HISTORY_ENABLED,
+    FLEET_STALE_S,
+    REPLAY_FRAME_MS,
+    EVENTLOG_MAX_ROWS,
+    HEATMAP_STORE_PATH,
+    HEATMAP_SAVE_INTERVAL_MS,
+    EXPORT_PROGRESS_MS,
     THEME_BACKGROUND,
     THEME_TEXT,
     FONT_FAMILY,
@@ -38,13 +48,29 @@ from config import (
     NEON_SECONDARY,
     AUTOSTART_REG_NAME,
 )
-from monitoring import SystemMonitorBackend, AnomalyDetector, MetricStatus
+from monitoring import (
+    SystemMonitorBackend,
+    AnomalyDetector,
+    MultivariateDetector,
+    MultivariateStatus,
+    AdaptiveSampler,
+    MetricStatus,
+    forecast_high_load_minutes,
+    multivariate_values,
+)
+from instrumentation import PublishErrors, SelfUsage, TickProfiler
+from timeseries import EventHistory, HistoryStore
+from heatmap import HeatmapStore, STATE_WEIGHTS, TOTAL
 from ui_components import (
     MetricCard,
     ProcessMonitorWidget,
+    NetworkProcessWidget,
     LiveGraphWidget,
     HeatmapWidget,
     EventLogWidget,
+    DiagnosticsWidget,
+    FleetWidget,
+    ReplayBar,
 )
 
 def is_autostart_enabled() -> bool:
@@ -104,11 +130,14 @@ TRANSLATIONS = {
         "tab_processes": "Prozesse",
         "tab_analytics": "Analytics",
         "tab_settings": "Einstellungen",
+        "tab_diagnostics": "Diagnose",
+        "tab_fleet": "Flotte",
         "metric_cpu": "CPU-Auslastung",
         "metric_ram": "RAM-Nutzung",
         "metric_disk": "Festplatten-Auslastung",
         "metric_net_up": "Netzwerk Upload",
         "metric_net_down": "Netzwerk Download",
+        "metric_multivariate": "Multivariate Anomalie",
         "status_label": "Status",
         "prediction_high_load": "Hohe Last erwartet in ca. {minutes:.1f} Minuten.",
         "prediction_normal": "Keine erhöhte Last im Prognosefenster (bis 30 Minuten) erwartet.",
@@ -120,8 +149,13 @@ TRANSLATIONS = {
         "btn_info_tooltip": "Informationen zu dieser Anwendung",
         "btn_profile": "Profiling 60s",
         "btn_profile_tooltip": "60 Sekunden Diagnose-Profiling starten",
-        "btn_export": "Export (JSON)",
-        "btn_export_tooltip": "Event-Log als JSON exportieren",
+        "btn_export": "Export",
+        "btn_export_tooltip": "Event-Log und Metrik-Verlauf exportieren (NDJSON, CSV, JSON, optional gzip)",
+        "export_filter": "NDJSON (*.ndjson);;NDJSON gzip (*.ndjson.gz);;CSV (*.csv);;CSV gzip (*.csv.gz);;JSON (*.json)",
+        "export_progress": "Exportiere {written:,} von {total:,} Zeilen …",
+        "export_cancel": "Abbrechen",
+        "btn_replay": "Replay",
+        "btn_replay_tooltip": "Aufzeichnung laden und im Dashboard abspielen",
         "info_title": "Über diese Anwendung",
         "info_text": (
             f"{APP_TITLE}\n\n"
@@ -141,14 +175,41 @@ TRANSLATIONS = {
         "state_WARN": "Erhöhte Abweichung vom Normalbereich (z≈{z:.2f}, Ø={mean:.2f}, σ={stdev:.2f}).",
         "state_ALERT": "Starke Abweichung vom Normalbereich – mögliche Anomalie (z≈{z:.2f}, Ø={mean:.2f}, σ={stdev:.2f}).",
         "state_UNKNOWN": "Status nicht verfügbar.",
+        "pct_details": " Langzeit-Perzentile: p50={p50:.2f}, p95={p95:.2f}, p99={p99:.2f} → {state}.",
+        "mv_details": "Mahalanobis-Distanz {d:.2f} (z≈{z:.2f}). Größte Beiträge: {top}",
+        "mv_learn": "KI lernt die Kovarianz aller Metriken (Messwerte: {samples}).",
         "heatmap_title": "AI-Anomalie-Heatmap (Wochentag × Stunde)",
+        "heatmap_metric_label": "Metrik:",
+        "heatmap_all": "Alle Metriken",
         "eventlog_title": "AI-Event-Log (WARN/ALERT)",
         "settings_autostart": "Beim Systemstart automatisch starten (Windows)",
         "settings_neon": "Dark-Neon BYLICKILABS Mode aktivieren",
+        "settings_adaptive": "Adaptives Abtastintervall (länger bei Ruhe, schneller bei WARN/ALERT)",
         "msg_profile_done_title": "Profiling abgeschlossen",
         "msg_profile_done_text": "60 Sekunden Profiling abgeschlossen. Ergebnis wurde als JSON gespeichert.",
         "msg_export_success": "Export erfolgreich",
         "msg_export_error": "Fehler beim Export",
+        "msg_export_empty": "Keine Events zum Export vorhanden.",
+        "msg_export_cancelled": "Export abgebrochen",
+        "diag_stage": "Phase",
+        "diag_count": "Ticks",
+        "diag_self": "Eigenverbrauch des Monitors: CPU {cpu:.1f} % · RSS {rss:.1f} MB",
+        "netproc_title": "Netzwerk nach Prozess",
+        "netproc_queue": "Warteschlange Tx / Rx (B)",
+        "netproc_summary": "{sockets} Sockets · {owned} zugeordnet · {processes} Prozesse",
+        "netproc_unattributed": "(nicht zugeordnet)",
+        "netproc_unavailable": "Nur unter Linux verfügbar (/proc/net).",
+        "fleet_host": "Host",
+        "fleet_last_seen": "Zuletzt gesehen",
+        "fleet_forecast": "Hohe Last in",
+        "fleet_offline": "OFFLINE",
+        "fleet_summary": "{hosts} Hosts · {alert} ALERT · {warn} WARN · {offline} offline",
+        "replay_title": "Replay: {name}",
+        "replay_play": "Abspielen",
+        "replay_pause": "Pause",
+        "replay_live": "Zurück zu Live",
+        "replay_open_filter": "Aufzeichnungen (*.smcap)",
+        "msg_replay_error": "Aufzeichnung konnte nicht geladen werden",
     },
     "en": {
         "title_bar": f"{APP_TITLE} – {APP_COMPANY}",
@@ -158,11 +219,14 @@ TRANSLATIONS = {
         "tab_processes": "Processes",
         "tab_analytics": "Analytics",
         "tab_settings": "Settings",
+        "tab_diagnostics": "Diagnostics",
+        "tab_fleet": "Fleet",
         "metric_cpu": "CPU Utilization",
         "metric_ram": "RAM Usage",
         "metric_disk": "Disk Usage",
         "metric_net_up": "Network Upload",
         "metric_net_down": "Network Download",
+        "metric_multivariate": "Multivariate Anomaly",
         "status_label": "Status",
         "prediction_high_load": "High load expected in approx. {minutes:.1f} minutes.",
         "prediction_normal": "No increased load expected within the forecast window (up to 30 minutes).",
@@ -174,8 +238,13 @@ TRANSLATIONS = {
         "btn_info_tooltip": "Information about this application",
         "btn_profile": "Profiling 60s",
         "btn_profile_tooltip": "Start 60 seconds diagnostic profiling",
-        "btn_export": "Export (JSON)",
-        "btn_export_tooltip": "Export event log as JSON",
+        "btn_export": "Export",
+        "btn_export_tooltip": "Export event log and metric history (NDJSON, CSV, JSON, optionally gzip)",
+        "export_filter": "NDJSON (*.ndjson);;NDJSON gzip (*.ndjson.gz);;CSV (*.csv);;CSV gzip (*.csv.gz);;JSON (*.json)",
+        "export_progress": "Exporting {written:,} of {total:,} rows …",
+        "export_cancel": "Cancel",
+        "btn_replay": "Replay",
+        "btn_replay_tooltip": "Load a recording and play it back in the dashboard",
         "info_title": "About this application",
         "info_text": (
             f"{APP_TITLE}\n\n"
@@ -195,35 +264,83 @@ TRANSLATIONS = {
         "state_WARN": "Increased deviation from normal range (z≈{z:.2f}, µ={mean:.2f}, σ={stdev:.2f}).",
         "state_ALERT": "Strong deviation from normal range – potential anomaly (z≈{z:.2f}, µ={mean:.2f}, σ={stdev:.2f}).",
         "state_UNKNOWN": "Status not available.",
+        "pct_details": " Long-term percentiles: p50={p50:.2f}, p95={p95:.2f}, p99={p99:.2f} → {state}.",
+        "mv_details": "Mahalanobis distance {d:.2f} (z≈{z:.2f}). Top contributors: {top}",
+        "mv_learn": "AI is learning the covariance of all metrics (samples: {samples}).",
         "heatmap_title": "AI anomaly heatmap (weekday × hour)",
+        "heatmap_metric_label": "Metric:",
+        "heatmap_all": "All metrics",
         "eventlog_title": "AI event log (WARN/ALERT)",
         "settings_autostart": "Start automatically with system boot (Windows)",
         "settings_neon": "Enable dark neon BYLICKILABS mode",
+        "settings_adaptive": "Adaptive sampling interval (slower when calm, faster on WARN/ALERT)",
         "msg_profile_done_title": "Profiling completed",
         "msg_profile_done_text": "60 seconds profiling completed. Result has been saved as JSON.",
         "msg_export_success": "Export successful",
         "msg_export_error": "Error during export",
+        "msg_export_empty": "No events to export.",
+        "msg_export_cancelled": "Export cancelled",
+        "diag_stage": "Stage",
+        "diag_count": "Ticks",
+        "diag_self": "Monitor overhead: CPU {cpu:.1f} % · RSS {rss:.1f} MB",
+        "netproc_title": "Network by process",
+        "netproc_queue": "Queue Tx / Rx (B)",
+        "netproc_summary": "{sockets} sockets · {owned} attributed · {processes} processes",
+        "netproc_unattributed": "(unattributed)",
+        "netproc_unavailable": "Only available on Linux (/proc/net).",
+        "fleet_host": "Host",
+        "fleet_last_seen": "Last seen",
+        "fleet_forecast": "High load in",
+        "fleet_offline": "OFFLINE",
+        "fleet_summary": "{hosts} hosts · {alert} ALERT · {warn} WARN · {offline} offline",
+        "replay_title": "Replay: {name}",
+        "replay_play": "Play",
+        "replay_pause": "Pause",
+        "replay_live": "Back to live",
+        "replay_open_filter": "Recordings (*.smcap)",
+        "msg_replay_error": "Could not load recording",
     },
 }
 
 
 class SystemMonitorUI(QWidget):
-    def __init__(self):
+    def __init__(self, publishers=(), aggregator=None, backend=None, rules=None, self_usage=None):
         super().__init__()
 
-        self.backend = SystemMonitorBackend()
+        self.backend = backend if backend is not None else SystemMonitorBackend()
         self.detector = AnomalyDetector()
+        self.mv_detector = MultivariateDetector() if MULTIVARIATE_ENABLED else None
+        self.profiler = TickProfiler()
+        self.self_usage = self_usage if self_usage is not None else SelfUsage()
+        self.sampler = AdaptiveSampler()
+        self.adaptive_enabled = ADAPTIVE_SAMPLING
+        self.publishers = list(publishers)
+        self.publish_errors = PublishErrors()
+        self.aggregator = aggregator
+        self.rules = rules
+        self.rule_state = rules.new_state() if rules is not None else None
 
         self.current_lang = "de"
         self.t = TRANSLATIONS
 
         self.history_for_forecast = defaultdict(lambda: deque(maxlen=60))
+        self.history_store = HistoryStore() if HISTORY_ENABLED else None
+        self.event_history = EventHistory()
+        self.heatmap_store = HeatmapStore.load(HEATMAP_STORE_PATH)
+        self.export_job = None
 
         self.profiling_active = False
         self.profiling_data = []
 
         self.neon_enabled = False
 
+        # While a replay is open, the live models above keep running and
+        # publishing; cards, graphs, heatmap and event log show the replay.
+        self.replay = None
+        self.replay_playing = False
+        self._replay_models = None
+        self._live_graphs = None
+
         self.setWindowTitle(f"{APP_NAME} v{APP_VERSION}")
         self.setMinimumSize(1024, 640)
 
@@ -270,34 +387,67 @@ class SystemMonitorUI(QWidget):
         self.export_button.setToolTip(self.t[self.current_lang]["btn_export_tooltip"])
         self.export_button.clicked.connect(self._on_export_clicked)
 
+        self.replay_button = QPushButton(self.t[self.current_lang]["btn_replay"])
+        self.replay_button.setToolTip(self.t[self.current_lang]["btn_replay_tooltip"])
+        self.replay_button.clicked.connect(self._on_replay_clicked)
+
         top_bar.addWidget(self.lang_label)
         top_bar.addWidget(self.lang_combo)
         top_bar.addWidget(self.github_button)
         top_bar.addWidget(self.info_button)
         top_bar.addWidget(self.profile_button)
         top_bar.addWidget(self.export_button)
+        top_bar.addWidget(self.replay_button)
 
         self.tagline_label = QLabel(self.t[self.current_lang]["tagline"])
         self.tagline_label.setFont(QFont(FONT_FAMILY, 9))
 
+        self.replay_bar = ReplayBar(TRANSLATIONS, self.current_lang)
+        self.replay_bar.play_toggled.connect(self._on_replay_play_toggled)
+        self.replay_bar.seek_requested.connect(self._on_replay_seek)
+        self.replay_bar.exit_requested.connect(self.stop_replay)
+        self.replay_bar.hide()
+
+        self.replay_timer = QTimer(self)
+        self.replay_timer.timeout.connect(self._replay_frame)
+
+        self.heatmap_save_timer = QTimer(self)
+        self.heatmap_save_timer.timeout.connect(self._save_heatmap)
+        self.heatmap_save_timer.start(HEATMAP_SAVE_INTERVAL_MS)
+
         self.tab_widget = QTabWidget()
 
         self.dashboard_tab = QWidget()
         self._build_dashboard_tab()
 
+        # The other tabs are filled in on first activation (_ensure_tab), so
+        # startup only pays for what the first frame shows.
         self.process_tab = QWidget()
-        self._build_process_tab()
-
         self.analytics_tab = QWidget()
-        self._build_analytics_tab()
-
         self.settings_tab = QWidget()
-        self._build_settings_tab()
+        self.diagnostics_tab = QWidget()
+        self.heatmap_widget = None
+        self.eventlog_widget = None
+        self._tab_builders = {
+            self.process_tab: self._build_process_tab,
+            self.analytics_tab: self._build_analytics_tab,
+            self.settings_tab: self._build_settings_tab,
+            self.diagnostics_tab: self._build_diagnostics_tab,
+        }
+
+        self.fleet_tab = None
+        if self.aggregator is not None:
+            self.fleet_tab = QWidget()
+            self._tab_builders[self.fleet_tab] = self._build_fleet_tab
 
         self.tab_widget.addTab(self.dashboard_tab, self.t[self.current_lang]["tab_dashboard"])
         self.tab_widget.addTab(self.process_tab, self.t[self.current_lang]["tab_processes"])
         self.tab_widget.addTab(self.analytics_tab, self.t[self.current_lang]["tab_analytics"])
         self.tab_widget.addTab(self.settings_tab, self.t[self.current_lang]["tab_settings"])
+        self.tab_widget.addTab(self.diagnostics_tab, self.t[self.current_lang]["tab_diagnostics"])
+        if self.fleet_tab is not None:
+            self.tab_widget.addTab(self.fleet_tab, self.t[self.current_lang]["tab_fleet"])
+        self.tab_widget.currentChanged.connect(lambda i: self._ensure_tab(self.tab_widget.widget(i)))
 
         self.footer_label = QLabel(self.t[self.current_lang]["footer"])
         self.footer_label.setFont(QFont(FONT_FAMILY, 8))
@@ -305,6 +455,7 @@ class SystemMonitorUI(QWidget):
 
         root.addLayout(top_bar)
         root.addWidget(self.tagline_label)
+        root.addWidget(self.replay_bar)
         root.addWidget(self.tab_widget)
         root.addWidget(self.footer_label)
 
@@ -379,6 +530,7 @@ class SystemMonitorUI(QWidget):
             title = self.t[self.current_lang][title_key]
             card = MetricCard(title, TRANSLATIONS, self.current_lang)
             graph = LiveGraphWidget()
+            graph.profiler = self.profiler
 
             container = QVBoxLayout()
             container.addWidget(card)
@@ -392,13 +544,28 @@ class SystemMonitorUI(QWidget):
             self.metric_cards[metric_key] = card
             self.metric_graphs[metric_key] = graph
 
+        self.mv_card = None
+        if self.mv_detector is not None:
+            self.mv_card = MetricCard(self.t[self.current_lang]["metric_multivariate"], TRANSLATIONS, self.current_lang)
+            grid.addWidget(self.mv_card, 3, 1)
+
         layout.addLayout(grid)
         self.dashboard_tab.setLayout(layout)
 
+    def _ensure_tab(self, tab):
+        builder = self._tab_builders.pop(tab, None)
+        if builder is not None:
+            builder()
+
+    def _tab_built(self, tab) -> bool:
+        return tab is not None and tab not in self._tab_builders
+
     def _build_process_tab(self):
         layout = QVBoxLayout()
         self.process_monitor = ProcessMonitorWidget()
+        self.network_process_widget = NetworkProcessWidget(TRANSLATIONS, self.current_lang)
         layout.addWidget(self.process_monitor)
+        layout.addWidget(self.network_process_widget)
         self.process_tab.setLayout(layout)
 
     def _build_analytics_tab(self):
@@ -407,14 +574,33 @@ class SystemMonitorUI(QWidget):
         self.heatmap_title_label = QLabel(self.t[self.current_lang]["heatmap_title"])
         self.heatmap_title_label.setFont(QFont(FONT_FAMILY, 10, QFont.Bold))
 
-        self.heatmap_widget = HeatmapWidget()
+        with self._shown_models():
+            self.heatmap_widget = HeatmapWidget(self.heatmap_store)
+        self.heatmap_widget.profiler = self.profiler
+        self.heatmap_widget.metrics_changed.connect(self._refresh_heatmap_metrics)
+
+        self.heatmap_metric_label = QLabel(self.t[self.current_lang]["heatmap_metric_label"])
+        self.heatmap_metric_combo = QComboBox()
+        self.heatmap_metric_combo.addItem(self.t[self.current_lang]["heatmap_all"], userData=TOTAL)
+        self.heatmap_metric_combo.currentIndexChanged.connect(
+            lambda i: self.heatmap_widget.set_metric(self.heatmap_metric_combo.itemData(i) or TOTAL)
+        )
+        self._refresh_heatmap_metrics()
+
+        heatmap_header = QHBoxLayout()
+        heatmap_header.addWidget(self.heatmap_title_label)
+        heatmap_header.addStretch()
+        heatmap_header.addWidget(self.heatmap_metric_label)
+        heatmap_header.addWidget(self.heatmap_metric_combo)
 
         self.eventlog_title_label = QLabel(self.t[self.current_lang]["eventlog_title"])
         self.eventlog_title_label.setFont(QFont(FONT_FAMILY, 10, QFont.Bold))
 
         self.eventlog_widget = EventLogWidget()
+        with self._shown_models():
+            self._fill_eventlog()
 
-        layout.addWidget(self.heatmap_title_label)
+        layout.addLayout(heatmap_header)
         layout.addWidget(self.heatmap_widget)
         layout.addSpacing(10)
         layout.addWidget(self.eventlog_title_label)
@@ -434,12 +620,29 @@ class SystemMonitorUI(QWidget):
         self.chk_neon.setChecked(self.neon_enabled)
         self.chk_neon.stateChanged.connect(self._on_neon_changed)
 
+        self.chk_adaptive = QCheckBox(self.t[self.current_lang]["settings_adaptive"])
+        self.chk_adaptive.setChecked(self.adaptive_enabled)
+        self.chk_adaptive.stateChanged.connect(self._on_adaptive_changed)
+
         layout.addWidget(self.chk_autostart)
         layout.addWidget(self.chk_neon)
+        layout.addWidget(self.chk_adaptive)
         layout.addStretch()
 
         self.settings_tab.setLayout(layout)
 
+    def _build_diagnostics_tab(self):
+        layout = QVBoxLayout()
+        self.diagnostics_widget = DiagnosticsWidget(TRANSLATIONS, self.current_lang)
+        layout.addWidget(self.diagnostics_widget)
+        self.diagnostics_tab.setLayout(layout)
+
+    def _build_fleet_tab(self):
+        layout = QVBoxLayout()
+        self.fleet_widget = FleetWidget(TRANSLATIONS, self.current_lang)
+        layout.addWidget(self.fleet_widget)
+        self.fleet_tab.setLayout(layout)
+
     def _on_language_changed(self, index: int):
         lang_code = self.lang_combo.itemData(index)
         if lang_code not in ("de", "en"):
@@ -461,25 +664,86 @@ class SystemMonitorUI(QWidget):
         self.profile_button.setToolTip(tr["btn_profile_tooltip"])
         self.export_button.setText(tr["btn_export"])
         self.export_button.setToolTip(tr["btn_export_tooltip"])
+        self.replay_button.setText(tr["btn_replay"])
+        self.replay_button.setToolTip(tr["btn_replay_tooltip"])
+        self.replay_bar.update_language(self.current_lang)
         self.footer_label.setText(tr["footer"])
 
         self.tab_widget.setTabText(0, tr["tab_dashboard"])
         self.tab_widget.setTabText(1, tr["tab_processes"])
         self.tab_widget.setTabText(2, tr["tab_analytics"])
         self.tab_widget.setTabText(3, tr["tab_settings"])
+        self.tab_widget.setTabText(4, tr["tab_diagnostics"])
+        if self.fleet_tab is not None:
+            self.tab_widget.setTabText(5, tr["tab_fleet"])
+        if self._tab_built(self.fleet_tab):
+            self.fleet_widget.update_language(self.current_lang)
 
         for metric_key, card in self.metric_cards.items():
             title_key = self.metric_title_keys[metric_key]
             card.title_label.setText(tr[title_key])
             card.update_language(self.current_lang)
 
-        self.heatmap_title_label.setText(tr["heatmap_title"])
-        self.eventlog_title_label.setText(tr["eventlog_title"])
-        self.chk_autostart.setText(tr["settings_autostart"])
-        self.chk_neon.setText(tr["settings_neon"])
+        if self.mv_card is not None:
+            self.mv_card.title_label.setText(tr["metric_multivariate"])
+            self.mv_card.update_language(self.current_lang)
+
+        # Tabs that are not built yet pick up the language when they are.
+        if self._tab_built(self.analytics_tab):
+            self.heatmap_title_label.setText(tr["heatmap_title"])
+            self.heatmap_metric_label.setText(tr["heatmap_metric_label"])
+            self.heatmap_metric_combo.setItemText(0, tr["heatmap_all"])
+            self.eventlog_title_label.setText(tr["eventlog_title"])
+        if self._tab_built(self.settings_tab):
+            self.chk_autostart.setText(tr["settings_autostart"])
+            self.chk_neon.setText(tr["settings_neon"])
+            self.chk_adaptive.setText(tr["settings_adaptive"])
+        if self._tab_built(self.diagnostics_tab):
+            self.diagnostics_widget.update_language(self.current_lang)
+        if self._tab_built(self.process_tab):
+            self.network_process_widget.update_language(self.current_lang)
+
+    def _refresh_heatmap_metrics(self):
+        combo = self.heatmap_metric_combo
+        names = self.heatmap_widget.store.names[1:]
+        shown = [combo.itemData(i) for i in range(1, combo.count())]
+
+        if shown != names[:len(shown)]:
+            # Another store was swapped in (replay / back to live): rebuild,
+            # keeping the selected metric if the new store knows it.
+            selected = self.heatmap_widget.selected_metric
+            combo.blockSignals(True)
+            while combo.count() > 1:
+                combo.removeItem(combo.count() - 1)
+            for name in names:
+                combo.addItem(name, userData=name)
+            index = max(combo.findData(selected), 0)
+            combo.setCurrentIndex(index)
+            combo.blockSignals(False)
+            self.heatmap_widget.set_metric(combo.itemData(index) or TOTAL)
+            return
+
+        # Stores only ever append names, so usually just the new ones are added.
+        for name in names[len(shown):]:
+            combo.addItem(name, userData=name)
+
+    def _save_heatmap(self):
+        try:
+            self.heatmap_store.save()
+        except OSError:
+            pass
+
+    def closeEvent(self, event):
+        if self.export_job is not None:
+            self.export_job.cancel()
+            self.export_job.join(5)
+        self.stop_replay()
+        self._save_heatmap()
+        super().closeEvent(event)
 
     def _on_github_clicked(self):
         if GITHUB_URL:
+            import webbrowser
             webbrowser.open(GITHUB_URL)
 
     def _on_info_clicked(self):
@@ -513,6 +777,7 @@ class SystemMonitorUI(QWidget):
             "JSON Files (*.json)",
         )
         if file_path:
+            import json
             try:
                 with open(file_path, "w", encoding="utf-8") as f:
                     json.dump(self.profiling_data, f, indent=2)
@@ -523,28 +788,59 @@ class SystemMonitorUI(QWidget):
         QMessageBox.information(self, tr["msg_profile_done_title"], tr["msg_profile_done_text"])
 
     def _on_export_clicked(self):
+        from export import ExportJob
+
         tr = self.t[self.current_lang]
-        events = self.eventlog_widget.get_events()
-        if not events:
-            QMessageBox.information(self, tr["msg_export_success"], "Keine Events zum Export vorhanden.")
+        if self.export_job is not None:
+            return
+        history = self.history_store.snapshot() if self.history_store is not None else None
+        events = self.event_history.snapshot()
+        if not len(self.event_history) and (history is None or not history.series):
+            QMessageBox.information(self, tr["msg_export_success"], tr["msg_export_empty"])
             return
 
-        default_name = f"systemmonitor_events_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        file_path, _ = QFileDialog.getSaveFileName(
-            self,
-            tr["btn_export"],
-            default_name,
-            "JSON Files (*.json)",
-        )
+        default_name = f"systemmonitor_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson"
+        file_path, _ = QFileDialog.getSaveFileName(self, tr["btn_export"], default_name, tr["export_filter"])
         if not file_path:
             return
 
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(events, f, indent=2)
-            QMessageBox.information(self, tr["msg_export_success"], tr["msg_export_success"])
-        except Exception as e:
+            job = ExportJob(file_path, events, history)
+        except ValueError as e:
             QMessageBox.warning(self, tr["msg_export_error"], f"{tr['msg_export_error']}: {e}")
+            return
+        job.start()
+        self.export_job = job
+
+        # Rows are written on the worker thread; the dialog only polls the counters.
+        self.export_dialog = QProgressDialog(
+            tr["export_progress"].format(written=0, total=job.total), tr["export_cancel"], 0, 1000, self
+        )
+        self.export_dialog.setWindowTitle(tr["btn_export"])
+        self.export_dialog.setMinimumDuration(500)
+        self.export_dialog.canceled.connect(job.cancel)
+        self.export_timer = QTimer(self)
+        self.export_timer.timeout.connect(self._poll_export)
+        self.export_timer.start(EXPORT_PROGRESS_MS)
+
+    def _poll_export(self):
+        tr = self.t[self.current_lang]
+        job = self.export_job
+        if not job.done:
+            if not job.cancelled:
+                self.export_dialog.setValue(int(1000 * job.written / job.total) if job.total else 0)
+                self.export_dialog.setLabelText(tr["export_progress"].format(written=job.written, total=job.total))
+            return
+
+        self.export_timer.stop()
+        self.export_dialog.reset()
+        self.export_job = None
+        if job.error is not None:
+            QMessageBox.warning(self, tr["msg_export_error"], f"{tr['msg_export_error']}: {job.error}")
+        elif job.cancelled:
+            QMessageBox.information(self, tr["btn_export"], tr["msg_export_cancelled"])
+        else:
+            QMessageBox.information(self, tr["msg_export_success"], tr["msg_export_success"])
 
     def _on_autostart_changed(self, state: int):
         enabled = state == Qt.Checked
@@ -554,12 +850,29 @@ class SystemMonitorUI(QWidget):
         self.neon_enabled = state == Qt.Checked
         self._apply_stylesheet()
 
+    def _on_adaptive_changed(self, state: int):
+        self.adaptive_enabled = state == Qt.Checked
+        self.sampler.reset()
+        self.timer.setInterval(self.sampler.interval_ms)
+
     def _start_timer(self):
         self.timer = QTimer(self)
         self.timer.timeout.connect(self._update_metrics)
         self.timer.start(UPDATE_INTERVAL_MS)
 
     def _format_status_details(self, status: MetricStatus) -> str:
+        text = self._format_zscore_details(status)
+        if status.percentiles is not None:
+            pct = status.percentiles
+            text += self.t[self.current_lang]["pct_details"].format(
+                p50=pct[0.5],
+                p95=pct[0.95],
+                p99=pct[0.99],
+                state=status.percentile_state,
+            )
+        return text
+
+    def _format_zscore_details(self, status: MetricStatus) -> str:
         tr = self.t[self.current_lang]
 
         if status.state == "LEARN":
@@ -579,36 +892,39 @@ class SystemMonitorUI(QWidget):
 
         return tr["state_UNKNOWN"]
 
-    def _forecast_high_load_minutes(self, metric_name: str, threshold: float = 80.0):
-        history = self.history_for_forecast[metric_name]
-        if len(history) < 10:
-            return None
-
-        n = len(history)
-        xs = list(range(n))
-        ys = list(history)
-
-        mean_x = sum(xs) / n
-        mean_y = sum(ys) / n
+    def _format_multivariate_details(self, status: MultivariateStatus) -> str:
+        tr = self.t[self.current_lang]
 
-        num = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
-        den = sum((x - mean_x) ** 2 for x in xs) or 1.0
-        slope = num / den
-        intercept = mean_y - slope * mean_x
+        if status.state == "LEARN":
+            return tr["mv_learn"].format(samples=status.samples)
+
+        top = ", ".join(f"{name} ({share * 100:.0f} %)" for name, share in status.contributions) or "–"
+        return tr["mv_details"].format(d=status.distance, z=status.z_score, top=top)
+
+    def _update_multivariate(self, raw_metrics, now: float, wall: float, render: bool = True, shown: bool = True):
+        mv = self.mv_detector.evaluate(multivariate_values(raw_metrics), timestamp=now)
+
+        status = MetricStatus(
+            name="Multivariate",
+            value=mv.distance or 0.0,
+            unit="D",
+            state=mv.state,
+            z_score=mv.z_score,
+            mean=None,
+            stdev=None,
+            samples=mv.samples,
+        )
+        if render:
+            self.mv_card.update_metric(status, self._format_multivariate_details(mv), "")
 
-        if slope <= 0:
-            return None
+        if mv.state in ("WARN", "ALERT"):
+            self._log_event("Multivariate", mv.state, status.value, wall, shown)
+            self._add_heatmap_event("Multivariate", mv.state, wall, render, shown)
 
-        t_index = (threshold - intercept) / slope
-        if t_index <= n - 1:
-            return 0.0
+        return status
 
-        steps_ahead = t_index - (n - 1)
-        seconds_per_step = UPDATE_INTERVAL_MS / 1000.0
-        minutes = steps_ahead * seconds_per_step / 60.0
-        if 0 < minutes <= 30:
-            return minutes
-        return None
+    def _forecast_high_load_minutes(self, metric_name: str, threshold: float = 80.0):
+        return forecast_high_load_minutes(self.history_for_forecast[metric_name], threshold)
 
     def _format_prediction_text(self, metric_name: str) -> str:
         tr = self.t[self.current_lang]
@@ -621,39 +937,301 @@ class SystemMonitorUI(QWidget):
         return tr["prediction_high_load"].format(minutes=minutes)
 
     def _update_metrics(self):
+        profiler = self.profiler
+        mark = profiler.begin_tick()
+
         raw_metrics = self.backend.collect()
+        if not raw_metrics:
+            return
+        mark = profiler.lap("collect", mark)
+
+        wall = time.time()
+        statuses, mark = self._process_sample(raw_metrics, time.monotonic(), wall, mark, shown=self.replay is None)
+
+        if self.history_store is not None:
+            self.history_store.append_snapshot(wall, raw_metrics)
+            mark = profiler.lap("history", mark)
+
+        # Once per tick, next to but outside collect(); publishers and the
+        # diagnostics tab read this sample.
+        self_cpu, self_rss_mb = self.self_usage.sample()
+        self.publish_errors.publish_all(self.publishers, wall, raw_metrics, statuses)
+        profiler.lap("publish", mark)
+
+        profiler.end_tick()
+
+        if self.adaptive_enabled:
+            interval = self.sampler.next_interval_ms(s.state for s in statuses)
+            if interval != self.timer.interval():
+                self.timer.setInterval(interval)
+
+        if self.tab_widget.currentWidget() is self.diagnostics_tab:
+            self.diagnostics_widget.update_diagnostics(profiler.summary(), self_cpu, self_rss_mb)
+
+        if self.fleet_tab is not None and self.tab_widget.currentWidget() is self.fleet_tab:
+            self.fleet_widget.update_fleet(self.aggregator.snapshot(), wall, FLEET_STALE_S)
 
         if self.profiling_active:
-            snapshot = {
-                "timestamp": datetime.now().isoformat(),
-                "metrics": {},
-            }
-        else:
-            snapshot = None
+            self.profiling_data.append({
+                "timestamp": datetime.fromtimestamp(wall).isoformat(),
+                "metrics": {k: {"value": v, "unit": u} for k, (v, u) in raw_metrics.items()},
+                "timings_ms": profiler.last_tick,
+                "self": {"cpu_percent": self_cpu, "rss_mb": self_rss_mb},
+            })
+
+    def _process_sample(self, raw_metrics, now: float, wall: float, mark: int, render: bool = True,
+                        shown: bool = True):
+        """
+        Runs one sample through detectors, cards, graphs, heatmap and event
+        log. Shared by live ticks and replay; with render=False (intermediate
+        replay samples) state is updated but cards are not reformatted.
+        With shown=False (live ticks during a replay) no widget is touched.
+        """
+        profiler = self.profiler
+        statuses = []
+        render = render and shown
 
         for metric_key, (value, unit) in raw_metrics.items():
-            self.history_for_forecast[metric_key].append(value)
+            self.history_for_forecast[metric_key].append((now, value))
 
-            status = self.detector.evaluate(metric_key, value, unit)
-            details_text = self._format_status_details(status)
-            prediction_text = self._format_prediction_text(metric_key)
+            status = self.detector.evaluate(metric_key, value, unit, timestamp=now, wall_time=wall)
+            statuses.append(status)
+            mark = profiler.lap("evaluate", mark)
 
             card = self.metric_cards.get(metric_key)
-            graph = self.metric_graphs.get(metric_key)
-            if card:
+            if card and render:
+                details_text = self._format_status_details(status)
+                mark = profiler.lap("format", mark)
+                prediction_text = self._format_prediction_text(metric_key)
+                mark = profiler.lap("forecast", mark)
                 card.update_metric(status, details_text, prediction_text)
+
+            graph = self.metric_graphs.get(metric_key)
             if graph:
                 if unit == "%":
-                    graph.add_value(max(0.0, min(100.0, value)))
+                    scaled = max(0.0, min(100.0, value))
                 else:
-                    graph.add_value(max(0.0, min(100.0, value / 10.0)))
+                    scaled = max(0.0, min(100.0, value / 10.0))
+                if shown:
+                    graph.add_value(scaled, render)
+                else:
+                    self._live_graphs[metric_key].append(scaled)
 
             if status.state in ("WARN", "ALERT"):
-                self.eventlog_widget.add_event(metric_key, status.state, value)
-                self.heatmap_widget.add_event(status.state)
+                self._log_event(metric_key, status.state, value, wall, shown)
+                self._add_heatmap_event(metric_key, status.state, wall, render, shown)
+
+            mark = profiler.lap("cards", mark)
+
+        if self.mv_detector is not None:
+            statuses.append(self._update_multivariate(raw_metrics, now, wall, render, shown))
+            mark = profiler.lap("evaluate", mark)
 
-            if snapshot is not None:
-                snapshot["metrics"][metric_key] = {"value": value, "unit": unit}
+        if self.rules is not None:
+            statuses.extend(self._evaluate_rules(now, wall, statuses, render, shown))
+            mark = profiler.lap("rules", mark)
 
-        if snapshot is not None:
-            self.profiling_data.append(snapshot)
\ No newline at end of file
+        return statuses, mark
+
+    def _evaluate_rules(self, now: float, wall: float, statuses, render: bool = True, shown: bool = True):
+        rules = self.rules
+        forecasts = {
+            s.name: self._forecast_high_load_minutes(s.name) for s in statuses if rules.needs_forecast(s.name)
+        }
+        rule_statuses = rules.evaluate(self.rule_state, now, statuses, forecasts)
+        for r in self.rule_state.flipped:
+            status = rule_statuses[r]
+            if status.state in ("WARN", "ALERT"):
+                self._log_event(status.name, status.state, status.value, wall, shown)
+                self._add_heatmap_event(status.name, status.state, wall, render, shown)
+        return rule_statuses
+
+    def _log_event(self, metric: str, state: str, value: float, wall: float, shown: bool = True):
+        self.event_history.append(wall, metric, state, value)
+        if shown and self.eventlog_widget is not None:
+            self.eventlog_widget.add_event(metric, state, value, wall)
+
+    def _fill_eventlog(self):
+        self.eventlog_widget.clear()
+        for wall, metric, state, value in self.event_history.tail(self.eventlog_widget.max_rows):
+            self.eventlog_widget.add_event(metric, state, value, wall)
+
+    def _add_heatmap_event(self, metric: str, state: str, wall: float, render: bool = True, shown: bool = True):
+        if shown and self.heatmap_widget is not None:
+            self.heatmap_widget.add_event(state, wall, render, metric)
+        else:
+            self.heatmap_store.add(metric, STATE_WEIGHTS[state], wall)
+
+    def _models(self) -> dict:
+        return {
+            "detector": self.detector,
+            "mv_detector": self.mv_detector,
+            "forecast": self.history_for_forecast,
+            "heatmap": self.heatmap_store,
+            "events": self.event_history,
+            "rules": self.rule_state,
+        }
+
+    def _use_models(self, models: dict) -> dict:
+        """
+        Points the pipeline at another set of models without touching any
+        widget; returns the previous set.
+        """
+        previous = self._models()
+        self.detector = models["detector"]
+        self.mv_detector = models["mv_detector"]
+        self.history_for_forecast = models["forecast"]
+        self.heatmap_store = models["heatmap"]
+        self.event_history = models["events"]
+        self.rule_state = models["rules"]
+        return previous
+
+    @contextmanager
+    def _shown_models(self):
+        """
+        Swaps in the models behind the widgets (the replay's, if one is
+        open) for the duration of the block.
+        """
+        if self._replay_models is None:
+            yield
+            return
+        live = self._use_models(self._replay_models)
+        try:
+            yield
+        finally:
+            self._replay_models = self._use_models(live)
+
+    def _pipeline_state(self) -> dict:
+        # A seek only needs as much of the event history as the event log
+        # shows; the rest would make every checkpoint grow with the capture.
+        return {
+            "detector": self.detector,
+            "mv_detector": self.mv_detector,
+            "forecast": {k: list(v) for k, v in self.history_for_forecast.items()},
+            "heatmap": self.heatmap_store,
+            "graphs": {k: list(g.values) for k, g in self.metric_graphs.items()},
+            "events": self.event_history.tail(EVENTLOG_MAX_ROWS),
+            "rules": self.rule_state,
+        }
+
+    def _set_pipeline_state(self, state):
+        if state is None:
+            state = {
+                "detector": AnomalyDetector(),
+                "mv_detector": MultivariateDetector() if MULTIVARIATE_ENABLED else None,
+                "forecast": {},
+                "heatmap": HeatmapStore(),
+                "graphs": {},
+                "events": [],
+                "rules": self.rules.new_state() if self.rules is not None else None,
+            }
+        self.detector = state["detector"]
+        self.mv_detector = state["mv_detector"]
+        self.history_for_forecast = defaultdict(lambda: deque(maxlen=60))
+        for name, values in state["forecast"].items():
+            self.history_for_forecast[name].extend(values)
+        self.heatmap_store = state["heatmap"]
+        if self.heatmap_widget is not None:
+            self.heatmap_widget.set_store(self.heatmap_store)
+        self.event_history = EventHistory()
+        for record in state["events"]:
+            self.event_history.append(*record)
+        self.rule_state = state["rules"]
+        self._show_graphs(state["graphs"])
+
+    def _show_graphs(self, values):
+        for name, graph in self.metric_graphs.items():
+            graph.values.clear()
+            graph.values.extend(values.get(name, ()))
+            graph.update()
+
+    def _on_replay_clicked(self):
+        tr = self.t[self.current_lang]
+        file_path, _ = QFileDialog.getOpenFileName(self, tr["btn_replay"], "", tr["replay_open_filter"])
+        if file_path:
+            self.start_replay(file_path)
+
+    def start_replay(self, path: str) -> bool:
+        from replay import ReplayEngine, ReplaySource
+
+        tr = self.t[self.current_lang]
+        try:
+            source = ReplaySource(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, tr["msg_replay_error"], f"{tr['msg_replay_error']}: {e}")
+            return False
+
+        if self.replay is None:
+            # Live ticks go on in the background; only their graph points
+            # need somewhere to go while the graphs show the replay.
+            self._live_graphs = {k: deque(g.values, maxlen=g.values.maxlen) for k, g in self.metric_graphs.items()}
+            self._replay_models = self._models()
+        else:
+            self.replay_timer.stop()
+            self.replay.close()
+
+        # The engine starts from a fresh pipeline (restore(None)).
+        with self._shown_models():
+            self.replay = ReplayEngine(source, self._replay_process, self._pipeline_state, self._restore_replay_state)
+        self.replay_bar.set_capture(os.path.basename(path), source.start_ts, source.end_ts)
+        self.replay_bar.show()
+        self._on_replay_play_toggled(True)
+        return True
+
+    def stop_replay(self):
+        if self.replay is None:
+            return
+        self.replay_timer.stop()
+        self.replay.close()
+        self.replay = None
+        self._replay_models = None
+        self.replay_bar.hide()
+
+        self._show_graphs(self._live_graphs)
+        self._live_graphs = None
+        if self.heatmap_widget is not None:
+            self.heatmap_widget.set_store(self.heatmap_store)
+        # The live event log is the tail of the live event history.
+        if self.eventlog_widget is not None:
+            self._fill_eventlog()
+
+    def _restore_replay_state(self, state):
+        self._set_pipeline_state(state)
+        if self.eventlog_widget is not None:
+            self._fill_eventlog()
+
+    def _replay_process(self, ts: float, metrics, render: bool):
+        self._process_sample(metrics, ts, ts, self.profiler.now(), render)
+        if render and self.heatmap_widget is not None:
+            self.heatmap_widget.update()
+
+    def _on_replay_play_toggled(self, playing: bool):
+        self.replay_playing = playing and not self.replay.finished
+        self.replay_bar.set_playing(self.replay_playing)
+        if self.replay_playing:
+            self._replay_last_frame = time.monotonic()
+            self.replay_timer.start(REPLAY_FRAME_MS)
+        else:
+            self.replay_timer.stop()
+
+    def _on_replay_seek(self, ts: float):
+        with self._shown_models():
+            self.replay.seek(ts)
+        self.replay_bar.set_position(self.replay.position)
+
+    def _replay_frame(self):
+        now = time.monotonic()
+        # A stalled frame must not snowball into ever larger catch-up steps.
+        elapsed = min(now - self._replay_last_frame, 4 * REPLAY_FRAME_MS / 1000.0)
+        self._replay_last_frame = now
+
+        # Every sample up to the new position is evaluated, but only the
+        # last one is formatted; repaints coalesce to one per frame.
+        self.profiler.begin_tick()
+        with self._shown_models():
+            self.replay.advance_to(self.replay.position + elapsed * self.replay_bar.speed)
+        self.profiler.end_tick()
+        self.replay_bar.set_position(self.replay.position)
+
+        if self.replay.finished:
+            self._on_replay_play_toggled(False)
\ No newline at end of file